@@ -0,0 +1,288 @@
+import asyncio
+import json
+import logging
+import random
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from time import monotonic
+from typing import Any, Awaitable, Callable, Optional
+from urllib.parse import urlparse
+from uuid import UUID
+
+from app.utils.env_mgr import get_env
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKENDS = ("off", "memory", "resp")
+
+
+@dataclass(frozen=True)
+class CacheSettings:
+    backend: str
+    url: str
+    ttl_s: float
+    max_entries: int
+    timeout_s: float
+
+
+@lru_cache(maxsize=1)
+def get_cache_settings() -> CacheSettings:
+    env = get_env()
+    assert env.CACHE_BACKEND in CACHE_BACKENDS, f"CACHE_BACKEND must be one of {CACHE_BACKENDS}"
+    assert env.CACHE_TTL_S > 0
+    assert env.CACHE_MAX_ENTRIES > 0
+    assert env.CACHE_TIMEOUT_S > 0
+
+    return CacheSettings(
+        backend=env.CACHE_BACKEND,
+        url=env.CACHE_URL,
+        ttl_s=env.CACHE_TTL_S,
+        max_entries=env.CACHE_MAX_ENTRIES,
+        timeout_s=env.CACHE_TIMEOUT_S,
+    )
+
+
+class CacheError(Exception):
+    pass
+
+
+class CacheBackend:
+    """string keys and values. a key set with a ttl is gone after ttl_s"""
+
+    async def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl_s: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    async def set_nx(self, key: str, value: str) -> None:
+        """set only if the key is not there"""
+        raise NotImplementedError
+
+    async def incr(self, key: str) -> int:
+        """add 1 to an int value, from 0 if the key is not there"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """in process LRU + TTL. each worker process has its own, so a write
+    is only seen by the worker that made it. invalidate_entity only bumps
+    this worker's generation, the other workers keep serving their values
+    for up to CACHE_TTL_S. with more than one worker use the resp backend,
+    or a ttl the app can live with
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # key -> (expires or None, value)
+        self._entries: OrderedDict[str, tuple[Optional[float], str]] = OrderedDict()
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires is not None and expires < monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, ttl_s: Optional[float] = None) -> None:
+        self._entries.pop(key, None)
+        self._entries[key] = (None if ttl_s is None else monotonic() + ttl_s, value)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def set_nx(self, key: str, value: str) -> None:
+        if await self.get(key) is None:
+            await self.set(key, value)
+
+    async def incr(self, key: str) -> int:
+        value = int(await self.get(key) or 0) + 1
+        await self.set(key, str(value))
+        return value
+
+
+class RespCache(CacheBackend):
+    """
+    minimal client of the Redis protocol (RESP2), enough for GET / SET /
+    INCR. works with redis, valkey, or a local stand-in. one connection,
+    one command at a time, reconnects after an error
+
+    url: redis://[:password@]host[:port][/db]
+    """
+
+    def __init__(self, url: str, timeout_s: float):
+        parsed = urlparse(url)
+        assert parsed.scheme == "redis", "only redis:// urls"
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.strip("/") or 0)
+        self.timeout_s = timeout_s
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self._command("GET", key)
+        return None if value is None else value.decode()
+
+    async def set(self, key: str, value: str, ttl_s: Optional[float] = None) -> None:
+        if ttl_s is None:
+            await self._command("SET", key, value)
+        else:
+            await self._command("SET", key, value, "PX", str(int(ttl_s * 1000)))
+
+    async def set_nx(self, key: str, value: str) -> None:
+        await self._command("SET", key, value, "NX")
+
+    async def incr(self, key: str) -> int:
+        return await self._command("INCR", key)
+
+    async def close(self) -> None:
+        async with self._lock:
+            await self._disconnect()
+
+    async def _command(self, *args: str) -> Any:
+        async with self._lock:
+            try:
+                return await asyncio.wait_for(self._round_trip(args), self.timeout_s)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                # the reply may still arrive, the connection can't be reused
+                await self._disconnect()
+                raise CacheError(f"{args[0]} to {self.host}:{self.port} failed: {e!r}")
+
+    async def _round_trip(self, args: tuple[str, ...]) -> Any:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            if self.password is not None:
+                self._send("AUTH", self.password)
+                await self._read_reply()
+            if self.db:
+                self._send("SELECT", str(self.db))
+                await self._read_reply()
+        self._send(*args)
+        return await self._read_reply()
+
+    def _send(self, *args: str) -> None:
+        # every command is an array of bulk strings
+        out = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg.encode()
+            out.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        self._writer.write(b"".join(out))
+
+    async def _read_reply(self) -> Any:
+        line = await self._reader.readuntil(b"\r\n")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise CacheError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n_bytes = int(rest)
+            if n_bytes < 0:
+                return None
+            return (await self._reader.readexactly(n_bytes + 2))[:-2]
+        if kind == b"*":
+            n_items = int(rest)
+            return None if n_items < 0 else [await self._read_reply() for _ in range(n_items)]
+        raise CacheError(f"unexpected reply {line!r}")
+
+    async def _disconnect(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+        self._reader = self._writer = None
+
+
+@lru_cache(maxsize=1)
+def get_cache() -> CacheBackend:
+    settings = get_cache_settings()
+    assert settings.backend != "off", "no cache backend configured"
+    if settings.backend == "resp":
+        cache = RespCache(settings.url, settings.timeout_s)
+    else:
+        cache = MemoryCache(settings.max_entries)
+    logger.info(f"Created {cache.__class__.__name__}")
+    return cache
+
+
+async def stop_cache() -> None:
+    if get_cache_settings().backend == "off":
+        return
+    await get_cache().close()
+    logger.info("Closed cache")
+
+
+# per entity values. each entity has a generation counter that is part of
+# every key of its values, so invalidating is one INCR and the old values
+# are never read again (they expire on their own)
+
+def _generation_key(entity_id: UUID) -> str:
+    return f"entity:{entity_id}:gen"
+
+
+async def _generation(entity_id: UUID) -> str:
+    key = _generation_key(entity_id)
+    generation = await get_cache().get(key)
+    if generation is None:
+        # evicted or never set. a random start, so values cached under an
+        # earlier counter are not picked up again
+        await get_cache().set_nx(key, str(random.getrandbits(62)))
+        generation = await get_cache().get(key)
+    return generation
+
+
+async def cached_for_entity(
+    entity_id: UUID,
+    name: str,
+    load: Callable[[], Awaitable[Any]],
+) -> Any:
+    """
+    the value of load() for this entity, from the cache if there. the value
+    must be plain JSON (str keys, no UUIDs) so a hit returns what a miss does.
+    if the cache is down or off, load() is used every time
+    """
+    if get_cache_settings().backend == "off":
+        return await load()
+    try:
+        key = f"entity:{entity_id}:{await _generation(entity_id)}:{name}"
+        cached = await get_cache().get(key)
+    except CacheError as e:
+        logger.warning(f"cache: {e}")
+        return await load()
+    if cached is not None:
+        return json.loads(cached)
+
+    value = await load()
+    try:
+        await get_cache().set(key, json.dumps(value), get_cache_settings().ttl_s)
+    except CacheError as e:
+        logger.warning(f"cache: {e}")
+    return value
+
+
+async def invalidate_entity(entity_id: UUID) -> None:
+    """call after a committed write that changes any cached value of the
+    entity. a read that started before the write may still store its value,
+    but under the old generation, where nothing looks
+    """
+    if get_cache_settings().backend == "off":
+        return
+    try:
+        await get_cache().incr(_generation_key(entity_id))
+    except CacheError as e:
+        # values then stay stale for up to the ttl
+        logger.error(f"cache: could not invalidate entity {entity_id}: {e}")
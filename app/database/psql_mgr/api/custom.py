@@ -4,8 +4,10 @@ from uuid import UUID
 from psycopg.rows import dict_row
 from pydantic import BaseModel
 
-from app.database.psql_mgr.psql_mgr import get_async_pool
-from app.database.psql_mgr.utils.parse_schema import to_underscore
+from app.database.psql_mgr.api.delete import DELETE_API
+from app.database.psql_mgr.instrumentation import QueryTimer, text_shape
+from app.database.psql_mgr.read_cache import invalidate_query
+from app.database.psql_mgr.unit_of_work import connection
 
 logger = logging.getLogger(__name__)
 
@@ -13,30 +15,32 @@ logger = logging.getLogger(__name__)
 class CUSTOM_API:
     @staticmethod
     async def generic_query(query: str) -> list[dict]:
+        timer = QueryTimer("CUSTOM", text_shape(query), "query")
         async with (
-            get_async_pool().connection() as conn,
+            connection() as conn,
             conn.cursor(row_factory=dict_row) as cur,
         ):
+            timer.connected()
             await cur.execute(query)
+            invalidate_query(query)
             records = await cur.fetchall()
+            timer.done(len(records), lambda: query)
             if not records:
                 raise RuntimeError("Fix me")
             return records
 
     @staticmethod
     async def generic_query_no_return(query: str):
+        timer = QueryTimer("CUSTOM", text_shape(query), "query")
         async with (
-            get_async_pool().connection() as conn,
+            connection() as conn,
             conn.cursor(row_factory=dict_row) as cur,
         ):
+            timer.connected()
             await cur.execute(query)
+            invalidate_query(query)
+            timer.done(max(cur.rowcount, 0), lambda: query)
 
     @staticmethod
     async def delete_row(table: BaseModel, row_id: UUID | str):
-        async with (
-            get_async_pool().connection() as conn,
-            conn.cursor(row_factory=dict_row) as cur,
-        ):
-            table_name = to_underscore(table.__name__)
-            query = f"DELETE FROM {table_name} WHERE id='{str(row_id)}'"
-            await cur.execute(query)
+        await DELETE_API.delete_ids(table, [row_id])
@@ -0,0 +1,197 @@
+import logging
+from functools import lru_cache
+from typing import Any, Optional
+from uuid import UUID
+
+from psycopg.sql import SQL, Composed, Identifier, Placeholder
+from pydantic import BaseModel
+
+from app.database.utils import dict_helper as dh
+from app.database.psql_mgr.api.fetch import (
+    FETCH_API,
+    add_equal_where_operator,
+    check_fetch_vals,
+    compose_all_where_possibilities,
+    format_val_dict,
+)
+from app.database.psql_mgr.instrumentation import QueryTimer
+from app.database.psql_mgr.read_cache import invalidate_table
+from app.database.psql_mgr.unit_of_work import connection
+from app.database.psql_mgr.utils.parse_schema import to_underscore
+from app.database.psql_mgr.utils.schema_meta import get_schema_meta
+
+logger = logging.getLogger(__name__)
+
+# rows per delete statement when chunking. each chunk commits on its own
+# (unless in a unit of work), so row locks are held for one chunk only
+DELETE_CHUNK_ROWS = 5000
+
+
+@lru_cache(maxsize=64)
+def _affected_tables(table_name: str) -> tuple[str, ...]:
+    """
+    the table and every table that references it, directly or through
+    others. an ON DELETE CASCADE or SET NULL changes their rows too, a
+    restricting key fails the delete, so all of them are invalidated
+    """
+    tables = get_schema_meta().tables
+    affected = [table_name]
+    for name in affected:
+        for other in tables.values():
+            if other.name not in affected and any(x.ref_table == name for x in other.foreign_keys):
+                affected.append(other.name)
+    return tuple(affected)
+
+
+@lru_cache(maxsize=256)
+def _compose_delete(
+    table_name: str,
+    where_shape: tuple[tuple[str, str], ...],
+    chunked: bool,
+    return_ids: bool,
+) -> Composed:
+    """
+    DELETE FROM table WHERE ..., or if chunked only the first %(limit)s
+    matching rows: DELETE ... WHERE id IN (SELECT id ... LIMIT)
+    """
+    table = get_schema_meta().tables.get(table_name)
+    assert table is not None, f"not a table in the schema: {table_name}"
+    assert all(
+        x.split(".")[0] == table_name for x, _ in where_shape
+    ), f"where cols must be of {table_name}"
+    assert "id" in table.columns or not (chunked or return_ids), f"{table_name} has no id col"
+
+    # only the operator of each where col goes into the shape, the values
+    # are bound
+    where = SQL(" AND ").join(
+        compose_all_where_possibilities({k: (op, None) for k, op in where_shape})
+    )
+    if chunked:
+        query = SQL(
+            "DELETE FROM {table} WHERE {id} IN "
+            "(SELECT {id} FROM {table} WHERE {where} LIMIT {limit}) "
+        ).format(
+            table=Identifier(table_name),
+            id=Identifier("id"),
+            where=where,
+            limit=Placeholder("limit"),
+        )
+    else:
+        query = SQL("DELETE FROM {table} WHERE {where} ").format(
+            table=Identifier(table_name),
+            where=where,
+        )
+    if return_ids:
+        query += SQL("RETURNING {} ").format(Identifier("id"))
+    return query
+
+
+async def _delete(
+    table_name: str,
+    where_dict: dict[str, tuple[str, Any]],
+    chunk_size: Optional[int],
+    return_ids: bool,
+) -> int | list[UUID]:
+    """
+    delete every row matching where_dict, chunk_size rows per statement
+    (one statement if None)
+
+    -> returns number of rows deleted, or their ids if return_ids
+    """
+    assert chunk_size is None or (isinstance(chunk_size, int) and chunk_size > 0)
+    check_fetch_vals(where_dict, None, None)
+    where_shape = tuple((k, v[0]) for k, v in where_dict.items())
+    query = _compose_delete(table_name, where_shape, chunk_size is not None, return_ids)
+    vals = format_val_dict(where_dict)
+    if chunk_size is not None:
+        vals["limit"] = chunk_size
+
+    timer = QueryTimer("DELETE", ("DELETE", table_name, where_shape, chunk_size is not None, return_ids), table_name)
+    n_rows = 0
+    ids = []
+    done = False
+    while not done:
+        async with (
+            connection() as conn,
+            conn.cursor() as cur,
+        ):
+            timer.connected()
+            await cur.execute(query, vals)
+            n_chunk = max(cur.rowcount, 0)
+            if return_ids:
+                ids.extend(x[0] for x in await cur.fetchall())
+            for x in _affected_tables(table_name):
+                invalidate_table(x)
+
+            n_rows += n_chunk
+            done = chunk_size is None or n_chunk < chunk_size
+            if done:
+                timer.done(n_rows, lambda: query.as_string(cur), vals)
+
+    return ids if return_ids else n_rows
+
+
+class DELETE_API:
+    @staticmethod
+    async def delete_where(
+        table: BaseModel,
+        where_dict: dict[str, Any] | dict[str, tuple[str, Any]],
+        chunk_size: Optional[int] = None,
+        return_ids: bool = False,
+    ) -> int | list[UUID]:
+        """
+        deletes every row of table matching where_dict
+
+        - where_dict: {table.col: value | (operator, value)}, same as
+          FETCH_API. can not be empty, no accidental whole table deletes
+        - chunk_size: delete this many rows per statement and transaction,
+          for very large deletes. None for one statement
+        - return_ids: return the deleted rows' ids instead of a count
+
+        --> returns number of rows deleted, or their ids
+        """
+        assert dh.is_valid_dict(where_dict), "delete needs a where_dict"
+        return await _delete(
+            to_underscore(table.__name__),
+            add_equal_where_operator(where_dict),
+            chunk_size,
+            return_ids,
+        )
+
+    @staticmethod
+    async def delete_ids(
+        table: BaseModel,
+        ids: list[UUID | str],
+        chunk_size: Optional[int] = None,
+        return_ids: bool = False,
+    ) -> int | list[UUID]:
+        """
+        deletes the rows of table with these ids, id = ANY(ids) in one
+        statement, or in chunks of chunk_size ids (eg DELETE_CHUNK_ROWS) that
+        each commit on their own unless in a unit_of_work. see delete_where
+
+        --> returns number of rows deleted, or their ids
+        """
+        assert isinstance(ids, list)
+        if not ids:
+            return [] if return_ids else 0
+        table_name = to_underscore(table.__name__)
+        id_col = f"{table_name}.id"
+        if chunk_size is None:
+            chunk_size = len(ids)
+        assert isinstance(chunk_size, int) and chunk_size > 0
+
+        n_rows = 0
+        deleted = []
+        for i_start in range(0, len(ids), chunk_size):
+            result = await _delete(
+                table_name,
+                {id_col: (FETCH_API.where_operator.IN, ids[i_start : i_start + chunk_size])},
+                None,
+                return_ids,
+            )
+            if return_ids:
+                deleted.extend(result)
+            else:
+                n_rows += result
+        return deleted if return_ids else n_rows
@@ -1,19 +1,27 @@
 import asyncio
 import logging
+from contextlib import aclosing
 from dataclasses import dataclass
-from inspect import getmembers
-from typing import Any, Optional
+from enum import Enum
+from functools import lru_cache
+from inspect import getmembers, isclass
+from itertools import count
+from typing import Any, AsyncIterator, NamedTuple, Optional
 from uuid import UUID
 
 from psycopg.rows import dict_row
-from psycopg.sql import SQL, Composed, Identifier, Literal, Placeholder
+from psycopg.sql import SQL, Composed, Identifier, Placeholder
 from pydantic import BaseModel
 
 from app.database.utils import dict_helper as dh
 from app.database.utils import list_helper as lh
-from app.database.psql_mgr.psql_mgr import get_async_pool
-from app.database.psql_mgr.utils.parse_json import set_json_serdes
+from app.database.psql_mgr.instrumentation import QueryTimer
+from app.database.psql_mgr.psql_mgr import get_production_mode
+from app.database.psql_mgr.read_cache import get_read_cache, get_read_cache_settings
+from app.database.psql_mgr.unit_of_work import connection, current_unit_of_work
+from app.database.psql_mgr.utils.parse_json import is_valid_uuid, set_json_serdes
 from app.database.psql_mgr.utils.parse_schema import to_underscore
+from app.database.psql_mgr.utils.schema_meta import get_schema_meta
 from app.database.utils.api_helper import check_return_all
 
 logger = logging.getLogger(__name__)
@@ -24,11 +32,16 @@ class NoRecordsFoundError(Exception):
     pass
 
 
+@lru_cache(maxsize=1)
+def get_agg_funcs() -> frozenset[str]:
+    return frozenset(
+        v for k, v in getmembers(FETCH_API.agg_funcs) if not k.startswith("__")
+    )
+
+
 def is_agg_col(potential_agg_col: str) -> bool:
     words = potential_agg_col.split(".")
-    return len(words) == 3 and any(
-        words[0] in x for x in getmembers(FETCH_API.agg_funcs)
-    )
+    return len(words) == 3 and words[0] in get_agg_funcs()
 
 
 def split_agg_col(agg_col: str) -> tuple[str, str]:
@@ -50,6 +63,25 @@ def get_agg_col_name(agg_col: str) -> str:
     return col_name
 
 
+def is_col(potential_col: str) -> bool:
+    """'table.col' of a column in the schema"""
+    return potential_col in get_schema_meta().columns
+
+
+def is_col_or_agg_col(potential_col: str) -> bool:
+    return is_col(potential_col) or (
+        is_agg_col(potential_col) and is_col(get_agg_col_name(potential_col))
+    )
+
+
+def is_table(table: Any) -> bool:
+    return (
+        isclass(table)
+        and issubclass(table, BaseModel)
+        and to_underscore(table.__name__) in get_schema_meta().tables
+    )
+
+
 def flatten(rows: list, select_cols: list | str):
     assert lh.is_valid_list(rows)
     assert all(isinstance(row, (BaseModel, dict)) for row in rows)
@@ -67,21 +99,30 @@ def flatten(rows: list, select_cols: list | str):
     return rows
 
 
+def flatten_batch(rows: list, select_cols: list | str) -> list:
+    """like flatten, but always a list. used for streamed batches"""
+    select_cols = lh.make_list(select_cols)
+    if len(select_cols) == 1 and select_cols[0] != "*":
+        return [row[select_cols[0]] for row in rows]
+    return rows
+
+
+@lru_cache(maxsize=1)
+def get_where_operators() -> frozenset[str]:
+    return frozenset(
+        v for k, v in getmembers(FETCH_API.where_operator) if not k.startswith("__")
+    )
+
+
 def add_equal_where_operator(
     where_dict: dict[str, Any] | dict[str, tuple[str, Any]],
 ):
+    where_operators = get_where_operators()
+
     ret_dict = {}
     for k, v in where_dict.items():
         # allow for default operator to be EQUAL, add it if not specified
-        if not isinstance(v, tuple) or (
-            isinstance(v, tuple)
-            and v[0]
-            not in [
-                v
-                for k, v in getmembers(FETCH_API.where_operator)
-                if not k.startswith("__")
-            ]
-        ):
+        if not isinstance(v, tuple) or v[0] not in where_operators:
             ret_dict[k] = (FETCH_API.where_operator.EQUAL, v)
         else:
             ret_dict[k] = v
@@ -91,6 +132,7 @@ def add_equal_where_operator(
 
 def format_val_dict(
     where_dict: Optional[dict[str, tuple[str, Any]]],
+    prefix: str = "",
 ):
     """remove where operator and other formatting"""
     if where_dict is None:
@@ -100,15 +142,55 @@ def format_val_dict(
     for k, v in where_dict.items():
         # break up between tuple into low and high keys
         if v[0] == FETCH_API.where_operator.BETWEEN:
-            val_dict[f"{k}.low"] = v[1][0]
-            val_dict[f"{k}.high"] = v[1][1]
+            val_dict[f"{prefix}{k}.low"] = v[1][0]
+            val_dict[f"{prefix}{k}.high"] = v[1][1]
         else:
-            val_dict[k] = v[1]
+            val_dict[f"{prefix}{k}"] = v[1]
 
     return val_dict
 
 
-def compose_all_where_possibilities(where_dict: dict[str, tuple[str, Any]]) -> list:
+def is_enum_val(col: str, val: Any) -> bool:
+    """val is None or allowed by the col's enum, always true for non enum cols"""
+    enum = get_schema_meta().columns[col].enum
+    if enum is None or val is None:
+        return True
+    return (val.value if isinstance(val, Enum) else val) in enum
+
+
+def check_fetch_vals(
+    where_dict: Optional[dict[str, tuple[str, Any]]],
+    keys: Optional[dict[str, list]],
+    limit: Optional[int],
+    exists: Optional[list["Exists"]] = None,
+) -> None:
+    """per call checks of the bound values, the shape is checked on compile"""
+    assert limit is None or (isinstance(limit, int) and limit > 0)
+
+    where_items = list((where_dict or {}).items())
+    for x in exists or []:
+        where_items += list((x.where_dict or {}).items())
+    for k, v in where_items:
+        if v[0] == FETCH_API.where_operator.BETWEEN:
+            assert (
+                isinstance(v[1], tuple) and len(v[1]) == 2
+            ), "use tuple of len 2 for BETWEEN operator"
+        elif v[0] == FETCH_API.where_operator.IN:
+            assert isinstance(v[1], list), "use list type for IN operator"
+            assert all(is_enum_val(k, x) for x in v[1]), f"not in enum {k}: {v[1]}"
+        else:
+            assert is_enum_val(k, v[1]), f"not in enum {k}: {v[1]}"
+
+    for k, v in (keys or {}).items():
+        assert isinstance(v, list), "use list type for keys"
+        assert all(is_enum_val(k, x) for x in v), f"not in enum {k}: {v}"
+
+
+def compose_all_where_possibilities(
+    where_dict: dict[str, tuple[str, Any]],
+    prefix: str = "",
+) -> list:
+    """prefix is added to the placeholder names, not to the cols"""
     where_list = []
 
     for k, v in where_dict.items():
@@ -124,7 +206,7 @@ def compose_all_where_possibilities(where_dict: dict[str, tuple[str, Any]]) -> l
                     [
                         Identifier(*(k.split("."))),
                         SQL(f" {v[0]} "),
-                        Placeholder(k),
+                        Placeholder(f"{prefix}{k}"),
                     ],
                 )
             )
@@ -136,7 +218,7 @@ def compose_all_where_possibilities(where_dict: dict[str, tuple[str, Any]]) -> l
                         SQL(" = "),
                         SQL("ANY"),
                         SQL("("),
-                        Placeholder(k),
+                        Placeholder(f"{prefix}{k}"),
                         SQL(")"),
                     ],
                 )
@@ -147,9 +229,9 @@ def compose_all_where_possibilities(where_dict: dict[str, tuple[str, Any]]) -> l
                     [
                         Identifier(*(k.split("."))),
                         SQL(f" {v[0]} "),
-                        Placeholder(f"{k}.low"),
+                        Placeholder(f"{prefix}{k}.low"),
                         SQL(" AND "),
-                        Placeholder(f"{k}.high"),
+                        Placeholder(f"{prefix}{k}.high"),
                     ],
                 )
             )
@@ -159,40 +241,111 @@ def compose_all_where_possibilities(where_dict: dict[str, tuple[str, Any]]) -> l
     return where_list
 
 
-async def _fetch(
-    select_cols: list[str],
-    from_table: BaseModel,
-    join_tables: Optional[list[BaseModel]],
-    join_on: Optional[list[tuple[str, str]]],
-    where_dict: Optional[dict[str, tuple[str, Any]]],
-    group_by: Optional[list[str]],
-    order_by: Optional[list[tuple[str, str]]],
-    limit: Optional[int],
-) -> BaseModel | dict:
-    # pylint: disable-msg=too-many-locals
+def batch_key(val: Any) -> Any:
+    """normalize a key value so python inputs and fetched values compare equal"""
+    if isinstance(val, Enum):
+        return val.value
+    if isinstance(val, str) and is_valid_uuid(val):
+        return UUID(val)
+    return val
 
-    """Generic Fetch
-    - select_cols: table.col to return
-    - aggreg_cols: list of (function, col) tuple
-    - from_table: table to query
-    - join_table: list of tables to inner join
-    - join_on: list of tuples pairs of keys to join
-    - where_dict: {columns: (operator, value)} to filter table rows on
-    - group_by: list of cols to group on
-    - order_by: list of tuples of cols and direction (ASC|DESC)
-    - limit: int rows to return
 
-    -> returns either model or dict if return_cols is not "*"
+def is_batchable(from_table: BaseModel, where_dicts: list[dict]) -> bool:
+    """where_dicts that only test equality on the same cols of from_table"""
+    table_name = to_underscore(from_table.__name__)
+    key_cols = list(where_dicts[0])
+    return all(
+        isinstance(where_dict, dict)
+        and list(where_dict) == key_cols
+        and all(
+            v[0] == FETCH_API.where_operator.EQUAL
+            for v in add_equal_where_operator(where_dict).values()
+        )
+        for where_dict in where_dicts
+    ) and all(col.split(".")[0] == table_name for col in key_cols)
+
+
+class Exists(NamedTuple):
+    """[NOT] EXISTS (SELECT 1 FROM table WHERE correlate AND where_dict)
+    build with FETCH_API.exists() / FETCH_API.not_exists()
     """
-    # allow for list or single element
-    select_cols = lh.make_list(select_cols)
-    join_tables = lh.make_list(join_tables)
-    join_on = lh.make_list(join_on)
-    group_by = lh.make_list(group_by)
-    order_by = lh.make_list(order_by)
+
+    table: type[BaseModel]
+    correlate: tuple[tuple[str, str], ...]  # (table.col, outer table.col)
+    where_dict: Optional[dict[str, tuple[str, Any]]]
+    negate: bool
+
+    def shape(self) -> tuple:
+        return (
+            self.table,
+            self.correlate,
+            None
+            if self.where_dict is None
+            else tuple((k, v[0]) for k, v in self.where_dict.items()),
+            self.negate,
+        )
+
+
+class FetchShape(NamedTuple):
+    """everything that changes the SQL text, but none of the bound values"""
+
+    select_cols: tuple[str, ...]
+    from_table: type[BaseModel]
+    join_tables: Optional[tuple[type[BaseModel], ...]]
+    join_on: Optional[tuple[tuple[str, str], ...]]
+    join_types: Optional[tuple[str, ...]]
+    exists: Optional[tuple[tuple, ...]]  # Exists.shape()
+    where: Optional[tuple[tuple[str, str], ...]]  # (table.col, operator)
+    group_by: Optional[tuple[str, ...]]
+    order_by: Optional[tuple[tuple[str, str], ...]]
+    after_cols: Optional[tuple[str, ...]]
+    before_cols: Optional[tuple[str, ...]]
+    key_cols: Optional[tuple[str, ...]]
+    has_limit: bool
+
+
+@dataclass(frozen=True)
+class CompiledFetch:
+    """validated and fully composed query for one fetch shape"""
+
+    shape: FetchShape
+    tables: str
+    table_names: tuple[str, ...]
+    query: Composed
+    select_cols: tuple[str, ...]
+    return_all: bool
+    model_keys: dict[str, str]
+    has_limit: bool
+
+
+# query shape -> CompiledFetch. the app only issues a few dozen distinct
+# shapes, so entries are only dropped (oldest first) if something goes wrong
+QUERY_CACHE_MAXSIZE = 512
+_query_cache: dict[FetchShape, CompiledFetch] = {}
+_query_cache_stats = {"hits": 0, "misses": 0}
+
+
+def _compile_fetch(shape: FetchShape) -> CompiledFetch:
+    # pylint: disable-msg=too-many-locals
+
+    """validate a fetch shape and compose its SQL"""
+    select_cols = list(shape.select_cols)
+    from_table = shape.from_table
+    join_tables = lh.make_list(shape.join_tables and list(shape.join_tables))
+    join_on = lh.make_list(shape.join_on and list(shape.join_on))
+    join_types = lh.make_list(shape.join_types and list(shape.join_types))
+    exists = shape.exists
+    where_dict = (
+        None if shape.where is None else {k: (op, None) for k, op in shape.where}
+    )
+    group_by = lh.make_list(shape.group_by and list(shape.group_by))
+    order_by = lh.make_list(shape.order_by and list(shape.order_by))
+    after_cols, before_cols = shape.after_cols, shape.before_cols
+    key_cols = shape.key_cols
+    has_limit = shape.has_limit
 
     # validate from_table
-    assert issubclass(from_table, BaseModel)
+    assert is_table(from_table), f"not a table in the schema: {from_table}"
     table_name = to_underscore(from_table.__name__)
 
     # validate select_cols
@@ -204,9 +357,8 @@ async def _fetch(
         else select_cols
     )
     assert all(
-        len(col.split(".")) == 2 or (len(col.split(".")) == 3 and is_agg_col(col))
-        for col in select_cols
-    ), "expecting 'table.col' or 'agg.table.col'"
+        is_col_or_agg_col(col) for col in select_cols
+    ), f"expecting 'table.col' or 'agg.table.col' in the schema: {select_cols}"
 
     # validate join_tables and join_on
     assert (join_tables is None and join_on is None) or (
@@ -216,44 +368,32 @@ async def _fetch(
     if join_tables is not None:
         assert len(join_tables) > 0 and len(join_on) > 0
         assert len(join_tables) == len(join_on)
+        join_types = join_types or [FETCH_API.join.INNER] * len(join_tables)
+        assert len(join_types) == len(join_tables)
+        assert all(
+            x in (FETCH_API.join.INNER, FETCH_API.join.LEFT) for x in join_types
+        ), f"unknown join type in {join_types}"
         for table, on_tuple in zip(join_tables, join_on):
-            assert issubclass(table, BaseModel)
-            assert isinstance(on_tuple, tuple)
-            assert len(on_tuple[0].split(".")) == 2, "expecting 'table.col'"
-            assert len(on_tuple[1].split(".")) == 2, "expecting 'table.col'"
+            assert is_table(table), f"not a table in the schema: {table}"
+            assert isinstance(on_tuple, tuple) and len(on_tuple) == 2
+            assert all(is_col(col) for col in on_tuple), f"exp 'table.col': {on_tuple}"
+    else:
+        assert join_types is None, "join_types without join_tables"
 
     # validate where_dict
     assert where_dict is None or dh.is_valid_dict(where_dict)
     if where_dict is not None:
-        assert all(len(k.split(".")) == 2 for k in where_dict), "exp 'table.col'"
-        where_dict = add_equal_where_operator(where_dict)
+        assert all(is_col(k) for k in where_dict), f"exp 'table.col': {list(where_dict)}"
         assert all(
-            isinstance(x, tuple)
-            and x[0]
-            in [
-                v
-                for k, v in getmembers(FETCH_API.where_operator)
-                if not k.startswith("__")
-            ]
+            isinstance(x, tuple) and x[0] in get_where_operators()
             for x in where_dict.values()
         ), "where dict not in correct form { key: (operator, value) }"
-        assert all(
-            isinstance(x[1], list)
-            for x in where_dict.values()
-            if x[0] == FETCH_API.where_operator.IN
-        ), "use list type for IN operator"
-        assert all(
-            isinstance(x[1], tuple) and len(x[1]) == 2
-            for x in where_dict.values()
-            if x[0] == FETCH_API.where_operator.BETWEEN
-        ), "use tuple of len 2 for BETWEEN operator"
 
     # validate group_by
     assert group_by is None or lh.is_valid_list(group_by)
     if group_by is not None:
         assert all(
-            len(col.split(".")) == 2 or (len(col.split(".")) == 3 and is_agg_col(col))
-            for col in group_by
+            is_col_or_agg_col(col) for col in group_by
         ), "expecting 'table.col' or 'agg.table.col'"
 
     # validate order_by
@@ -262,20 +402,128 @@ async def _fetch(
         assert all(
             isinstance(x, tuple)
             and isinstance(x[0], str)
-            and (
-                len(x[0].split(".")) == 2
-                or (len(x[0].split(".")) == 3 and is_agg_col(x[0]))
-            )
+            and is_col_or_agg_col(x[0])
             and (x[1] == FETCH_API.order.ASC or x[1] == FETCH_API.order.DESC)
             for x in order_by
         ), "expecting ['table.col', order] or ['agg.table.col', order]"
 
-    # validate limit
-    assert limit is None or (isinstance(limit, int) and limit > 0)
+    # validate after / before keysets. the keyset cols must lead order_by,
+    # all in the same direction, so one row comparison finds the page start
+    keyset_predicates = []
+    for keyset_cols, is_after in [(after_cols, True), (before_cols, False)]:
+        if keyset_cols is None:
+            continue
+        assert len(keyset_cols) > 0
+        assert all(is_col(col) for col in keyset_cols), "exp 'table.col'"
+        assert order_by is not None and len(order_by) >= len(keyset_cols)
+        assert [x[0] for x in order_by[: len(keyset_cols)]] == list(
+            keyset_cols
+        ), "keyset cols must match the leading order_by cols"
+        directions = {x[1] for x in order_by[: len(keyset_cols)]}
+        assert len(directions) == 1, "keyset cols must share one order direction"
+
+        ascending = directions.pop() == FETCH_API.order.ASC
+        prefix = "after" if is_after else "before"
+        keyset_predicates.append(
+            Composed(
+                [
+                    SQL("("),
+                    SQL(", ").join([Identifier(*(col.split("."))) for col in keyset_cols]),
+                    SQL(") > (" if ascending == is_after else ") < ("),
+                    SQL(", ").join(
+                        [Placeholder(f"{prefix}.{col}") for col in keyset_cols]
+                    ),
+                    SQL(")"),
+                ],
+            )
+        )
+
+    # validate exists, correlated sub queries on a table not in the outer query
+    outer_tables = {table_name} | {
+        to_underscore(x.__name__) for x in (join_tables or [])
+    }
+    exists_tables = []
+    for i, (sub_table, correlate, sub_where, negate) in enumerate(exists or ()):
+        assert is_table(sub_table), f"not a table in the schema: {sub_table}"
+        sub_name = to_underscore(sub_table.__name__)
+        assert sub_name not in outer_tables, f"{sub_name} is already in the query"
+        assert len(correlate) > 0 or sub_where is not None
+        assert all(
+            is_col(inner) and inner.split(".")[0] == sub_name
+            and is_col(outer) and outer.split(".")[0] in outer_tables
+            for inner, outer in correlate
+        ), f"correlate expects [(sub table.col, outer table.col)]: {correlate}"
+        assert sub_where is None or all(
+            is_col(k) and k.split(".")[0] == sub_name and op in get_where_operators()
+            for k, op in sub_where
+        ), f"exists where_dict must be on {sub_name}"
+        exists_tables.append(sub_name)
+
+        sub_where_list = [
+            Composed(
+                [
+                    Identifier(*(inner.split("."))),
+                    SQL(" = "),
+                    Identifier(*(outer.split("."))),
+                ],
+            )
+            for inner, outer in correlate
+        ]
+        if sub_where is not None:
+            sub_where_list += compose_all_where_possibilities(
+                {k: (op, None) for k, op in sub_where}, prefix=f"exists{i}."
+            )
+        keyset_predicates.append(
+            SQL("{negate}EXISTS (SELECT 1 FROM {table} WHERE {where})").format(
+                negate=SQL("NOT " if negate else ""),
+                table=Identifier(sub_name),
+                where=SQL(" AND ").join(sub_where_list),
+            )
+        )
+
+    # validate key_cols, batch lookups of many keys of from_table at once.
+    # values are bound as one array per col, so any number of keys is 1 shape
+    if key_cols is not None:
+        assert len(key_cols) > 0
+        assert all(
+            is_col(col) and col.split(".")[0] == table_name
+            for col in key_cols
+        ), "key cols must be 'table.col' of from_table"
+        if len(key_cols) == 1:
+            keyset_predicates.append(
+                Composed(
+                    [
+                        Identifier(*(key_cols[0].split("."))),
+                        SQL(" = ANY("),
+                        Placeholder(f"keys.{key_cols[0]}"),
+                        SQL(")"),
+                    ],
+                )
+            )
+        else:
+            keyset_predicates.append(
+                Composed(
+                    [
+                        SQL("("),
+                        SQL(", ").join([Identifier(*(col.split("."))) for col in key_cols]),
+                        SQL(") IN (SELECT * FROM unnest("),
+                        SQL(", ").join(
+                            [
+                                SQL("{}::{}[]").format(
+                                    Placeholder(f"keys.{col}"),
+                                    SQL(get_schema_meta().columns[col].array_type),
+                                )
+                                for col in key_cols
+                            ]
+                        ),
+                        SQL("))"),
+                    ],
+                )
+            )
 
     # build up query
     base_query = "SELECT {fields} FROM {table} "
-    join_query = "INNER JOIN {joined_table} ON {join_pair} "
+    join_query = "{join_type} JOIN {joined_table} ON {join_pair} "
     where_query = "WHERE {where_pairs} "
     group_query = "GROUP BY {group_cols} "
     order_query = "ORDER BY {order_cols} "
@@ -320,6 +568,7 @@ async def _fetch(
 
         for i, join_table_name in enumerate(join_table_names):
             sql_join_query = SQL(join_query).format(
+                join_type=SQL(join_types[i]),
                 joined_table=Identifier(join_table_name),
                 join_pair=Composed(
                     [
@@ -332,12 +581,14 @@ async def _fetch(
             query += Composed([sql_join_query])
 
     # build up where query if specified
-    if where_dict is not None:
+    where_list = [] if where_dict is None else compose_all_where_possibilities(where_dict)
+    where_list += keyset_predicates
+    if where_list:
         sql_where_query = SQL(where_query).format(
             where_pairs=(
                 Composed(
                     [
-                        SQL(" AND ").join(compose_all_where_possibilities(where_dict)),
+                        SQL(" AND ").join(where_list),
                     ],
                 )
             ),
@@ -369,37 +620,300 @@ async def _fetch(
         )
         query += Composed(sql_order_query)
 
-    # build up limit query if specified
-    if limit is not None:
-        sql_limit_query = SQL(limit_query).format(limit_int=Literal(limit))
+    # build up limit query if specified. the value is bound, not composed,
+    # so every limit shares one compiled query
+    if has_limit:
+        sql_limit_query = SQL(limit_query).format(limit_int=Placeholder("limit"))
         query += Composed(sql_limit_query)
 
+    return CompiledFetch(
+        shape=shape,
+        tables="+".join([table_name] + (join_table_names if join_tables else [])),
+        table_names=tuple(
+            [table_name] + (join_table_names if join_tables else []) + exists_tables
+        ),
+        query=query,
+        select_cols=tuple(select_cols),
+        return_all=return_all,
+        model_keys={col: col.split(".")[1] for col in select_cols},
+        has_limit=has_limit,
+    )
+
+
+def _bind_fetch_vals(
+    compiled: CompiledFetch,
+    where_dict: Optional[dict[str, tuple[str, Any]]],
+    after: Optional[dict[str, Any]],
+    before: Optional[dict[str, Any]],
+    keys: Optional[dict[str, list]],
+    limit: Optional[int],
+    exists: Optional[list[Exists]] = None,
+) -> Optional[dict]:
+    """bound values for a compiled query, keyed by placeholder name"""
+    val_dict = format_val_dict(where_dict)
+    for i, x in enumerate(exists or []):
+        if x.where_dict is not None:
+            val_dict = {} if val_dict is None else val_dict
+            val_dict.update(format_val_dict(x.where_dict, prefix=f"exists{i}."))
+    for prefix, keyset in [("after", after), ("before", before)]:
+        if keyset is not None:
+            val_dict = {} if val_dict is None else val_dict
+            val_dict.update({f"{prefix}.{k}": v for k, v in keyset.items()})
+    if keys is not None:
+        val_dict = {} if val_dict is None else val_dict
+        val_dict.update({f"keys.{k}": v for k, v in keys.items()})
+    if compiled.has_limit:
+        val_dict = {} if val_dict is None else val_dict
+        val_dict["limit"] = limit
+    return val_dict
+
+
+def _prepare_fetch(
+    select_cols: list[str] | str,
+    from_table: BaseModel,
+    join_tables: Optional[list[BaseModel]],
+    join_on: Optional[list[tuple[str, str]]],
+    where_dict: Optional[dict[str, tuple[str, Any]]],
+    group_by: Optional[list[str]],
+    order_by: Optional[list[tuple[str, str]]],
+    limit: Optional[int],
+    after: Optional[dict[str, Any]] = None,
+    before: Optional[dict[str, Any]] = None,
+    keys: Optional[dict[str, list]] = None,
+    join_types: Optional[list[str]] = None,
+    exists: Optional[list[Exists]] = None,
+) -> tuple[CompiledFetch, Optional[dict]]:
+    """look up (or compile) the query for this shape and bind its values"""
+    # allow for list or single element
+    select_cols = lh.make_list(select_cols)
+    join_tables = lh.make_list(join_tables)
+    join_on = lh.make_list(join_on)
+    join_types = lh.make_list(join_types)
+    exists = lh.make_list(exists)
+    group_by = lh.make_list(group_by)
+    order_by = lh.make_list(order_by)
+    if where_dict is not None:
+        assert dh.is_valid_dict(where_dict)
+        where_dict = add_equal_where_operator(where_dict)
+
+    shape = FetchShape(
+        select_cols=tuple(select_cols),
+        from_table=from_table,
+        join_tables=None if join_tables is None else tuple(join_tables),
+        join_on=None if join_on is None else tuple(join_on),
+        join_types=None if join_types is None else tuple(join_types),
+        exists=None if exists is None else tuple(x.shape() for x in exists),
+        where=(
+            None
+            if where_dict is None
+            else tuple((k, v[0]) for k, v in where_dict.items())
+        ),
+        group_by=None if group_by is None else tuple(group_by),
+        order_by=None if order_by is None else tuple(order_by),
+        after_cols=None if after is None else tuple(after),
+        before_cols=None if before is None else tuple(before),
+        key_cols=None if keys is None else tuple(keys),
+        has_limit=limit is not None,
+    )
+    try:
+        compiled = _query_cache.get(shape)
+        hashable = True
+    except TypeError:
+        # unhashable input, it will not pass validation either
+        compiled, hashable = None, False
+
+    if compiled is None:
+        _query_cache_stats["misses"] += 1
+        compiled = _compile_fetch(shape)
+        check_fetch_vals(where_dict, keys, limit, exists)
+        if hashable:
+            if len(_query_cache) >= QUERY_CACHE_MAXSIZE:
+                del _query_cache[next(iter(_query_cache))]
+            _query_cache[shape] = compiled
+    else:
+        _query_cache_stats["hits"] += 1
+        # in production a shape that passed once is trusted
+        if not get_production_mode():
+            check_fetch_vals(where_dict, keys, limit, exists)
+
+    return compiled, _bind_fetch_vals(
+        compiled, where_dict, after, before, keys, limit, exists
+    )
+
+
+def read_cache_key(compiled: CompiledFetch, val_dict: Optional[dict]) -> Optional[tuple]:
+    """query shape + bound values, None if a value can not be hashed"""
+    key = (
+        compiled.shape,
+        tuple(
+            (k, tuple(v) if isinstance(v, list) else v)
+            for k, v in (val_dict or {}).items()
+        ),
+    )
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+async def _fetch(
+    select_cols: list[str],
+    from_table: BaseModel,
+    join_tables: Optional[list[BaseModel]],
+    join_on: Optional[list[tuple[str, str]]],
+    where_dict: Optional[dict[str, tuple[str, Any]]],
+    group_by: Optional[list[str]],
+    order_by: Optional[list[tuple[str, str]]],
+    limit: Optional[int],
+    after: Optional[dict[str, Any]] = None,
+    before: Optional[dict[str, Any]] = None,
+    keys: Optional[dict[str, list]] = None,
+    use_cache: bool = True,
+    join_types: Optional[list[str]] = None,
+    exists: Optional[list[Exists]] = None,
+) -> BaseModel | dict:
+    """Generic Fetch
+    - select_cols: table.col to return
+    - aggreg_cols: list of (function, col) tuple
+    - from_table: table to query
+    - join_table: list of tables to join
+    - join_on: list of tuples pairs of keys to join
+    - join_types: FETCH_API.join per join_table, INNER if not given
+    - where_dict: {columns: (operator, value)} to filter table rows on
+    - group_by: list of cols to group on
+    - order_by: list of tuples of cols and direction (ASC|DESC)
+    - limit: int rows to return
+    - after/before: {col: value} keyset of the leading order_by cols,
+      only rows strictly after/before it in that order are returned
+    - keys: {col: [values]} of from_table, rows matching any one key
+      (same position in every list) are returned
+    - use_cache: read through the read cache, if every table is cached
+    - exists: FETCH_API.exists() / not_exists() sub queries, all must hold
+
+    -> returns either model or dict if return_cols is not "*"
+    """
+    compiled, val_dict = _prepare_fetch(
+        select_cols=select_cols,
+        from_table=from_table,
+        join_tables=join_tables,
+        join_on=join_on,
+        where_dict=where_dict,
+        group_by=group_by,
+        order_by=order_by,
+        limit=limit,
+        after=after,
+        before=before,
+        keys=keys,
+        join_types=join_types,
+        exists=exists,
+    )
+
+    # check read cache. not inside a unit of work, it may see its own
+    # uncommitted writes
+    cache_key = None
+    if use_cache and get_read_cache_settings().tables and current_unit_of_work() is None:
+        cache = get_read_cache()
+        if cache.is_cacheable(compiled.table_names):
+            cache_key = read_cache_key(compiled, val_dict)
+    if cache_key is not None:
+        records = cache.get(cache_key)
+        if records is not None:
+            if not records:
+                raise NoRecordsFoundError
+            return to_models(compiled, from_table, records)
+        generation = cache.generation(compiled.table_names)
+
     # execute query
+    timer = QueryTimer("FETCH", compiled.shape, compiled.tables)
     async with (
-        get_async_pool().connection() as conn,
+        connection() as conn,
         conn.cursor(row_factory=dict_row) as cur,
     ):
-        val_dict = format_val_dict(where_dict)
-
-        logger.debug(f"query: {query.as_string(cur)}")
-        logger.debug(f"vals: {val_dict}")
-
-        await cur.execute(query, val_dict)
+        timer.connected()
+        await cur.execute(compiled.query, val_dict)
 
         records = await cur.fetchall()
+        timer.done(len(records), lambda: compiled.query.as_string(cur), val_dict)
+        if cache_key is not None:
+            cache.put(cache_key, compiled.table_names, generation, records)
         if not records:
             raise NoRecordsFoundError
-        logger.debug(f"fetched rows {records}")
-
-        # convert dict to model if all columns queried
-        # all dict keys are in form of "table.col":val and
-        # the model kwards wants "col":val
-        if return_all:
-            records = [
-                from_table(**dh.remove_prefix_from_each_key(row)) for row in records
-            ]
+
+        return to_models(compiled, from_table, records)
+
+
+def to_models(compiled: CompiledFetch, from_table: BaseModel, records: list[dict]):
+    """convert dict to model if all columns queried"""
+    if not compiled.return_all:
         return records
 
+    # all dict keys are in form of "table.col":val and
+    # the model kwards wants "col":val
+    model_keys = compiled.model_keys
+    return [from_table(**{model_keys[k]: v for k, v in row.items()}) for row in records]
+
+
+# server side cursors need a name that is unique on their connection
+_stream_ids = count()
+
+
+async def _stream(
+    select_cols: list[str],
+    from_table: BaseModel,
+    join_tables: Optional[list[BaseModel]],
+    join_on: Optional[list[tuple[str, str]]],
+    where_dict: Optional[dict[str, tuple[str, Any]]],
+    group_by: Optional[list[str]],
+    order_by: Optional[list[tuple[str, str]]],
+    limit: Optional[int],
+    batch_size: int,
+    after: Optional[dict[str, Any]] = None,
+    before: Optional[dict[str, Any]] = None,
+    join_types: Optional[list[str]] = None,
+    exists: Optional[list[Exists]] = None,
+) -> AsyncIterator[list[BaseModel] | list[dict]]:
+    """Generic Streaming Fetch
+    same query as _fetch, but read through a server side cursor
+    batch_size rows at a time, so memory use does not grow with the result
+
+    -> yields lists of models or dicts, nothing at all if no rows match
+    """
+    assert isinstance(batch_size, int) and batch_size > 0
+
+    compiled, val_dict = _prepare_fetch(
+        select_cols=select_cols,
+        from_table=from_table,
+        join_tables=join_tables,
+        join_on=join_on,
+        where_dict=where_dict,
+        group_by=group_by,
+        order_by=order_by,
+        limit=limit,
+        after=after,
+        before=before,
+        join_types=join_types,
+        exists=exists,
+    )
+
+    # the connection stays checked out until the generator is exhausted or
+    # closed, wrap early exits in contextlib.aclosing()
+    timer = QueryTimer("STREAM", compiled.shape, compiled.tables)
+    async with (
+        connection() as conn,
+        conn.cursor(
+            name=f"fetch_stream_{next(_stream_ids)}", row_factory=dict_row
+        ) as cur,
+    ):
+        timer.connected()
+        await cur.execute(compiled.query, val_dict)
+
+        n_rows = 0
+        while records := await cur.fetchmany(batch_size):
+            n_rows += len(records)
+            yield to_models(compiled, from_table, records)
+        timer.done(n_rows, lambda: compiled.query.as_string(cur), val_dict)
+
 
 class FETCH_API:
     # static members
@@ -418,6 +932,11 @@ class FETCH_API:
         MAX = "MAX"
         SUM = "SUM"
 
+    @dataclass(frozen=True)
+    class join:
+        INNER = "INNER"
+        LEFT = "LEFT"
+
     @dataclass(frozen=True)
     class where_operator:
         EQUAL = "="
@@ -430,11 +949,60 @@ class FETCH_API:
 
     @staticmethod
     def make_agg_col(agg_func: str, col_name: str) -> str:
-        assert any(
-            agg_func in x for x in getmembers(FETCH_API.agg_funcs)
-        ), f"not a valid agg func: {agg_func}"
+        assert agg_func in get_agg_funcs(), f"not a valid agg func: {agg_func}"
         return f"{agg_func}.{col_name}"
 
+    @staticmethod
+    def exists(
+        table: BaseModel,
+        correlate: list[tuple[str, str]] | tuple[str, str],
+        where_dict: Optional[dict[str, Any]] = None,
+    ) -> Exists:
+        """rows where a row of table matches, correlated on
+        [(table.col, outer table.col)] and filtered by where_dict
+        """
+        correlate = lh.make_list(correlate)
+        assert isinstance(correlate, list)
+        assert where_dict is None or dh.is_valid_dict(where_dict)
+        return Exists(
+            table=table,
+            correlate=tuple(correlate),
+            where_dict=None if where_dict is None else add_equal_where_operator(where_dict),
+            negate=False,
+        )
+
+    @staticmethod
+    def not_exists(
+        table: BaseModel,
+        correlate: list[tuple[str, str]] | tuple[str, str],
+        where_dict: Optional[dict[str, Any]] = None,
+    ) -> Exists:
+        """rows where no row of table matches, see exists()"""
+        return FETCH_API.exists(table, correlate, where_dict)._replace(negate=True)
+
+    @staticmethod
+    def query_cache_info() -> dict[str, int]:
+        """hit/miss counters for the compiled query-shape cache"""
+        return _query_cache_stats | {
+            "size": len(_query_cache),
+            "maxsize": QUERY_CACHE_MAXSIZE,
+        }
+
+    @staticmethod
+    def clear_query_cache() -> None:
+        _query_cache.clear()
+        _query_cache_stats["hits"] = 0
+        _query_cache_stats["misses"] = 0
+
+    @staticmethod
+    def read_cache_info() -> dict:
+        """hit/miss/eviction counters and size of the read cache"""
+        return get_read_cache().info()
+
+    @staticmethod
+    def clear_read_cache() -> None:
+        get_read_cache().clear()
+
     @staticmethod
     async def fetch_all(
         select_cols: list[str] | str,
@@ -443,6 +1011,7 @@ class FETCH_API:
         order_by: Optional[list[tuple[str, str]]] = None,
         limit: Optional[int] = None,
         flatten_return: bool = True,
+        use_cache: bool = True,
     ) -> list[BaseModel]:
         """Fetch all rows from table
 
@@ -457,6 +1026,7 @@ class FETCH_API:
             group_by=group_by,
             order_by=order_by,
             limit=limit,
+            use_cache=use_cache,
         )
 
         return flatten(rows, select_cols) if flatten_return else rows
@@ -466,6 +1036,7 @@ class FETCH_API:
         select_cols: list[str] | str,
         from_table: BaseModel,
         where_uuid: UUID,
+        use_cache: bool = True,
     ) -> BaseModel | dict:
         """Fetch rows where table.id==
 
@@ -480,6 +1051,7 @@ class FETCH_API:
             group_by=None,
             order_by=None,
             limit=None,
+            use_cache=use_cache,
         )
 
         assert len(rows) == 1
@@ -494,8 +1066,13 @@ class FETCH_API:
         order_by: Optional[list[tuple[str, str]]] = None,
         limit: Optional[int] = None,
         flatten_return: bool = True,
+        after: Optional[dict[str, Any]] = None,
+        before: Optional[dict[str, Any]] = None,
+        use_cache: bool = True,
+        exists: Optional[list[Exists] | Exists] = None,
     ) -> BaseModel | dict:
         """Fetch rows where table.key==value in where_dict
+        and every exists sub query holds
 
         -> returns model or dict
         """
@@ -508,6 +1085,10 @@ class FETCH_API:
             group_by=group_by,
             order_by=order_by,
             limit=limit,
+            after=after,
+            before=before,
+            use_cache=use_cache,
+            exists=exists,
         )
 
         return flatten(rows, select_cols) if flatten_return else rows
@@ -523,9 +1104,15 @@ class FETCH_API:
         order_by: Optional[list[tuple[str, str]]] = None,
         limit: Optional[int] = None,
         flatten_return: bool = True,
+        after: Optional[dict[str, Any]] = None,
+        before: Optional[dict[str, Any]] = None,
+        use_cache: bool = True,
+        join_types: Optional[list[str] | str] = None,
+        exists: Optional[list[Exists] | Exists] = None,
     ):
         """Fetch rows where table.key==value in where_dict
-        Joins n tables with join_on
+        and every exists sub query holds
+        Joins n tables with join_on, INNER unless join_types says LEFT
 
         -> returns model or dict
         """
@@ -538,33 +1125,224 @@ class FETCH_API:
             group_by=group_by,
             order_by=order_by,
             limit=limit,
+            after=after,
+            before=before,
+            use_cache=use_cache,
+            join_types=join_types,
+            exists=exists,
         )
 
         return flatten(rows, select_cols) if flatten_return else rows
 
+    @staticmethod
+    async def stream_where_dict(
+        select_cols: list[str] | str,
+        from_table: BaseModel,
+        where_dict: dict[str, tuple[str, Any]],
+        group_by: Optional[list[str]] = None,
+        order_by: Optional[list[tuple[str, str]]] = None,
+        limit: Optional[int] = None,
+        flatten_return: bool = True,
+        after: Optional[dict[str, Any]] = None,
+        before: Optional[dict[str, Any]] = None,
+        batch_size: int = 1000,
+        yield_batches: bool = False,
+        exists: Optional[list[Exists] | Exists] = None,
+    ) -> AsyncIterator:
+        """Stream rows where table.key==value in where_dict
+
+        -> yields models or dicts (values if one col selected and flatten_return),
+           or lists of them, up to batch_size long, if yield_batches
+        """
+        batches = _stream(
+            select_cols=select_cols,
+            from_table=from_table,
+            join_tables=None,
+            join_on=None,
+            where_dict=where_dict,
+            group_by=group_by,
+            order_by=order_by,
+            limit=limit,
+            after=after,
+            before=before,
+            batch_size=batch_size,
+            exists=exists,
+        )
+        async with aclosing(batches):
+            async for rows in batches:
+                rows = flatten_batch(rows, select_cols) if flatten_return else rows
+                if yield_batches:
+                    yield rows
+                else:
+                    for row in rows:
+                        yield row
+
+    @staticmethod
+    async def stream_join_where(
+        select_cols: list[str] | str,
+        from_table: BaseModel,
+        join_tables: list[BaseModel] | BaseModel,
+        join_on: list[tuple[str, str]] | tuple[str, str],
+        where_dict: dict[str, tuple[str, Any]],
+        group_by: Optional[list[str]] = None,
+        order_by: Optional[list[tuple[str, str]]] = None,
+        limit: Optional[int] = None,
+        flatten_return: bool = True,
+        after: Optional[dict[str, Any]] = None,
+        before: Optional[dict[str, Any]] = None,
+        batch_size: int = 1000,
+        yield_batches: bool = False,
+        join_types: Optional[list[str] | str] = None,
+        exists: Optional[list[Exists] | Exists] = None,
+    ) -> AsyncIterator:
+        """Stream rows where table.key==value in where_dict
+        Joins n tables with join_on, INNER unless join_types says LEFT
+
+        -> yields models or dicts (values if one col selected and flatten_return),
+           or lists of them, up to batch_size long, if yield_batches
+        """
+        batches = _stream(
+            select_cols=select_cols,
+            from_table=from_table,
+            join_tables=join_tables,
+            join_on=join_on,
+            where_dict=where_dict,
+            group_by=group_by,
+            order_by=order_by,
+            limit=limit,
+            after=after,
+            before=before,
+            batch_size=batch_size,
+            join_types=join_types,
+            exists=exists,
+        )
+        async with aclosing(batches):
+            async for rows in batches:
+                rows = flatten_batch(rows, select_cols) if flatten_return else rows
+                if yield_batches:
+                    yield rows
+                else:
+                    for row in rows:
+                        yield row
+
+    @staticmethod
+    async def batch_fetch_where_uuids(
+        select_cols: list[str] | str,
+        from_table: BaseModel,
+        where_uuids: list[UUID],
+        missing_ok: bool = False,
+        use_cache: bool = True,
+    ) -> list:
+        """Fetch many rows by table.id in one query
+
+        -> returns model or dict per uuid, in input order.
+           missing ids are None if missing_ok, else NoRecordsFoundError
+        """
+        id_col = f"{to_underscore(from_table.__name__)}.id"
+        return await FETCH_API.batch_fetch_where_dicts(
+            select_cols=select_cols,
+            from_table=from_table,
+            where_dicts=[{id_col: uuid} for uuid in where_uuids],
+            missing_ok=missing_ok,
+            use_cache=use_cache,
+        )
+
+    @staticmethod
+    async def batch_fetch_where_dicts(
+        select_cols: list[str] | str,
+        from_table: BaseModel,
+        where_dicts: list[dict[str, Any]],
+        order_by: Optional[list[tuple[str, str]]] = None,
+        flatten_return: bool = True,
+        missing_ok: bool = False,
+        use_cache: bool = True,
+    ) -> list:
+        """Fetch rows for many where_dicts in one query
+        every where_dict must test equality on the same cols of from_table
+
+        -> returns the fetch_where_dict result per where_dict, in input order.
+           keys with no rows are None if missing_ok, else NoRecordsFoundError
+        """
+        assert lh.is_valid_list(where_dicts)
+        assert all(dh.is_valid_dict(x) for x in where_dicts)
+        where_dicts = [add_equal_where_operator(x) for x in where_dicts]
+        key_cols = list(where_dicts[0])
+        assert all(list(x) == key_cols for x in where_dicts), "same keys in every dict"
+        assert all(
+            v[0] == FETCH_API.where_operator.EQUAL for x in where_dicts for v in x.values()
+        ), "only EQUAL can be batched"
+
+        # the key cols have to come back to match rows to their where_dict
+        select_cols = lh.make_list(select_cols)
+        return_all = check_return_all(select_cols)
+        query_cols = (
+            select_cols
+            if return_all
+            else select_cols + [col for col in key_cols if col not in select_cols]
+        )
+
+        # the same key in two where_dicts is only sent once
+        wanted = {tuple(batch_key(x[col][1]) for col in key_cols) for x in where_dicts}
+        try:
+            rows = await _fetch(
+                select_cols=query_cols,
+                from_table=from_table,
+                join_tables=None,
+                join_on=None,
+                where_dict=None,
+                group_by=None,
+                order_by=order_by,
+                limit=None,
+                keys={col: [key[i] for key in wanted] for i, col in enumerate(key_cols)},
+                use_cache=use_cache,
+            )
+        except NoRecordsFoundError:
+            rows = []
+
+        groups: dict[tuple, list] = {}
+        for row in rows:
+            key = tuple(
+                batch_key(getattr(row, col.split(".")[1]) if return_all else row[col])
+                for col in key_cols
+            )
+            if not return_all and len(query_cols) > len(select_cols):
+                row = {col: row[col] for col in select_cols}  # noqa: PLW2901
+            groups.setdefault(key, []).append(row)
+
+        results = []
+        for where_dict in where_dicts:
+            group = groups.get(tuple(batch_key(where_dict[col][1]) for col in key_cols))
+            if group is None:
+                if not missing_ok:
+                    raise NoRecordsFoundError(f"no rows for {where_dict}")
+                results.append(None)
+            else:
+                results.append(flatten(group, select_cols) if flatten_return else group)
+        return results
+
     @staticmethod
     async def tg_fetch_where_uuids(
         select_cols: list[str] | str,
         from_table: BaseModel,
         where_uuids: list[UUID],
     ) -> list[BaseModel] | list[dict]:
-        """ASYNC Task Group Multi Fetch"""
+        """Multi Fetch by table.id, one query for all uuids rather than a task
+        per uuid, see batch_fetch_where_uuids
+
+        -> returns model or dict per uuid, in input order, a repeated uuid
+           repeated. a missing uuid raises NoRecordsFoundError itself, no
+           longer inside the task group's ExceptionGroup
+        """
         assert isinstance(where_uuids, list)
         assert len(where_uuids) > 0
         assert isinstance(where_uuids[0], UUID)
 
-        async with asyncio.TaskGroup() as tg:
-            tasks = [
-                tg.create_task(
-                    FETCH_API.fetch_where_uuid(
-                        select_cols=select_cols,
-                        from_table=from_table,
-                        where_uuid=uuid,
-                    ),
-                )
-                for uuid in where_uuids
-            ]
-        return [tsk.result() for tsk in tasks]
+        # one query instead of a task (and pool connection) per uuid
+        return await FETCH_API.batch_fetch_where_uuids(
+            select_cols=select_cols,
+            from_table=from_table,
+            where_uuids=where_uuids,
+        )
 
     @staticmethod
     async def tg_fetch_where_dicts(
@@ -581,6 +1359,16 @@ class FETCH_API:
         assert len(where_dicts) > 0
         assert isinstance(where_dicts[0], dict)
 
+        # one query instead of a task (and pool connection) per where_dict
+        if group_by is None and limit is None and is_batchable(from_table, where_dicts):
+            return await FETCH_API.batch_fetch_where_dicts(
+                select_cols=select_cols,
+                from_table=from_table,
+                where_dicts=where_dicts,
+                order_by=order_by,
+                flatten_return=flatten_return,
+            )
+
         async with asyncio.TaskGroup() as tg:
             tasks = [
                 tg.create_task(
@@ -1,7 +1,18 @@
 import asyncio
 import logging
-from typing import Optional, TypeVar
-from uuid import UUID
+from decimal import Decimal
+from enum import Enum
+from functools import lru_cache
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    Optional,
+    TypeVar,
+)
+from uuid import UUID, uuid4
 
 from psycopg.rows import class_row, dict_row
 from psycopg.sql import SQL, Composed, Identifier, Placeholder
@@ -9,24 +20,75 @@ from pydantic import BaseModel
 
 from app.database.utils.dict_helper import add_prefix_to_each_key
 from app.database.utils.list_helper import make_list, remove_prefix_from_each_item
-from app.database.psql_mgr.psql_mgr import get_async_pool
+from app.database.psql_mgr.instrumentation import QueryTimer
+from app.database.psql_mgr.read_cache import invalidate_table
+from app.database.psql_mgr.unit_of_work import connection
 from app.database.psql_mgr.utils.parse_json import set_json_serdes, wrap_json_vals
 from app.database.psql_mgr.utils.parse_schema import to_underscore
+from app.database.psql_mgr.utils.schema_meta import get_schema_meta
 from app.database.utils.api_helper import check_return_all
 
 logger = logging.getLogger(__name__)
 set_json_serdes()
 
 
-@staticmethod
-async def _insert(
+@lru_cache(maxsize=256)
+def _validate_insert(
+    table_name: str,
+    fields: tuple[str, ...],
+    return_cols: Optional[tuple[str, ...]],
+) -> None:
+    """check one insert shape against the schema, once"""
+    table = get_schema_meta().tables.get(table_name)
+    assert table is not None, f"not a table in the schema: {table_name}"
+    assert all(x in table.columns for x in fields), f"not all cols of {table_name}"
+    assert table.required.issubset(fields), (
+        f"{table_name} missing required cols {sorted(table.required - set(fields))}"
+    )
+    assert return_cols is None or all(
+        x in table.columns for x in return_cols
+    ), f"not all return cols of {table_name}: {return_cols}"
+
+
+@lru_cache(maxsize=256)
+def _compose_insert(
+    table_name: str,
+    fields: tuple[str, ...],
+    return_cols: Optional[tuple[str, ...]],
+) -> Composed:
+    """compose the single row insert for one (table, fields, returning) shape"""
+    _validate_insert(table_name, fields, return_cols)
+
+    # possible queries
+    base_query = "INSERT INTO {table} ({fields}) VALUES ({values}) "
+    return_query = "RETURNING {ret_cols} "
+
+    # always build up base insert query
+    sql_base_query = SQL(base_query).format(
+        table=Identifier(table_name),
+        fields=SQL(", ").join(map(Identifier, fields)),
+        values=SQL(", ").join(map(Placeholder, fields)),
+    )
+    query = Composed(sql_base_query)
+
+    # build return query
+    if return_cols is not None:
+        sql_return_query = SQL(return_query).format(
+            ret_cols=SQL(", ").join(map(Identifier, return_cols)),
+        )
+        query += Composed(sql_return_query)
+
+    return query
+
+
+def _prepare_insert(
     row: BaseModel,
     return_cols: Optional[list[str]],
-) -> BaseModel | dict | None:
+) -> tuple[tuple, Composed, dict, bool]:
     """
-    Generic insert for ANY populated BaseModel.
+    the single row insert of row
 
-    -> returns updated model or dict
+    -> returns shape, query, bound values, and if it returns the whole row
     """
     assert isinstance(row, BaseModel)
     assert issubclass(row.__class__, BaseModel)
@@ -42,47 +104,287 @@ async def _insert(
         return_all = check_return_all(return_cols)
         return_cols = list(row.model_fields.keys()) if return_all else return_cols
 
-    # possible queries
-    base_query = "INSERT INTO {table} ({fields}) VALUES ({values}) "
-    return_query = "RETURNING {ret_cols} "
-
-    # always build up base insert query
-    sql_base_query = SQL(base_query).format(
-        table=Identifier(table_name),
-        fields=SQL(", ").join(map(Identifier, pop_fields)),
-        values=SQL(", ").join(map(Placeholder, pop_fields)),
+    shape = (
+        table_name,
+        tuple(pop_fields),
+        None if return_cols is None else tuple(return_cols),
     )
-    query = Composed(sql_base_query)
+    return shape, _compose_insert(*shape), pop_fields, return_all
 
-    # build return query
-    if return_cols is not None:
-        sql_return_query = SQL(return_query).format(
-            ret_cols=SQL(", ").join(map(Identifier, return_cols)),
-        )
-        query += Composed(sql_return_query)
+
+@staticmethod
+async def _insert(
+    row: BaseModel,
+    return_cols: Optional[list[str]],
+) -> BaseModel | dict | None:
+    """
+    Generic insert for ANY populated BaseModel.
+
+    -> returns updated model or dict
+    """
+    shape, query, pop_fields, return_all = _prepare_insert(row, return_cols)
+    table_name = shape[0]
 
     # execute query
+    timer = QueryTimer("INSERT", shape, table_name)
     async with (
-        get_async_pool().connection() as conn,
+        connection() as conn,
         conn.cursor(
             row_factory=class_row(row.__class__) if return_all else dict_row
         ) as cur,
     ):
-        logger.debug(f"query: {query.as_string(cur)}")
-        logger.debug(f"vals: {pop_fields}")
-
+        timer.connected()
         await cur.execute(query, pop_fields)
+        invalidate_table(table_name)
         if return_cols is not None:
             record = await cur.fetchone()
+            timer.done(1 if record else 0, lambda: query.as_string(cur), pop_fields)
             if not record:
                 logger.error("No Record Found")
                 raise RuntimeError("No Record Found")
-            logger.debug(f"inserted row {record}")
             return record
 
+        timer.done(1, lambda: query.as_string(cur), pop_fields)
         return None
 
 
+# schema type -> postgres type name for binary COPY. enum labels are sent
+# as text, their binary form is the same
+COPY_TYPES = {
+    "BOOLEAN": "bool",
+    "CHAR": "bpchar",
+    "VARCHAR": "varchar",
+    "TEXT": "text",
+    "NUMERIC": "numeric",
+    "DECIMAL": "numeric",
+    "REAL": "float4",
+    "FLOAT": "float8",
+    "INTEGER": "int4",
+    "INT": "int4",
+    "SERIAL": "int4",
+    "SMALLINT": "int2",
+    "BIGINT": "int8",
+    "TIMESTAMP": "timestamp",
+    "DATE": "date",
+    "UUID": "uuid",
+    "JSON": "json",
+    "JSONB": "jsonb",
+    "BYTEA": "bytea",
+}
+
+
+def to_decimal(val: Any) -> Any:
+    # the binary numeric dumper only takes Decimal / int, models hold floats
+    return Decimal(str(val)) if isinstance(val, float) else val
+
+
+def to_enum_label(val: Any) -> Any:
+    return val.value if isinstance(val, Enum) else val
+
+
+@lru_cache(maxsize=256)
+def _copy_plan(
+    table_name: str, fields: tuple[str, ...]
+) -> tuple[Composed, tuple[str, ...], tuple[Optional[Callable], ...]]:
+    """COPY statement, binary type names and per col value converters"""
+    _validate_insert(table_name, fields, None)
+    columns = get_schema_meta().tables[table_name].columns
+
+    types, converters = [], []
+    for field in fields:
+        col = columns[field]
+        assert not (col.enum and col.is_array), "enum arrays can not be copied"
+        base_type = "text" if col.enum else COPY_TYPES[col.sql_type]
+        types.append(f"{base_type}[]" if col.is_array else base_type)
+        if col.enum:
+            converters.append(to_enum_label)
+        elif col.sql_type in ("NUMERIC", "DECIMAL") and not col.is_array:
+            converters.append(to_decimal)
+        else:
+            converters.append(None)
+
+    query = SQL("COPY {table} ({fields}) FROM STDIN (FORMAT BINARY)").format(
+        table=Identifier(table_name),
+        fields=SQL(", ").join(map(Identifier, fields)),
+    )
+    return query, tuple(types), tuple(converters)
+
+
+async def _aiter_rows(rows: Iterable | AsyncIterable) -> AsyncIterator:
+    if isinstance(rows, AsyncIterable):
+        async for row in rows:
+            yield row
+    else:
+        for row in rows:
+            yield row
+
+
+# rows per bulk insert statement. values are bound as one array per col,
+# so this bounds statement size, there is no per row parameter limit
+BULK_CHUNK_ROWS = 5000
+
+
+@lru_cache(maxsize=256)
+def _compose_bulk_insert(
+    table_name: str,
+    fields: tuple[str, ...],
+    return_cols: Optional[tuple[str, ...]],
+) -> Composed:
+    """INSERT ... SELECT FROM unnest(), the same SQL for any number of rows"""
+    _validate_insert(table_name, fields, return_cols)
+    columns = get_schema_meta().tables[table_name].columns
+    assert not any(
+        columns[x].is_array for x in fields
+    ), "array cols can not be unnested"
+
+    query = SQL(
+        "INSERT INTO {table} ({fields}) SELECT * FROM unnest({arrays}) "
+    ).format(
+        table=Identifier(table_name),
+        fields=SQL(", ").join(map(Identifier, fields)),
+        arrays=SQL(", ").join(
+            [
+                SQL("{}::{}[]").format(Placeholder(x), SQL(columns[x].array_type))
+                for x in fields
+            ]
+        ),
+    )
+    if return_cols is not None:
+        query += SQL("RETURNING {ret_cols} ").format(
+            ret_cols=SQL(", ").join(map(Identifier, return_cols)),
+        )
+    return query
+
+
+def _plan_bulk_insert(
+    rows: list[BaseModel],
+    return_models: bool,
+) -> tuple[str, list[UUID], list[tuple[Composed, dict]]]:
+    """
+    statements to insert rows of one table, BULK_CHUNK_ROWS rows each.
+    rows missing an id get one generated here, so results can be matched
+    back to their row. rows with different set (not None) fields go in
+    separate statements, so unset cols still get their DEFAULT. tables with
+    no id col can be inserted, but not returned
+
+    -> returns table name, ids in input order ([] with no id col),
+       [(query, vals)]
+    """
+    assert isinstance(rows, list) and len(rows) > 0
+    model = rows[0].__class__
+    assert issubclass(model, BaseModel)
+    assert all(row.__class__ is model for row in rows), "rows of one table only"
+    has_id = "id" in model.model_fields
+    assert has_id or not return_models, "returning bulk inserted rows needs an id col"
+
+    table_name = to_underscore(model.__name__)
+    ids = [uuid4() if row.id is None else row.id for row in rows] if has_id else []
+
+    dumped_rows = [
+        wrap_json_vals(row.model_dump(exclude_none=True)) for row in rows
+    ]
+    if has_id:
+        dumped_rows = [
+            {"id": row_id} | dumped for dumped, row_id in zip(dumped_rows, ids)
+        ]
+    return_cols = tuple(model.model_fields) if return_models else None
+
+    statements = _chunk_statements(
+        dumped_rows,
+        lambda fields: _compose_bulk_insert(table_name, fields, return_cols),
+    )
+    return table_name, ids, statements
+
+
+def _chunk_statements(
+    dumped_rows: list[dict],
+    compose: Callable[[tuple[str, ...]], Composed],
+) -> list[tuple[Composed, dict]]:
+    """
+    group rows on their set fields, then BULK_CHUNK_ROWS rows per statement.
+    compose makes the query of one group's fields
+
+    -> returns [(query, vals)]
+    """
+    groups: dict[tuple[str, ...], list[dict]] = {}
+    for dumped in dumped_rows:
+        groups.setdefault(tuple(dumped), []).append(dumped)
+
+    statements = []
+    for fields, group in groups.items():
+        query = compose(fields)
+        for i_start in range(0, len(group), BULK_CHUNK_ROWS):
+            chunk = group[i_start : i_start + BULK_CHUNK_ROWS]
+            statements.append((query, {x: [row[x] for row in chunk] for x in fields}))
+    return statements
+
+
+@lru_cache(maxsize=256)
+def _compose_upsert(
+    table_name: str,
+    fields: tuple[str, ...],
+    conflict_cols: tuple[str, ...],
+    update_cols: Optional[tuple[str, ...]],
+    return_cols: Optional[tuple[str, ...]],
+) -> Composed:
+    """bulk insert, ON CONFLICT (conflict_cols) DO UPDATE update_cols or DO NOTHING"""
+    columns = get_schema_meta().tables[table_name].columns
+    assert all(
+        x in columns for x in conflict_cols
+    ), f"not all cols of {table_name}: {conflict_cols}"
+    assert update_cols is None or set(update_cols).issubset(fields), (
+        f"update cols must be set on every row: {update_cols}"
+    )
+
+    query = _compose_bulk_insert(table_name, fields, None)
+    query += SQL("ON CONFLICT ({conflict_cols}) ").format(
+        conflict_cols=SQL(", ").join(map(Identifier, conflict_cols)),
+    )
+    if update_cols is None:
+        query += SQL("DO NOTHING ")
+    else:
+        query += SQL("DO UPDATE SET {updates} ").format(
+            updates=SQL(", ").join(
+                [
+                    SQL("{col} = EXCLUDED.{col}").format(col=Identifier(x))
+                    for x in update_cols
+                ]
+            ),
+        )
+    if return_cols is not None:
+        query += SQL("RETURNING {ret_cols} ").format(
+            ret_cols=SQL(", ").join(map(Identifier, return_cols)),
+        )
+    return query
+
+
+async def _bulk_insert(rows: list[BaseModel], return_models: bool) -> list:
+    """
+    insert rows of one table in chunks of BULK_CHUNK_ROWS, one transaction
+
+    -> returns ids, or models if return_models, in input order
+    """
+    table_name, ids, statements = _plan_bulk_insert(rows, return_models)
+    model = rows[0].__class__
+
+    # execute query
+    timer = QueryTimer("INSERT", ("BULK", table_name, return_models), table_name)
+    by_id = {}
+    async with (
+        connection() as conn,
+        conn.cursor(row_factory=class_row(model) if return_models else dict_row) as cur,
+    ):
+        timer.connected()
+        for query, vals in statements:
+            await cur.execute(query, vals)
+            if return_models:
+                by_id.update({record.id: record for record in await cur.fetchall()})
+        invalidate_table(table_name)
+        timer.done(len(rows), lambda: query.as_string(cur))
+
+    return [by_id[x] for x in ids] if return_models else ids
+
+
 # this auto types the return based on input
 T = TypeVar("T")
 
@@ -181,11 +483,16 @@ class INSERT_API:
         assert len(rows) > 0
         assert isinstance(rows[0], BaseModel)
 
-        async with asyncio.TaskGroup() as tg:
-            tasks = [
-                tg.create_task(INSERT_API.insert_row_ret_model(row)) for row in rows
-            ]
-        return [tsk.result() for tsk in tasks]
+        # bulk inserted rows are matched back to their input on id
+        if "id" not in rows[0].__class__.model_fields:
+            async with asyncio.TaskGroup() as tg:
+                tasks = [
+                    tg.create_task(INSERT_API.insert_row_ret_model(row)) for row in rows
+                ]
+            return [tsk.result() for tsk in tasks]
+
+        # one chunked statement instead of a task (and pool connection) per row
+        return await INSERT_API.bulk_insert_ret_models(rows)
 
     @staticmethod
     async def tg_insert_rows_ret_uuids(
@@ -200,11 +507,8 @@ class INSERT_API:
         assert len(rows) > 0
         assert isinstance(rows[0], BaseModel)
 
-        async with asyncio.TaskGroup() as tg:
-            tasks = [
-                tg.create_task(INSERT_API.insert_row_ret_uuid(row)) for row in rows
-            ]
-        return [tsk.result() for tsk in tasks]
+        # one chunked statement instead of a task (and pool connection) per row
+        return await INSERT_API.bulk_insert_ret_uuids(rows)
 
     @staticmethod
     async def tg_insert_rows_ret_dict(
@@ -232,52 +536,223 @@ class INSERT_API:
         rows: list[BaseModel],
     ) -> None:
         """
-        Generic insert for ANY populated BaseModel.
+        Generic insert for ANY populated BaseModels of one table,
+        in chunked multi row statements. ledger rows skip the balance and
+        snapshot upkeep of add_transaction, follow a load of them with
+        rebuild_account_balances and rebuild_daily_snapshots
 
-        -> returns updated model or dict
+        -> returns None
         """
-        assert isinstance(rows, list)
-        assert all(isinstance(x, BaseModel) for x in rows)
-        assert all(issubclass(row.__class__, BaseModel) for row in rows)
+        await _bulk_insert(rows, return_models=False)
+
+    @staticmethod
+    async def bulk_insert_ret_uuids(
+        rows: list[BaseModel],
+    ) -> list[UUID]:
+        """
+        inserts rows of one table in chunked multi row statements.
+        a ledger load needs both rebuilds after, see bulk_insert
+
+        --> returns ids, in input order
+        """
+        assert "id" in rows[0].__class__.model_fields, "table has no id col to return"
+        return await _bulk_insert(rows, return_models=False)
+
+    @staticmethod
+    async def bulk_insert_ret_models(
+        rows: list[T],
+    ) -> list[T]:
+        """
+        inserts rows of one table in chunked multi row statements. the
+        table needs an id col, see tg_insert_rows_ret_model otherwise.
+        a ledger load needs both rebuilds after, see bulk_insert
+
+        --> returns populated BaseModels, in input order
+        """
+        return await _bulk_insert(rows, return_models=True)
+
+    @staticmethod
+    async def upsert_rows(
+        rows: list[T],
+        conflict_cols: list[str] | str,
+        update_cols: Optional[list[str] | str] = None,
+        return_cols: Optional[list[str] | str] = None,
+    ) -> Optional[list[T] | list[dict]]:
+        """
+        inserts rows of one table, one row or many, in chunked multi row
+        statements. a row that conflicts with an existing one on
+        conflict_cols updates it instead, in the same statement
+
+        - conflict_cols: table.col of a unique constraint of the table
+        - update_cols: table.col to take from the new row on conflict,
+          None to keep the existing row (DO NOTHING)
+        - return_cols: "*" for models, table.col for dicts, None for nothing
+
+        with DO NOTHING, rows that conflicted are not returned. to get them
+        back unchanged, update one of the conflict_cols instead
+
+        --> returns the inserted / updated rows, in the order postgres
+            returns them
+        """
+        assert isinstance(rows, list) and len(rows) > 0
+        model = rows[0].__class__
+        assert issubclass(model, BaseModel)
+        assert all(row.__class__ is model for row in rows), "rows of one table only"
+        table_name = to_underscore(model.__name__)
+
+        conflict_cols = tuple(remove_prefix_from_each_item(make_list(conflict_cols)))
+        if update_cols is not None:
+            update_cols = tuple(remove_prefix_from_each_item(make_list(update_cols)))
+        return_all = False
+        if return_cols is not None:
+            return_all = check_return_all(return_cols)
+            return_cols = (
+                tuple(model.model_fields)
+                if return_all
+                else tuple(remove_prefix_from_each_item(make_list(return_cols)))
+            )
+
+        dumped_rows = [
+            wrap_json_vals(row.model_dump(exclude_none=True)) for row in rows
+        ]
+        if update_cols is not None:
+            # postgres can not update one row twice in one statement
+            keys = [tuple(x.get(col) for col in conflict_cols) for x in dumped_rows]
+            assert len(set(keys)) == len(keys), "rows conflict with each other"
+        statements = _chunk_statements(
+            dumped_rows,
+            lambda fields: _compose_upsert(
+                table_name, fields, conflict_cols, update_cols, return_cols
+            ),
+        )
 
         # execute query
+        timer = QueryTimer(
+            "INSERT",
+            ("UPSERT", table_name, conflict_cols, update_cols, return_cols),
+            table_name,
+        )
+        records = []
         async with (
-            get_async_pool().connection() as conn,
+            connection() as conn,
+            conn.cursor(
+                row_factory=class_row(model) if return_all else dict_row
+            ) as cur,
+        ):
+            timer.connected()
+            for query, vals in statements:
+                await cur.execute(query, vals)
+                if return_cols is not None:
+                    records.extend(await cur.fetchall())
+            invalidate_table(table_name)
+            timer.done(len(rows), lambda: query.as_string(cur))
+
+        if return_cols is None:
+            return None
+        if return_all:
+            return records
+        return [add_prefix_to_each_key(x, table_name) for x in records]
+
+    @staticmethod
+    async def insert_in_transaction(
+        *row_lists: list[BaseModel],
+    ) -> list[list[UUID]]:
+        """
+        inserts each list of rows (one table per list, in the order given)
+        in one transaction on one connection, pipelined into a single round
+        trip. either every row is inserted or none are. set ids on parent
+        rows up front to reference them from rows in later lists. in a
+        unit_of_work it is a savepoint, and the statements before and after
+        it, and the commit, are round trips of their own
+
+        --> returns ids per list, in input order ([] for a table with no id col)
+        """
+        assert len(row_lists) > 0
+        plans = [
+            _plan_bulk_insert(rows, return_models=False) if rows else ("", [], [])
+            for rows in row_lists
+        ]
+        table_names = tuple(x[0] for x in plans if x[0])
+
+        # execute query
+        timer = QueryTimer(
+            "INSERT", ("TRANSACTION",) + table_names, "+".join(table_names)
+        )
+        async with (
+            connection() as conn,
             conn.cursor() as cur,
         ):
-            table_name = to_underscore(rows[0].__class__.__name__)
-            pop_fields = rows[0].model_dump(exclude_none=True).keys()
-            values = []
-            for row in rows:
-                dumped: dict = wrap_json_vals(row.model_dump(exclude_none=True))
-                values += list(dumped.values())
-
-            n_fields = len(pop_fields)
-            n_rows = len(rows)
-
-            # possible queries
-            base_query = "INSERT INTO {table} ({fields}) VALUES {values}"
-
-            # always build up base insert query
-            query = SQL(base_query).format(
-                table=Identifier(table_name),
-                fields=SQL(", ").join(map(Identifier, pop_fields)),
-                values=SQL(", ").join(
-                    [
-                        Composed(
-                            [
-                                SQL("("),
-                                SQL(", ").join(Placeholder() * n_fields),
-                                SQL(")"),
-                            ]
-                        )
-                        for _ in range(n_rows)
-                    ]
-                ),
+            timer.connected()
+            async with conn.pipeline(), conn.transaction():
+                for _, _, statements in plans:
+                    for query, vals in statements:
+                        await cur.execute(query, vals)
+            for table_name in set(table_names):
+                invalidate_table(table_name)
+            timer.done(
+                sum(len(x) for x in row_lists),
+                lambda: "; ".join(q.as_string(cur) for x in plans for q, _ in x[2]),
             )
 
-            logger.debug(f"query: {query.as_string(cur)}")
-            logger.debug(f"vals: {values}")
+        return [x[1] for x in plans]
+
+    @staticmethod
+    async def copy_rows(
+        rows: Iterable[BaseModel] | AsyncIterable[BaseModel],
+        fields: Optional[list[str]] = None,
+    ) -> int:
+        """
+        Bulk load rows of one table with a binary COPY, in one statement
+        no matter how many rows. rows are streamed, so a generator or async
+        generator never has to be held in memory. no balances or
+        snapshots are kept up, after a ledger load run
+        rebuild_account_balances and rebuild_daily_snapshots
+
+        - fields: cols to copy, default is the set (not None) fields of the
+          first row. a None in a later row is copied as NULL, not DEFAULT
+
+        --> returns number of rows copied
+        """
+        row_iter = aiter(_aiter_rows(rows))
+        try:
+            first = await anext(row_iter)
+        except StopAsyncIteration:
+            return 0
+        assert isinstance(first, BaseModel)
+
+        model = first.__class__
+        table_name = to_underscore(model.__name__)
+        fields = tuple(
+            first.model_dump(exclude_none=True).keys() if fields is None else fields
+        )
+        query, types, converters = _copy_plan(table_name, fields)
+        not_copied = set(model.model_fields) - set(fields)
+
+        def to_tuple(row: BaseModel) -> tuple:
+            assert row.__class__ is model, f"every row must be {model.__name__}"
+            assert all(
+                getattr(row, x) is None for x in not_copied
+            ), f"row sets fields not being copied, copy fields={fields}"
+            return tuple(
+                (conv(val) if conv is not None else val)
+                for conv, val in zip(converters, map(row.__getattribute__, fields))
+            )
 
-            await cur.execute(query, values)
-            return
+        # execute query
+        timer = QueryTimer("COPY", ("COPY", table_name, fields), table_name)
+        n_rows = 0
+        async with (
+            connection() as conn,
+            conn.cursor() as cur,
+        ):
+            timer.connected()
+            async with cur.copy(query) as copy:
+                copy.set_types(types)
+                await copy.write_row(to_tuple(first))
+                n_rows += 1
+                async for row in row_iter:
+                    await copy.write_row(to_tuple(row))
+                    n_rows += 1
+            invalidate_table(table_name)
+            timer.done(n_rows, lambda: query.as_string(cur))
+        return n_rows
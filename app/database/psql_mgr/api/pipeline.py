@@ -0,0 +1,211 @@
+import logging
+from contextlib import AsyncExitStack
+from typing import Any, Callable, Hashable, NamedTuple, Optional
+
+from psycopg.rows import class_row, dict_row
+from psycopg.sql import Composed
+from pydantic import BaseModel
+
+from app.database.psql_mgr.api.fetch import Exists, _prepare_fetch, flatten, to_models
+from app.database.psql_mgr.api.insert import _prepare_insert
+from app.database.psql_mgr.instrumentation import QueryTimer
+from app.database.psql_mgr.read_cache import invalidate_table
+from app.database.psql_mgr.unit_of_work import connection
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineOp(NamedTuple):
+    shape: Hashable
+    table: str
+    query: Composed
+    vals: Optional[dict]
+    row_factory: Any
+    returns: bool  # has rows to fetch
+    writes: bool
+    result: Callable[[list], Any]  # fetched rows -> result of the op
+
+
+class Pipeline:
+    """
+    collects independent FETCH / INSERT statements, then sends them all on
+    one connection in psycopg pipeline mode. N statements cost about one
+    network round trip instead of N
+
+    usage:
+        pipe = Pipeline()
+        pipe.fetch_where_dict(select_cols=..., from_table=..., where_dict=...)
+        pipe.insert_row_ret_uuid(m_Account(...))
+        accounts, new_id = await pipe.execute()
+
+    a statement can not use the result of another in the same pipeline.
+    they run in the order added, in one transaction (or in the unit of
+    work if in one). if one fails, execute() raises and none are kept.
+    reads do not go through the read cache
+    """
+
+    def __init__(self):
+        self._ops: list[PipelineOp] = []
+
+    def __len__(self) -> int:
+        return len(self._ops)
+
+    def fetch_where_dict(
+        self,
+        select_cols: list[str] | str,
+        from_table: BaseModel,
+        where_dict: dict[str, tuple[str, Any]],
+        group_by: Optional[list[str]] = None,
+        order_by: Optional[list[tuple[str, str]]] = None,
+        limit: Optional[int] = None,
+        flatten_return: bool = True,
+        exists: Optional[list[Exists] | Exists] = None,
+    ) -> int:
+        """FETCH_API.fetch_where_dict, resolves to None if no rows match
+
+        -> returns position of its result
+        """
+        return self.fetch_join_where(
+            select_cols=select_cols,
+            from_table=from_table,
+            join_tables=None,
+            join_on=None,
+            where_dict=where_dict,
+            group_by=group_by,
+            order_by=order_by,
+            limit=limit,
+            flatten_return=flatten_return,
+            exists=exists,
+        )
+
+    def fetch_join_where(
+        self,
+        select_cols: list[str] | str,
+        from_table: BaseModel,
+        join_tables: Optional[list[BaseModel] | BaseModel],
+        join_on: Optional[list[tuple[str, str]] | tuple[str, str]],
+        where_dict: dict[str, tuple[str, Any]],
+        group_by: Optional[list[str]] = None,
+        order_by: Optional[list[tuple[str, str]]] = None,
+        limit: Optional[int] = None,
+        flatten_return: bool = True,
+        join_types: Optional[list[str]] = None,
+        exists: Optional[list[Exists] | Exists] = None,
+    ) -> int:
+        """FETCH_API.fetch_join_where, resolves to None if no rows match
+        (FETCH_API raises NoRecordsFoundError, which would lose the other
+        results)
+
+        -> returns position of its result
+        """
+        compiled, val_dict = _prepare_fetch(
+            select_cols=select_cols,
+            from_table=from_table,
+            join_tables=join_tables,
+            join_on=join_on,
+            where_dict=where_dict,
+            group_by=group_by,
+            order_by=order_by,
+            limit=limit,
+            join_types=join_types,
+            exists=exists,
+        )
+
+        def result(records: list) -> Any:
+            if not records:
+                return None
+            rows = to_models(compiled, from_table, records)
+            return flatten(rows, select_cols) if flatten_return else rows
+
+        return self._add(
+            PipelineOp(
+                shape=compiled.shape,
+                table=compiled.tables,
+                query=compiled.query,
+                vals=val_dict,
+                row_factory=dict_row,
+                returns=True,
+                writes=False,
+                result=result,
+            )
+        )
+
+    def insert_row(self, row: BaseModel) -> int:
+        """INSERT_API.insert_row, resolves to None
+
+        -> returns position of its result
+        """
+        return self._add_insert(row, None, lambda records: None)
+
+    def insert_row_ret_uuid(self, row: BaseModel) -> int:
+        """INSERT_API.insert_row_ret_uuid, resolves to the new id
+
+        -> returns position of its result
+        """
+        return self._add_insert(row, ["id"], lambda records: records[0]["id"])
+
+    def insert_row_ret_model(self, row: BaseModel) -> int:
+        """INSERT_API.insert_row_ret_model, resolves to the populated model
+
+        -> returns position of its result
+        """
+        return self._add_insert(row, ["*"], lambda records: records[0])
+
+    def _add_insert(
+        self,
+        row: BaseModel,
+        return_cols: Optional[list[str]],
+        result: Callable[[list], Any],
+    ) -> int:
+        shape, query, pop_fields, return_all = _prepare_insert(row, return_cols)
+        return self._add(
+            PipelineOp(
+                shape=shape,
+                table=shape[0],
+                query=query,
+                vals=pop_fields,
+                row_factory=class_row(row.__class__) if return_all else dict_row,
+                returns=return_cols is not None,
+                writes=True,
+                result=result,
+            )
+        )
+
+    def _add(self, op: PipelineOp) -> int:
+        self._ops.append(op)
+        return len(self._ops) - 1
+
+    async def execute(self) -> list:
+        """
+        send every statement, then read every result
+
+        -> returns the result of each statement, in the order added
+        """
+        ops, self._ops = self._ops, []
+        if not ops:
+            return []
+
+        tables = tuple(dict.fromkeys(x.table for x in ops))
+        timer = QueryTimer("PIPELINE", tuple(x.shape for x in ops), "+".join(tables))
+        async with connection() as conn, AsyncExitStack() as stack:
+            timer.connected()
+            cursors = []
+            async with conn.pipeline():
+                for op in ops:
+                    cur = await stack.enter_async_context(conn.cursor(row_factory=op.row_factory))
+                    await cur.execute(op.query, op.vals)
+                    cursors.append(cur)
+                # the first fetch syncs the pipeline, every result arrives with it
+                records = [
+                    (await cur.fetchall()) if op.returns else []
+                    for op, cur in zip(ops, cursors)
+                ]
+
+            for table in dict.fromkeys(x.table for x in ops if x.writes):
+                invalidate_table(table)
+            timer.done(
+                sum(len(x) for x in records),
+                lambda: "; ".join(op.query.as_string(cur) for op, cur in zip(ops, cursors)),
+            )
+
+        return [op.result(x) for op, x in zip(ops, records)]
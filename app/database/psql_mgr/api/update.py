@@ -0,0 +1,207 @@
+import logging
+from functools import lru_cache
+from typing import Any, Optional
+
+from psycopg.sql import SQL, Composed, Identifier, Placeholder
+from pydantic import BaseModel
+
+from app.database.utils import dict_helper as dh
+from app.database.utils import list_helper as lh
+from app.database.psql_mgr.api.fetch import (
+    add_equal_where_operator,
+    check_fetch_vals,
+    compose_all_where_possibilities,
+    format_val_dict,
+    is_enum_val,
+)
+from app.database.psql_mgr.api.insert import BULK_CHUNK_ROWS
+from app.database.psql_mgr.instrumentation import QueryTimer
+from app.database.psql_mgr.read_cache import invalidate_table
+from app.database.psql_mgr.unit_of_work import connection
+from app.database.psql_mgr.utils.parse_json import set_json_serdes, wrap_json_vals
+from app.database.psql_mgr.utils.parse_schema import to_underscore
+from app.database.psql_mgr.utils.schema_meta import get_schema_meta
+
+logger = logging.getLogger(__name__)
+set_json_serdes()
+
+
+def _check_update_cols(table_name: str, cols: tuple[str, ...]) -> None:
+    table = get_schema_meta().tables.get(table_name)
+    assert table is not None, f"not a table in the schema: {table_name}"
+    assert len(cols) > 0, "nothing to update"
+    assert all(x in table.columns for x in cols), f"not all cols of {table_name}: {cols}"
+
+
+@lru_cache(maxsize=256)
+def _compose_update_where(
+    table_name: str,
+    set_cols: tuple[str, ...],
+    where_shape: tuple[tuple[str, str], ...],
+) -> Composed:
+    """UPDATE table SET col = val ... WHERE ..., one statement for any number of rows"""
+    _check_update_cols(table_name, set_cols)
+    assert all(
+        x.split(".")[0] == table_name for x, _ in where_shape
+    ), f"where cols must be of {table_name}"
+
+    query = SQL("UPDATE {table} SET {updates} WHERE ").format(
+        table=Identifier(table_name),
+        updates=SQL(", ").join(
+            [
+                SQL("{} = {}").format(Identifier(x), Placeholder(f"set.{x}"))
+                for x in set_cols
+            ]
+        ),
+    )
+    # only the operator of each where col goes into the shape, the values
+    # are bound
+    where_list = compose_all_where_possibilities(
+        {k: (op, None) for k, op in where_shape}, prefix="where."
+    )
+    return query + SQL(" AND ").join(where_list) + SQL(" ")
+
+
+@lru_cache(maxsize=256)
+def _compose_update_rows(
+    table_name: str,
+    key_col: str,
+    set_cols: tuple[str, ...],
+) -> Composed:
+    """
+    UPDATE table SET col = v.col ... FROM unnest(arrays) AS v(...)
+    WHERE table.key = v.key, a different value per row in one statement
+    """
+    _check_update_cols(table_name, (key_col,) + set_cols)
+    assert key_col not in set_cols, "can not update the key col"
+    columns = get_schema_meta().tables[table_name].columns
+    fields = (key_col,) + set_cols
+    assert not any(columns[x].is_array for x in fields), "array cols can not be unnested"
+
+    return SQL(
+        "UPDATE {table} SET {updates} FROM unnest({arrays}) AS v({fields}) "
+        "WHERE {table}.{key} = v.{key} "
+    ).format(
+        table=Identifier(table_name),
+        updates=SQL(", ").join(
+            [SQL("{col} = v.{col}").format(col=Identifier(x)) for x in set_cols]
+        ),
+        arrays=SQL(", ").join(
+            [
+                SQL("{}::{}[]").format(Placeholder(x), SQL(columns[x].array_type))
+                for x in fields
+            ]
+        ),
+        fields=SQL(", ").join(map(Identifier, fields)),
+        key=Identifier(key_col),
+    )
+
+
+async def _update(
+    table_name: str,
+    shape: tuple,
+    statements: list[tuple[Composed, dict]],
+) -> int:
+    """run the statements in one transaction -> returns rows updated"""
+    timer = QueryTimer("UPDATE", shape, table_name)
+    n_rows = 0
+    async with (
+        connection() as conn,
+        conn.cursor() as cur,
+    ):
+        timer.connected()
+        for query, vals in statements:
+            await cur.execute(query, vals)
+            n_rows += max(cur.rowcount, 0)
+        invalidate_table(table_name)
+        timer.done(n_rows, lambda: query.as_string(cur))
+    return n_rows
+
+
+class UPDATE_API:
+    @staticmethod
+    async def update_where_dict(
+        table: BaseModel,
+        set_dict: dict[str, Any],
+        where_dict: dict[str, Any] | dict[str, tuple[str, Any]],
+    ) -> int:
+        """
+        sets the same values on every row of table matching where_dict,
+        in one statement
+
+        - set_dict: {table.col: value} to set
+        - where_dict: {table.col: value | (operator, value)}, same as
+          FETCH_API. can not be empty, no accidental whole table updates
+
+        usage:
+            await UPDATE_API.update_where_dict(
+                m_Ledger,
+                {c_Ledger.reconciled: True},
+                {c_Ledger.id: (FETCH_API.where_operator.IN, ledger_ids)},
+            )
+
+        --> returns number of rows updated
+        """
+        assert dh.is_valid_dict(set_dict)
+        assert dh.is_valid_dict(where_dict), "update needs a where_dict"
+        table_name = to_underscore(table.__name__)
+
+        assert all(
+            x.split(".")[0] == table_name for x in set_dict
+        ), f"set cols must be of {table_name}"
+
+        where_dict = add_equal_where_operator(where_dict)
+        set_cols = tuple(lh.remove_prefix_from_each_item(list(set_dict)))
+        where_shape = tuple((k, v[0]) for k, v in where_dict.items())
+        query = _compose_update_where(table_name, set_cols, where_shape)
+
+        check_fetch_vals(where_dict, None, None)
+        for k, v in set_dict.items():
+            assert is_enum_val(k, v), f"not in enum {k}: {v}"
+
+        vals = format_val_dict(where_dict, prefix="where.")
+        for col, v in zip(set_cols, wrap_json_vals(set_dict).values()):
+            vals[f"set.{col}"] = v
+        return await _update(table_name, ("WHERE", table_name, set_cols, where_shape), [(query, vals)])
+
+    @staticmethod
+    async def update_rows(
+        rows: list[BaseModel],
+        update_cols: list[str] | str,
+        key_col: Optional[str] = None,
+    ) -> int:
+        """
+        writes each row's own values of update_cols to the row with the
+        same key_col, BULK_CHUNK_ROWS rows per statement, one transaction.
+        a None in a row sets NULL
+
+        - update_cols: table.col to write
+        - key_col: table.col matching rows to their db row, default id
+
+        --> returns number of rows updated
+        """
+        assert isinstance(rows, list) and len(rows) > 0
+        model = rows[0].__class__
+        assert issubclass(model, BaseModel)
+        assert all(row.__class__ is model for row in rows), "rows of one table only"
+        table_name = to_underscore(model.__name__)
+
+        set_cols = tuple(lh.remove_prefix_from_each_item(lh.make_list(update_cols)))
+        key = "id" if key_col is None else lh.remove_prefix_from_each_item([key_col])[0]
+        query = _compose_update_rows(table_name, key, set_cols)
+
+        keys = [getattr(row, key) for row in rows]
+        assert all(x is not None for x in keys), f"every row needs its {key}"
+        assert len(set(keys)) == len(keys), f"rows share a {key}, only one would be written"
+
+        statements = []
+        for i_start in range(0, len(rows), BULK_CHUNK_ROWS):
+            chunk = [
+                wrap_json_vals({x: getattr(row, x) for x in set_cols})
+                for row in rows[i_start : i_start + BULK_CHUNK_ROWS]
+            ]
+            vals = {key: keys[i_start : i_start + BULK_CHUNK_ROWS]}
+            vals.update({x: [row[x] for row in chunk] for x in set_cols})
+            statements.append((query, vals))
+
+        return await _update(table_name, ("ROWS", table_name, key, set_cols), statements)
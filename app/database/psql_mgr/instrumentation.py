@@ -0,0 +1,160 @@
+import logging
+import random
+import re
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from functools import lru_cache
+from time import perf_counter
+from typing import Any, Callable, Hashable, Optional
+
+from app.utils.env_mgr import get_env
+
+logger = logging.getLogger(__name__)
+
+# upper bounds (ms) of the wall time histogram buckets, plus one overflow bucket
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 10000)
+
+# shapes tracked one by one, new shapes past this are summed under one
+MAX_QUERY_SHAPES = 1000
+OTHER_SHAPE = ("OTHER",)
+
+# quoted strings and numbers, the values of a hand written query
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+@dataclass(frozen=True)
+class SlowQuerySettings:
+    threshold_ms: float
+    sample_rate: float
+
+
+@lru_cache(maxsize=1)
+def get_slow_query_settings() -> SlowQuerySettings:
+    env = get_env()
+    assert env.PSQL_SLOW_QUERY_MS >= 0
+    assert 0 <= env.PSQL_SLOW_QUERY_SAMPLE_RATE <= 1
+
+    return SlowQuerySettings(
+        threshold_ms=env.PSQL_SLOW_QUERY_MS,
+        sample_rate=env.PSQL_SLOW_QUERY_SAMPLE_RATE,
+    )
+
+
+@dataclass
+class ShapeStats:
+    """running totals for one query shape"""
+
+    label: str
+    calls: int = 0
+    rows: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    pool_wait_ms: float = 0.0
+    slow_calls: int = 0
+    histogram: list[int] = field(
+        default_factory=lambda: [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+    )
+
+    def as_dict(self) -> dict:
+        return {
+            "label": self.label,
+            "calls": self.calls,
+            "rows": self.rows,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "pool_wait_ms": round(self.pool_wait_ms, 3),
+            "slow_calls": self.slow_calls,
+            "histogram": dict(
+                zip([f"<={b}ms" for b in HISTOGRAM_BUCKETS_MS] + ["inf"], self.histogram)
+            ),
+        }
+
+
+_shape_stats: dict[Hashable, ShapeStats] = {}
+
+
+def text_shape(query: str) -> str:
+    """the shape of raw SQL text, literals as ? and whitespace collapsed, so
+    the same query with other values is one shape
+    """
+    return " ".join(_LITERALS.sub("?", query).split())
+
+
+class QueryTimer:
+    """times one query of one shape, from pool checkout to last row
+
+    usage:
+        timer = QueryTimer("FETCH", shape, "account")
+        async with connection() as conn, ...:
+            timer.connected()
+            ... execute and fetch ...
+            timer.done(len(rows), lambda: query.as_string(cur), vals)
+
+    the SQL is only rendered if the query is logged, never on the hot path
+    """
+
+    __slots__ = ("api", "shape", "table", "start", "checked_out")
+
+    def __init__(self, api: str, shape: Hashable, table: str):
+        self.api = api
+        self.shape = shape
+        self.table = table
+        self.start = perf_counter()
+        self.checked_out = self.start
+
+    def connected(self) -> None:
+        self.checked_out = perf_counter()
+
+    def done(
+        self,
+        n_rows: int,
+        render_sql: Callable[[], str],
+        vals: Optional[Any] = None,
+    ) -> None:
+        end = perf_counter()
+        wall_ms = (end - self.start) * 1000
+        wait_ms = (self.checked_out - self.start) * 1000
+
+        stats = _shape_stats.get(self.shape)
+        if stats is None:
+            if len(_shape_stats) < MAX_QUERY_SHAPES:
+                stats = _shape_stats[self.shape] = ShapeStats(label=f"{self.api} {self.table}")
+            else:
+                stats = _shape_stats.get(OTHER_SHAPE)
+                if stats is None:
+                    stats = _shape_stats[OTHER_SHAPE] = ShapeStats(label="other shapes")
+        stats.calls += 1
+        stats.rows += n_rows
+        stats.total_ms += wall_ms
+        stats.max_ms = max(stats.max_ms, wall_ms)
+        stats.pool_wait_ms += wait_ms
+        stats.histogram[bisect_left(HISTOGRAM_BUCKETS_MS, wall_ms)] += 1
+
+        settings = get_slow_query_settings()
+        if wall_ms >= settings.threshold_ms:
+            stats.slow_calls += 1
+            if random.random() < settings.sample_rate:
+                # bound values can hold secrets, only their names are logged
+                val_names = list(vals) if isinstance(vals, dict) else None
+                logger.warning(
+                    f"slow query {wall_ms:.1f} ms (pool wait {wait_ms:.1f} ms, "
+                    f"{n_rows} rows): {render_sql()} vals: {val_names}"
+                )
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"{self.api} {wall_ms:.1f} ms, {n_rows} rows: {render_sql()} vals: {vals}"
+            )
+
+
+def query_stats() -> list[dict]:
+    """per shape stats, most total time first"""
+    return [
+        stats.as_dict()
+        for stats in sorted(_shape_stats.values(), key=lambda x: -x.total_ms)
+    ]
+
+
+def reset_query_stats() -> None:
+    _shape_stats.clear()
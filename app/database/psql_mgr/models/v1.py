@@ -7,6 +7,8 @@ from uuid import UUID
 
 from pydantic import BaseModel
 
+from app.database.psql_mgr.utils.schema_meta import SchemaMeta
+
 """ This class is autogenerated """
 
 
@@ -73,6 +75,12 @@ class m_Account(BaseModel):
     archived: Optional[bool] = None
 
 
+class m_AccountClosure(BaseModel):
+    ancestor_id: UUID
+    descendant_id: UUID
+    depth: int
+
+
 class m_Journal(BaseModel):
     id: Optional[UUID] = None
     created_on: Optional[datetime] = None
@@ -97,6 +105,20 @@ class m_Ledger(BaseModel):
     reconciled: Optional[bool] = None
 
 
+class m_AccountBalance(BaseModel):
+    account_id: Optional[UUID] = None
+    debit: Optional[float] = None
+    credit: Optional[float] = None
+    updated_on: Optional[datetime] = None
+
+
+class m_DailyAccountSnapshot(BaseModel):
+    account_id: UUID
+    day: date
+    debit: Optional[float] = None
+    credit: Optional[float] = None
+
+
 class m_Prepaid(BaseModel):
     id: Optional[UUID] = None
     created_on: Optional[datetime] = None
@@ -182,6 +204,13 @@ class c_Account:
     archived = "account.archived"
 
 
+@dataclass(frozen=True)
+class c_AccountClosure:
+    ancestor_id = "account_closure.ancestor_id"
+    descendant_id = "account_closure.descendant_id"
+    depth = "account_closure.depth"
+
+
 @dataclass(frozen=True)
 class c_Journal:
     id = "journal.id"
@@ -208,6 +237,22 @@ class c_Ledger:
     reconciled = "ledger.reconciled"
 
 
+@dataclass(frozen=True)
+class c_AccountBalance:
+    account_id = "account_balance.account_id"
+    debit = "account_balance.debit"
+    credit = "account_balance.credit"
+    updated_on = "account_balance.updated_on"
+
+
+@dataclass(frozen=True)
+class c_DailyAccountSnapshot:
+    account_id = "daily_account_snapshot.account_id"
+    day = "daily_account_snapshot.day"
+    debit = "daily_account_snapshot.debit"
+    credit = "daily_account_snapshot.credit"
+
+
 @dataclass(frozen=True)
 class c_Prepaid:
     id = "prepaid.id"
@@ -221,3 +266,133 @@ class c_Prepaid:
     expense_account_id = "prepaid.expense_account_id"
     asset_account_type = "prepaid.asset_account_type"
     expense_account_type = "prepaid.expense_account_type"
+
+
+SCHEMA_META = SchemaMeta.build(
+    enums={
+        "access_levels": ("ADMIN", "USER"),
+        "storage_status": ("AVAILABLE", "DELETED", "NEVER_EXISTED"),
+        "account_type": ("ASSET", "EXPENSE", "INCOME", "EQUITY", "LIABILITY", "DIVIDEND", "INCOME_SUMMARY"),
+        "account_actions": ("DEBIT", "CREDIT"),
+    },
+    tables={
+        "person": (
+            ("id", "UUID", False, True),
+            ("created_on", "TIMESTAMP", False, True),
+            ("created_by", "VARCHAR", False, True),
+            ("email", "TEXT", False, False),
+            ("hashed_password", "CHAR", False, True),
+            ("first_name", "TEXT", False, False),
+            ("last_name", "TEXT", False, False),
+            ("level", "access_levels", False, True),
+            ("active", "BOOLEAN", False, True),
+            ("confirmed", "BOOLEAN", False, True),
+        ),
+        "entity": (
+            ("id", "UUID", False, True),
+            ("created_on", "TIMESTAMP", False, True),
+            ("created_by", "VARCHAR", False, True),
+            ("name", "TEXT", False, False),
+        ),
+        "person_entity_junction": (
+            ("id", "UUID", False, True),
+            ("user_id", "UUID", False, True),
+            ("entity_id", "UUID", False, True),
+        ),
+        "account": (
+            ("id", "UUID", False, True),
+            ("created_on", "TIMESTAMP", False, True),
+            ("created_by", "VARCHAR", False, True),
+            ("entity_id", "UUID", False, True),
+            ("name", "TEXT", False, False),
+            ("parent_account_id", "UUID", False, True),
+            ("type", "account_type", False, True),
+            ("archived", "BOOLEAN", False, True),
+        ),
+        "account_closure": (
+            ("ancestor_id", "UUID", False, False),
+            ("descendant_id", "UUID", False, False),
+            ("depth", "INTEGER", False, False),
+        ),
+        "journal": (
+            ("id", "UUID", False, True),
+            ("created_on", "TIMESTAMP", False, True),
+            ("timestamp", "DATE", False, False),
+            ("created_by", "UUID", False, True),
+            ("entity_id", "UUID", False, True),
+            ("vendor", "TEXT", False, True),
+            ("description", "TEXT", False, False),
+            ("closing_entry", "BOOLEAN", False, True),
+            ("receipt_status", "storage_status", False, True),
+            ("valid", "BOOLEAN", False, True),
+        ),
+        "ledger": (
+            ("id", "UUID", False, True),
+            ("created_on", "TIMESTAMP", False, True),
+            ("created_by", "VARCHAR", False, True),
+            ("journal_id", "UUID", False, True),
+            ("account_id", "UUID", False, False),
+            ("amount", "NUMERIC", False, False),
+            ("direction", "account_actions", False, False),
+            ("reconciled", "BOOLEAN", False, True),
+        ),
+        "account_balance": (
+            ("account_id", "UUID", False, True),
+            ("debit", "NUMERIC", False, True),
+            ("credit", "NUMERIC", False, True),
+            ("updated_on", "TIMESTAMP", False, True),
+        ),
+        "daily_account_snapshot": (
+            ("account_id", "UUID", False, False),
+            ("day", "DATE", False, False),
+            ("debit", "NUMERIC", False, True),
+            ("credit", "NUMERIC", False, True),
+        ),
+        "prepaid": (
+            ("id", "UUID", False, True),
+            ("created_on", "TIMESTAMP", False, True),
+            ("created_by", "VARCHAR", False, True),
+            ("amount", "NUMERIC", False, False),
+            ("receive_month", "DATE", False, False),
+            ("processed", "BOOLEAN", False, True),
+            ("original_journal_id", "UUID", False, True),
+            ("asset_account_id", "UUID", False, False),
+            ("expense_account_id", "UUID", False, False),
+            ("asset_account_type", "account_type", False, False),
+            ("expense_account_type", "account_type", False, False),
+        ),
+    },
+    foreign_keys={
+        "person_entity_junction": (
+            (("user_id",), "person", ("id",)),
+            (("entity_id",), "entity", ("id",)),
+        ),
+        "account": (
+            (("entity_id",), "entity", ("id",)),
+            (("parent_account_id",), "account", ("id",)),
+        ),
+        "account_closure": (
+            (("ancestor_id",), "account", ("id",)),
+            (("descendant_id",), "account", ("id",)),
+        ),
+        "journal": (
+            (("created_by",), "person", ("id",)),
+            (("entity_id",), "entity", ("id",)),
+        ),
+        "ledger": (
+            (("journal_id",), "journal", ("id",)),
+            (("account_id",), "account", ("id",)),
+        ),
+        "account_balance": (
+            (("account_id",), "account", ("id",)),
+        ),
+        "daily_account_snapshot": (
+            (("account_id",), "account", ("id",)),
+        ),
+        "prepaid": (
+            (("original_journal_id",), "journal", ("id",)),
+            (("asset_account_id", "asset_account_type"), "account", ("id", "type")),
+            (("expense_account_id", "expense_account_type"), "account", ("id", "type")),
+        ),
+    },
+)
@@ -1,10 +1,14 @@
 import asyncio
 import logging
+from dataclasses import dataclass
 from functools import lru_cache
 
+from psycopg import AsyncConnection
+from psycopg.rows import dict_row
 from psycopg.conninfo import make_conninfo
 from psycopg_pool import AsyncConnectionPool
 
+from app.database.psql_mgr.instrumentation import query_stats
 from app.utils.env_mgr import get_env
 
 logger = logging.getLogger(__name__)
@@ -22,6 +26,12 @@ def get_schema_version() -> str:
     return env.PSQL_SCHEMA_VERSION
 
 
+@lru_cache(maxsize=1)
+def get_production_mode() -> bool:
+    env = get_env()
+    return env.PSQL_PRODUCTION_MODE
+
+
 @lru_cache(maxsize=1)
 def get_conn_info() -> str:
     env = get_env()
@@ -36,12 +46,83 @@ def get_conn_info() -> str:
     )
 
 
+@dataclass(frozen=True)
+class PrepareSettings:
+    enabled: bool
+    threshold: int
+    max_per_conn: int
+
+
+@lru_cache(maxsize=1)
+def get_prepare_settings() -> PrepareSettings:
+    env = get_env()
+    assert env.PSQL_PREPARE_THRESHOLD >= 0
+    assert env.PSQL_PREPARED_MAX > 0
+
+    return PrepareSettings(
+        enabled=env.PSQL_PREPARE,
+        threshold=env.PSQL_PREPARE_THRESHOLD,
+        max_per_conn=env.PSQL_PREPARED_MAX,
+    )
+
+
+async def configure_connection(conn: AsyncConnection) -> None:
+    """called by the pool once for every new connection"""
+    settings = get_prepare_settings()
+    if settings.enabled:
+        # psycopg prepares a query once it has been executed `threshold`
+        # times on this connection, and deallocates the least recently
+        # used statement once more than `max_per_conn` are prepared
+        conn.prepare_threshold = settings.threshold
+        conn.prepared_max = settings.max_per_conn
+    # off leaves psycopg's defaults alone, it still prepares a query after
+    # 5 executions on a connection
+
+
+# the statements prepared on one connection, as the server sees them.
+# executions counts every run of a prepared statement, the first included
+PREPARED_STATEMENTS = (
+    "SELECT count(*) AS prepared, "
+    "COALESCE(sum(generic_plans + custom_plans), 0) AS executions "
+    "FROM pg_prepared_statements"
+)
+
+
+async def prepared_statement_info() -> dict[str, int]:
+    """
+    statements prepared across the pool's idle connections, read from
+    pg_prepared_statements on each. the pool hands out idle connections in
+    turn, so checking out pool_size of them one at a time visits each once
+    (seen again ones, by backend pid, are skipped). connections in use
+    meanwhile are not counted
+
+    -> returns "connections", "prepared", "executions" and "reuses", the
+       executions past each statement's first
+    """
+    pool = get_async_pool()
+    info = {"connections": 0, "prepared": 0, "executions": 0}
+    seen = set()
+    for _ in range(pool.get_stats().get("pool_size", 0)):
+        async with pool.connection() as conn, conn.cursor(row_factory=dict_row) as cur:
+            if conn.info.backend_pid in seen:
+                continue
+            seen.add(conn.info.backend_pid)
+            # never prepared itself, so it does not count itself
+            await cur.execute(PREPARED_STATEMENTS, prepare=False)
+            row = await cur.fetchone()
+            info["connections"] += 1
+            info["prepared"] += row["prepared"]
+            info["executions"] += int(row["executions"])
+    return info | {"reuses": info["executions"] - info["prepared"]}
+
+
 @lru_cache(maxsize=1)
 def get_async_pool() -> AsyncConnectionPool:
     a_pool = AsyncConnectionPool(
         conninfo=get_conn_info(),
         open=False,
         max_size=10,
+        configure=configure_connection,
     )
     logger.info("Created AsyncConnectionPool")
     return a_pool
@@ -65,5 +146,11 @@ async def reconnect_workers():
 
 async def stop_async_pool():
     a_pool = get_async_pool()
+    for stats in query_stats()[:10]:
+        logger.info(f"Query stats: {stats}")
+    try:
+        logger.info(f"Prepared statements: {await prepared_statement_info()}")
+    except Exception as e:
+        logger.warning(f"Could not read prepared statements: {e}")
     await a_pool.close()
     logger.info("Closed AsyncConnectionPool")
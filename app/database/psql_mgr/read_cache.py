@@ -0,0 +1,180 @@
+import logging
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from time import monotonic
+from typing import Hashable, Optional
+
+from app.database.psql_mgr.unit_of_work import current_unit_of_work
+from app.utils.env_mgr import get_env
+
+logger = logging.getLogger(__name__)
+
+# raw SQL that can change rows. a SELECT ... FOR UPDATE matches too, which
+# only costs a needless invalidate
+WRITE_KEYWORDS = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|TRUNCATE|COPY|ALTER|DROP|CREATE|CALL|DO)\b",
+    re.IGNORECASE,
+)
+
+
+@dataclass(frozen=True)
+class ReadCacheSettings:
+    tables: frozenset[str]
+    ttl_s: float
+    max_rows: int
+
+
+@lru_cache(maxsize=1)
+def get_read_cache_settings() -> ReadCacheSettings:
+    env = get_env()
+    assert env.PSQL_READ_CACHE_TTL_S > 0
+    assert env.PSQL_READ_CACHE_MAX_ROWS > 0
+
+    return ReadCacheSettings(
+        tables=frozenset(
+            x.strip() for x in env.PSQL_READ_CACHE_TABLES.split(",") if x.strip()
+        ),
+        ttl_s=env.PSQL_READ_CACHE_TTL_S,
+        max_rows=env.PSQL_READ_CACHE_MAX_ROWS,
+    )
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    expires: float
+    tables: tuple[str, ...]
+    records: tuple[dict, ...]
+
+
+class ReadCache:
+    """LRU + TTL cache of fetched rows, for tables that are read a lot and
+    written rarely. only this process's writes invalidate it, so the TTL
+    bounds how stale a row written by another worker can be
+
+    memory is capped by the total number of cached rows
+    """
+
+    def __init__(self, settings: ReadCacheSettings):
+        self.settings = settings
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self._keys_by_table: dict[str, set[Hashable]] = {}
+        # bumped on every write to a table. a read started before the write
+        # must not store its (maybe stale) rows after it
+        self._generations: dict[str, int] = {}
+        self._n_rows = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def is_cacheable(self, tables: tuple[str, ...]) -> bool:
+        return all(x in self.settings.tables for x in tables)
+
+    def generation(self, tables: tuple[str, ...]) -> tuple[int, ...]:
+        return tuple(self._generations.get(x, 0) for x in tables)
+
+    def get(self, key: Hashable) -> Optional[list[dict]]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires < monotonic():
+            self._drop(key)
+            entry = None
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        self._entries.move_to_end(key)
+        # callers may change the rows they get back
+        return [dict(x) for x in entry.records]
+
+    def put(
+        self,
+        key: Hashable,
+        tables: tuple[str, ...],
+        generation: tuple[int, ...],
+        records: list[dict],
+    ) -> None:
+        if generation != self.generation(tables):
+            return  # a table was written to while this read was running
+        if len(records) > self.settings.max_rows:
+            return
+
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = CacheEntry(
+            expires=monotonic() + self.settings.ttl_s,
+            tables=tables,
+            records=tuple(dict(x) for x in records),
+        )
+        for table in tables:
+            self._keys_by_table.setdefault(table, set()).add(key)
+        self._n_rows += len(records)
+
+        while self._n_rows > self.settings.max_rows:
+            self._drop(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def invalidate(self, table: str) -> None:
+        self._generations[table] = self._generations.get(table, 0) + 1
+        keys = self._keys_by_table.pop(table, set())
+        for key in keys:
+            if key in self._entries:
+                self._drop(key)
+        if keys:
+            self.stats["invalidations"] += 1
+            logger.debug(f"read cache: dropped {len(keys)} entries of {table}")
+
+    def invalidate_query(self, query: str) -> None:
+        """raw SQL, drop every cached table it names"""
+        for table in self.settings.tables:
+            if re.search(rf"\b{table}\b", query, re.IGNORECASE):
+                self.invalidate(table)
+
+    def clear(self) -> None:
+        for table in list(self._keys_by_table):
+            self.invalidate(table)
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._n_rows -= len(entry.records)
+        for table in entry.tables:
+            keys = self._keys_by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+
+    def info(self) -> dict:
+        return self.stats | {
+            "entries": len(self._entries),
+            "rows": self._n_rows,
+            "max_rows": self.settings.max_rows,
+            "tables": sorted(self.settings.tables),
+        }
+
+
+@lru_cache(maxsize=1)
+def get_read_cache() -> ReadCache:
+    return ReadCache(get_read_cache_settings())
+
+
+def invalidate_table(table: str) -> None:
+    """call after any write to table"""
+    if get_read_cache_settings().tables:
+        cache = get_read_cache()
+        cache.invalidate(table)
+        # other tasks can still cache the rows from before the write until
+        # the unit of work commits, so drop them again then
+        uow = current_unit_of_work()
+        if uow is not None:
+            uow.after_end(("read_cache", table), lambda: cache.invalidate(table))
+
+
+def invalidate_query(query: str) -> None:
+    """call after raw SQL that may have written to any table. does nothing
+    for SQL without a WRITE_KEYWORDS statement, so a plain SELECT keeps the
+    cache. a SELECT of a function that writes is not seen
+    """
+    if get_read_cache_settings().tables and WRITE_KEYWORDS.search(query):
+        cache = get_read_cache()
+        cache.invalidate_query(query)
+        uow = current_unit_of_work()
+        if uow is not None:
+            uow.after_end(("read_cache", query), lambda: cache.invalidate_query(query))
@@ -43,6 +43,19 @@ create table account(
   UNIQUE(entity_id, name)
 );
 ALTER TABLE account ADD CONSTRAINT loop_back_fkey FOREIGN KEY(parent_account_id) REFERENCES account(id);
+-- children lookups
+create index account_parent_account_id_idx on account(parent_account_id);
+-- every (ancestor, descendant) pair of the account hierarchy, an account
+-- is its own ancestor at depth 0. subtrees are a range of the primary key,
+-- ancestors a range of the descendant index. kept up to date by the account
+-- write paths, see schema_specific_helpers/accounts.py
+create table account_closure(
+  ancestor_id UUID NOT NULL REFERENCES account(id) ON DELETE CASCADE,
+  descendant_id UUID NOT NULL REFERENCES account(id) ON DELETE CASCADE,
+  depth INTEGER NOT NULL,
+  PRIMARY KEY (ancestor_id, descendant_id)
+);
+create index account_closure_descendant_id_idx on account_closure(descendant_id, depth);
 
 create table journal(
   id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -56,6 +69,8 @@ create table journal(
   receipt_status storage_status NOT NULL DEFAULT 'NEVER_EXISTED',
   valid BOOLEAN NOT NULL DEFAULT FALSE
  );
+-- keyset pagination of the journal listing, see get_journal_entries
+create index journal_entity_timestamp_id_idx on journal(entity_id, timestamp, id);
 
 create table ledger(
   id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -67,6 +82,31 @@ create table ledger(
   direction account_actions NOT NULL,
   reconciled BOOLEAN NOT NULL DEFAULT 'FALSE'
 );
+create index ledger_journal_id_idx on ledger(journal_id);
+-- per account ledger sums, see schema_specific_helpers/balances.py
+create index ledger_account_id_idx on ledger(account_id) INCLUDE (direction, amount);
+
+-- running ledger sums per account, so balances are read without summing
+-- the ledger. added to in the same transaction as the ledger lines, see
+-- schema_specific_helpers/balances.py
+create table account_balance(
+  account_id UUID PRIMARY KEY REFERENCES account(id) ON DELETE CASCADE,
+  debit NUMERIC(14,2) NOT NULL DEFAULT 0,
+  credit NUMERIC(14,2) NOT NULL DEFAULT 0,
+  updated_on TIMESTAMP DEFAULT localtimestamp() NOT NULL
+);
+
+-- each account's sums over the lines of journals dated up to and including
+-- day. a balance as of a date is the nearest earlier snapshot plus the
+-- lines after it, see schema_specific_helpers/balances.py. rows are only
+-- for accounts with lines by then
+create table daily_account_snapshot(
+  account_id UUID NOT NULL REFERENCES account(id) ON DELETE CASCADE,
+  day DATE NOT NULL,
+  debit NUMERIC(14,2) NOT NULL DEFAULT 0,
+  credit NUMERIC(14,2) NOT NULL DEFAULT 0,
+  PRIMARY KEY (account_id, day)
+);
 
 create table prepaid(
   id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
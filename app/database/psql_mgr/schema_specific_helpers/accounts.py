@@ -0,0 +1,277 @@
+import logging
+from functools import lru_cache
+from typing import Optional
+from uuid import UUID
+
+from psycopg.rows import dict_row
+from psycopg.sql import SQL, Composed, Identifier, Placeholder
+
+from app.database.psql_mgr.api.fetch import NoRecordsFoundError
+from app.database.psql_mgr.instrumentation import QueryTimer
+from app.database.psql_mgr.models.v1 import c_Account
+from app.database.psql_mgr.read_cache import invalidate_table
+from app.database.psql_mgr.unit_of_work import connection, unit_of_work
+
+logger = logging.getLogger(__name__)
+
+# the subtree's cols, keyed like FETCH_API rows so the tree builders take them
+SUBTREE_COLS = (c_Account.id, c_Account.name, c_Account.parent_account_id, c_Account.type)
+
+# closure rows of accounts, walked up their parent_account_id from the
+# account table itself. used to add new accounts and to rebuild
+CLOSURE_FROM_PARENTS = SQL(
+    "WITH RECURSIVE up AS ("
+    "SELECT a.id AS descendant_id, a.id AS ancestor_id, a.parent_account_id, 0 AS depth"
+    " FROM account a WHERE {start}"
+    " UNION ALL "
+    "SELECT up.descendant_id, a.id, a.parent_account_id, up.depth + 1"
+    " FROM up JOIN account a ON a.id = up.parent_account_id"
+    # a parent loop in the data would otherwise never end
+    " WHERE up.depth < 1000"
+    ") "
+    "INSERT INTO account_closure (ancestor_id, descendant_id, depth) "
+    "SELECT ancestor_id, descendant_id, depth FROM up "
+    "ON CONFLICT (ancestor_id, descendant_id) DO NOTHING "
+)
+
+
+class AccountLoopError(Exception):
+    pass
+
+
+class AccountEntityError(Exception):
+    pass
+
+
+@lru_cache(maxsize=16)
+def _compose_subtree(start_col: Optional[str], member_check: bool, with_amounts: bool) -> Composed:
+    """
+    the head account (start_col = %(start)s) and its descendants, one range
+    of the closure's primary key. with no start_col every root account of
+    the entity is a head, so the whole chart. depth is 0 at the head, path
+    is the names from the head down. ordered on path, so each account comes
+    right before its children, siblings by name
+
+    with_amounts adds the account's own ledger sums, "debit" and "credit",
+    from account_balance
+    """
+    head = SQL("SELECT a.id FROM account a WHERE a.entity_id = {}").format(Placeholder("entity_id"))
+    if start_col is None:
+        head += SQL(" AND a.parent_account_id IS NULL")
+    else:
+        head += SQL(" AND a.{} = {}").format(Identifier(start_col), Placeholder("start"))
+    if member_check:
+        head += SQL(
+            " AND EXISTS (SELECT 1 FROM person_entity_junction j"
+            " WHERE j.entity_id = a.entity_id AND j.user_id = {})"
+        ).format(Placeholder("user_id"))
+
+    amounts = SQL("")
+    amounts_join = SQL("")
+    if with_amounts:
+        amounts = SQL(", COALESCE(b.debit, 0) AS debit, COALESCE(b.credit, 0) AS credit")
+        # the stored sums, the ledger is not read
+        amounts_join = SQL("LEFT JOIN account_balance b ON b.account_id = a.id ")
+
+    return SQL(
+        "SELECT {cols}, c.depth, "
+        "ARRAY(SELECT an.name FROM account_closure up JOIN account an ON an.id = up.ancestor_id"
+        " WHERE up.descendant_id = c.descendant_id AND up.depth <= c.depth"
+        " ORDER BY up.depth DESC) AS path{amounts} "
+        "FROM account_closure c JOIN account a ON a.id = c.descendant_id "
+        "{amounts_join}"
+        "WHERE c.ancestor_id IN ({head}) "
+        "ORDER BY path "
+    ).format(
+        head=head,
+        amounts=amounts,
+        amounts_join=amounts_join,
+        cols=SQL(", ").join(
+            [
+                SQL("a.{} AS {}").format(Identifier(x.split(".")[1]), Identifier(x))
+                for x in SUBTREE_COLS
+            ]
+        ),
+    )
+
+
+async def _execute(
+    shape: tuple,
+    query: Composed,
+    vals: dict,
+    returns: bool,
+) -> list[dict]:
+    timer = QueryTimer("FETCH" if returns else "UPDATE", shape, "account")
+    async with (
+        connection() as conn,
+        conn.cursor(row_factory=dict_row) as cur,
+    ):
+        timer.connected()
+        await cur.execute(query, vals)
+        records = await cur.fetchall() if returns else []
+        if not returns:
+            invalidate_table("account_closure")
+        timer.done(len(records) if returns else max(cur.rowcount, 0), lambda: query.as_string(cur), vals)
+    return records
+
+
+async def fetch_subtree(
+    entity_id: UUID,
+    account_id: Optional[UUID] = None,
+    account_name: Optional[str] = None,
+    user_id: Optional[UUID] = None,
+    with_amounts: bool = False,
+) -> list[dict]:
+    """
+    an account and everything under it, in one round trip. start from its
+    id or its name (names are unique per entity), or from neither for every
+    account of the entity, each root followed by its subtree
+
+    - user_id: if given, nothing is returned unless the user is in the entity
+    - with_amounts: add each account's own ledger sums, "debit" and "credit"
+
+    -> returns dicts of SUBTREE_COLS + "depth" + "path", head first, then
+       depth first with siblings by name. raises NoRecordsFoundError if
+       the head is not found
+    """
+    assert account_id is None or account_name is None, "start from an id or a name"
+    vals = {"entity_id": entity_id}
+    if account_id is not None:
+        start_col = "id"
+        vals["start"] = account_id
+    elif account_name is not None:
+        start_col = "name"
+        vals["start"] = account_name
+    else:
+        start_col = None
+    if user_id is not None:
+        vals["user_id"] = user_id
+
+    records = await _execute(
+        ("SUBTREE", start_col, user_id is not None, with_amounts),
+        _compose_subtree(start_col, user_id is not None, with_amounts),
+        vals,
+        returns=True,
+    )
+    if not records:
+        raise NoRecordsFoundError
+    return records
+
+
+async def fetch_ancestors(account_id: UUID) -> list[dict]:
+    """
+    the account and every account above it, one range of the descendant
+    index
+
+    -> returns dicts of SUBTREE_COLS + "depth", the account first (depth 0)
+       up to its root
+    """
+    query = SQL(
+        "SELECT {cols}, c.depth FROM account_closure c JOIN account a ON a.id = c.ancestor_id "
+        "WHERE c.descendant_id = {account_id} ORDER BY c.depth "
+    ).format(
+        account_id=Placeholder("account_id"),
+        cols=SQL(", ").join(
+            [
+                SQL("a.{} AS {}").format(Identifier(x.split(".")[1]), Identifier(x))
+                for x in SUBTREE_COLS
+            ]
+        ),
+    )
+    records = await _execute(("ANCESTORS",), query, {"account_id": account_id}, returns=True)
+    if not records:
+        raise NoRecordsFoundError
+    return records
+
+
+async def add_account_closure(account_ids: list[UUID]) -> None:
+    """
+    add the closure rows of new accounts. call after inserting them, in any
+    order and in any number of statements. rows that exist are kept
+    """
+    if not account_ids:
+        return
+    query = CLOSURE_FROM_PARENTS.format(start=SQL("a.id = ANY({})").format(Placeholder("ids")))
+    await _execute(("CLOSURE", "ADD"), query, {"ids": account_ids}, returns=False)
+
+
+async def rebuild_account_closure(entity_id: UUID) -> None:
+    """recompute the closure of every account of an entity from parent_account_id"""
+    async with unit_of_work():
+        await _execute(
+            ("CLOSURE", "CLEAR"),
+            SQL(
+                "DELETE FROM account_closure c USING account a "
+                "WHERE a.id = c.descendant_id AND a.entity_id = {} "
+            ).format(Placeholder("entity_id")),
+            {"entity_id": entity_id},
+            returns=False,
+        )
+        await _execute(
+            ("CLOSURE", "REBUILD"),
+            CLOSURE_FROM_PARENTS.format(start=SQL("a.entity_id = {}").format(Placeholder("entity_id"))),
+            {"entity_id": entity_id},
+            returns=False,
+        )
+
+
+async def reparent_account(account_id: UUID, new_parent_id: Optional[UUID]) -> None:
+    """
+    move an account, and everything under it, under new_parent_id (None for
+    a root). parent_account_id and the closure change in one transaction.
+    raises AccountEntityError if new_parent_id is in another entity,
+    AccountLoopError if it is in the account's subtree
+    """
+    vals = {"account_id": account_id, "new_parent_id": new_parent_id}
+    async with unit_of_work():
+        if new_parent_id is not None:
+            checks = await _execute(
+                ("CLOSURE", "CHECK"),
+                SQL(
+                    "SELECT a.entity_id = p.entity_id AS same_entity, "
+                    "EXISTS (SELECT 1 FROM account_closure "
+                    "WHERE ancestor_id = a.id AND descendant_id = p.id) AS loop "
+                    "FROM account a JOIN account p ON p.id = %(new_parent_id)s "
+                    "WHERE a.id = %(account_id)s "
+                ),
+                vals,
+                returns=True,
+            )
+            if not checks:
+                raise NoRecordsFoundError
+            if not checks[0]["same_entity"]:
+                raise AccountEntityError(f"account {new_parent_id} is not in the entity of account {account_id}")
+            if checks[0]["loop"]:
+                raise AccountLoopError(f"account {new_parent_id} is under account {account_id}")
+
+        # cut the subtree from its old ancestors
+        await _execute(
+            ("CLOSURE", "DETACH"),
+            SQL(
+                "DELETE FROM account_closure "
+                "WHERE descendant_id IN (SELECT descendant_id FROM account_closure WHERE ancestor_id = %(account_id)s) "
+                "AND ancestor_id NOT IN (SELECT descendant_id FROM account_closure WHERE ancestor_id = %(account_id)s) "
+            ),
+            vals,
+            returns=False,
+        )
+        # every ancestor of the new parent is an ancestor of the whole subtree
+        if new_parent_id is not None:
+            await _execute(
+                ("CLOSURE", "ATTACH"),
+                SQL(
+                    "INSERT INTO account_closure (ancestor_id, descendant_id, depth) "
+                    "SELECT above.ancestor_id, below.descendant_id, above.depth + below.depth + 1 "
+                    "FROM account_closure above CROSS JOIN account_closure below "
+                    "WHERE above.descendant_id = %(new_parent_id)s AND below.ancestor_id = %(account_id)s "
+                ),
+                vals,
+                returns=False,
+            )
+        await _execute(
+            ("CLOSURE", "REPARENT"),
+            SQL("UPDATE account SET parent_account_id = %(new_parent_id)s WHERE id = %(account_id)s "),
+            vals,
+            returns=False,
+        )
+        invalidate_table("account")
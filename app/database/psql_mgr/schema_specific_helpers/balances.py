@@ -0,0 +1,376 @@
+import logging
+from datetime import date
+from decimal import Decimal
+from functools import lru_cache
+from typing import Optional
+from uuid import UUID
+
+from psycopg.rows import dict_row
+from psycopg.sql import SQL, Composed, Placeholder
+
+from app.database.psql_mgr.instrumentation import QueryTimer
+from app.database.psql_mgr.models.v1 import m_AccountActions, m_Ledger
+from app.database.psql_mgr.read_cache import invalidate_table
+from app.database.psql_mgr.unit_of_work import connection, unit_of_work
+
+logger = logging.getLogger(__name__)
+
+# adds to each account's sums, one row per account. sorted on account id so
+# concurrent postings lock the balance rows in the same order
+ADD_TO_BALANCES = SQL(
+    "INSERT INTO account_balance (account_id, debit, credit) "
+    "SELECT * FROM unnest({account_ids}::uuid[], {debits}::numeric[], {credits}::numeric[]) AS v(account_id, debit, credit) "
+    "ORDER BY account_id "
+    "ON CONFLICT (account_id) DO UPDATE SET "
+    "debit = account_balance.debit + EXCLUDED.debit, "
+    "credit = account_balance.credit + EXCLUDED.credit, "
+    "updated_on = localtimestamp() "
+).format(
+    account_ids=Placeholder("account_ids"),
+    debits=Placeholder("debits"),
+    credits=Placeholder("credits"),
+)
+
+
+# each account's sums over the lines of journals dated up to %(as_of)s.
+# the entity's latest snapshot day {snap_cmp} as_of, plus the lines dated
+# after it. an account with no row that day counts all its lines, so a
+# missing row is never wrong, only slower
+_AS_OF_SUMS = SQL(
+    "WITH snap_day AS ("
+    "SELECT max(s.day) AS day FROM account a JOIN daily_account_snapshot s ON s.account_id = a.id"
+    " WHERE a.entity_id = %(entity_id)s AND s.day {snap_cmp} %(as_of)s"
+    "), snap AS ("
+    "SELECT s.account_id, s.debit, s.credit FROM account a JOIN daily_account_snapshot s ON s.account_id = a.id"
+    " WHERE a.entity_id = %(entity_id)s AND s.day = (SELECT day FROM snap_day)"
+    "), lines AS ("
+    # the journal's (entity, timestamp) index, only the days after the snapshot
+    "SELECT l.account_id, l.direction, l.amount FROM journal j JOIN ledger l ON l.journal_id = j.id"
+    " WHERE j.entity_id = %(entity_id)s AND j.timestamp > (SELECT day FROM snap_day) AND j.timestamp <= %(as_of)s"
+    " AND l.account_id IN (SELECT account_id FROM snap)"
+    " UNION ALL "
+    "SELECT l.account_id, l.direction, l.amount FROM account a"
+    " JOIN ledger l ON l.account_id = a.id JOIN journal j ON j.id = l.journal_id"
+    " WHERE a.entity_id = %(entity_id)s AND j.timestamp <= %(as_of)s"
+    " AND NOT EXISTS (SELECT 1 FROM snap WHERE snap.account_id = a.id)"
+    ") "
+    "SELECT x.account_id, a.type, SUM(x.debit) AS debit, SUM(x.credit) AS credit FROM ("
+    "SELECT account_id, debit, credit FROM snap"
+    " UNION ALL "
+    "SELECT account_id,"
+    " CASE WHEN direction = 'DEBIT' THEN amount ELSE 0 END,"
+    " CASE WHEN direction = 'CREDIT' THEN amount ELSE 0 END FROM lines"
+    ") x JOIN account a ON a.id = x.account_id GROUP BY x.account_id, a.type "
+)
+AS_OF_SUMS = _AS_OF_SUMS.format(snap_cmp=SQL("<="))
+
+# from the snapshot before the day, never the day's own, so taking a day
+# again recomputes it rather than copying it
+TAKE_SNAPSHOT = SQL(
+    "INSERT INTO daily_account_snapshot (account_id, day, debit, credit) "
+    "SELECT account_id, %(as_of)s, debit, credit FROM ({}) t "
+    "ON CONFLICT (account_id, day) DO UPDATE SET debit = EXCLUDED.debit, credit = EXCLUDED.credit "
+).format(_AS_OF_SUMS.format(snap_cmp=SQL("<")))
+
+# per entity transaction locks between taking its snapshots (exclusive) and
+# posting to it (shared). keyed on the entity id, in a namespace of their
+# own so they do not collide with other advisory locks. its own statement,
+# a statement that waits reads as of before the wait
+SNAPSHOT_LOCK = SQL(
+    "SELECT {lock}(hashtextextended('daily_account_snapshot:' || x::text, 0)) "
+    "FROM unnest({entity_ids}::uuid[]) AS x ORDER BY x "
+)
+
+# a line dated on or before a snapshot day is in that snapshot, so a
+# backdated line is added to every later snapshot of its account. summed per
+# snapshot row first, an UPDATE ... FROM applies only one match per row
+ADD_TO_SNAPSHOTS = SQL(
+    "UPDATE daily_account_snapshot s SET debit = s.debit + d.debit, credit = s.credit + d.credit FROM ("
+    "SELECT s2.account_id, s2.day, SUM(v.debit) AS debit, SUM(v.credit) AS credit"
+    " FROM unnest({account_ids}::uuid[], {days}::date[], {debits}::numeric[], {credits}::numeric[]) AS v(account_id, day, debit, credit)"
+    " JOIN daily_account_snapshot s2 ON s2.account_id = v.account_id AND s2.day >= v.day"
+    " GROUP BY s2.account_id, s2.day"
+    ") d WHERE s.account_id = d.account_id AND s.day = d.day "
+).format(
+    account_ids=Placeholder("account_ids"),
+    days=Placeholder("days"),
+    debits=Placeholder("debits"),
+    credits=Placeholder("credits"),
+)
+
+
+@lru_cache(maxsize=4)
+def _compose_ledger_sums(by_entity: bool) -> Composed:
+    """each account's sums from the ledger itself, of one entity or all"""
+    query = SQL(
+        "SELECT l.account_id, a.entity_id,"
+        " COALESCE(SUM(l.amount) FILTER (WHERE l.direction = 'DEBIT'), 0) AS debit,"
+        " COALESCE(SUM(l.amount) FILTER (WHERE l.direction = 'CREDIT'), 0) AS credit"
+        " FROM ledger l JOIN account a ON a.id = l.account_id"
+    )
+    if by_entity:
+        query += SQL(" WHERE a.entity_id = {}").format(Placeholder("entity_id"))
+    return query + SQL(" GROUP BY l.account_id, a.entity_id")
+
+
+@lru_cache(maxsize=4)
+def _compose_drift(by_entity: bool) -> Composed:
+    """accounts whose stored sums are not their ledger's"""
+    stored = SQL("SELECT b.account_id, a.entity_id, b.debit, b.credit FROM account_balance b JOIN account a ON a.id = b.account_id")
+    if by_entity:
+        stored += SQL(" WHERE a.entity_id = {}").format(Placeholder("entity_id"))
+    return SQL(
+        "WITH actual AS ({actual}), stored AS ({stored}) "
+        "SELECT COALESCE(s.account_id, t.account_id) AS account_id,"
+        " COALESCE(s.entity_id, t.entity_id) AS entity_id,"
+        " s.debit AS stored_debit, s.credit AS stored_credit,"
+        " COALESCE(t.debit, 0) AS debit, COALESCE(t.credit, 0) AS credit "
+        "FROM stored s FULL JOIN actual t ON t.account_id = s.account_id "
+        # a missing row is the same as a zero one
+        "WHERE COALESCE(s.debit, 0) <> COALESCE(t.debit, 0) OR COALESCE(s.credit, 0) <> COALESCE(t.credit, 0) "
+        "ORDER BY 1 "
+    ).format(actual=_compose_ledger_sums(by_entity), stored=stored)
+
+
+@lru_cache(maxsize=4)
+def _compose_rebuild(by_entity: bool) -> tuple[Composed, Composed]:
+    """clear the stored sums, then insert them from the ledger"""
+    clear = SQL("DELETE FROM account_balance b")
+    if by_entity:
+        clear += SQL(" USING account a WHERE a.id = b.account_id AND a.entity_id = {}").format(
+            Placeholder("entity_id")
+        )
+    fill = SQL("INSERT INTO account_balance (account_id, debit, credit) SELECT account_id, debit, credit FROM ({}) t ").format(
+        _compose_ledger_sums(by_entity)
+    )
+    return clear, fill
+
+
+@lru_cache(maxsize=4)
+def _compose_snapshot_rebuild(by_entity: bool) -> Composed:
+    """set every snapshot row, of one entity or all, to its account's sums
+    over the lines of journals dated up to the row's day
+    """
+    query = SQL(
+        "UPDATE daily_account_snapshot s SET debit = t.debit, credit = t.credit FROM ("
+        "SELECT s2.account_id, s2.day,"
+        " COALESCE(SUM(l.amount) FILTER (WHERE l.direction = 'DEBIT'), 0) AS debit,"
+        " COALESCE(SUM(l.amount) FILTER (WHERE l.direction = 'CREDIT'), 0) AS credit"
+        " FROM daily_account_snapshot s2 JOIN account a ON a.id = s2.account_id"
+        " LEFT JOIN (ledger l JOIN journal j ON j.id = l.journal_id)"
+        " ON l.account_id = s2.account_id AND j.timestamp <= s2.day"
+    )
+    if by_entity:
+        query += SQL(" WHERE a.entity_id = {}").format(Placeholder("entity_id"))
+    return query + SQL(
+        " GROUP BY s2.account_id, s2.day"
+        ") t WHERE s.account_id = t.account_id AND s.day = t.day "
+    )
+
+
+async def _execute(shape: tuple, table: str, query: Composed, vals: dict, returns: bool) -> list[dict]:
+    """run one statement on table, the one it writes to or reads first"""
+    timer = QueryTimer("FETCH" if returns else "INSERT", shape, table)
+    async with (
+        connection() as conn,
+        conn.cursor(row_factory=dict_row) as cur,
+    ):
+        timer.connected()
+        await cur.execute(query, vals)
+        records = await cur.fetchall() if returns else []
+        if not returns:
+            invalidate_table(table)
+        timer.done(len(records) if returns else max(cur.rowcount, 0), lambda: query.as_string(cur), vals)
+    return records
+
+
+def ledger_sums(ledgers: list[m_Ledger], journal_days: Optional[dict[UUID, date]] = None) -> dict:
+    """account id -> (debit, credit) summed over the ledger lines. summed as
+    Decimal, like the NUMERIC cols, so the stored sums match the ledger's.
+    keyed (account id, day) if journal_days maps the lines' journal ids to
+    their dates
+    """
+    sums = {}
+    for ledger in ledgers:
+        key = ledger.account_id if journal_days is None else (ledger.account_id, journal_days[ledger.journal_id])
+        debit, credit = sums.get(key, (Decimal(0), Decimal(0)))
+        amount = Decimal(str(ledger.amount))
+        if ledger.direction == m_AccountActions.DEBIT:
+            debit += amount
+        else:
+            credit += amount
+        sums[key] = (debit, credit)
+    return sums
+
+
+async def add_to_account_balances(ledgers: list[m_Ledger]) -> None:
+    """
+    add new ledger lines to their accounts' balances, one statement for any
+    number of lines. call in the unit of work that inserts the lines, so
+    both are committed or neither
+    """
+    sums = ledger_sums(ledgers)
+    if not sums:
+        return
+    account_ids = sorted(sums)
+    await _execute(
+        ("BALANCE", "ADD"),
+        "account_balance",
+        ADD_TO_BALANCES,
+        {
+            "account_ids": account_ids,
+            "debits": [sums[x][0] for x in account_ids],
+            "credits": [sums[x][1] for x in account_ids],
+        },
+        returns=False,
+    )
+
+
+async def _lock_snapshots(entity_ids: list[UUID], shared: bool) -> None:
+    """SNAPSHOT_LOCK on each entity, held until the transaction ends"""
+    lock = "pg_advisory_xact_lock_shared" if shared else "pg_advisory_xact_lock"
+    await _execute(
+        ("SNAPSHOT", "LOCK", shared),
+        "daily_account_snapshot",
+        SNAPSHOT_LOCK.format(lock=SQL(lock), entity_ids=Placeholder("entity_ids")),
+        {"entity_ids": sorted(entity_ids)},
+        returns=True,
+    )
+
+
+async def add_to_daily_snapshots(
+    ledgers: list[m_Ledger],
+    journal_days: dict[UUID, date],
+    entity_ids: set[UUID],
+) -> None:
+    """
+    add new ledger lines to the snapshots taken on or after their journal's
+    date. call in the unit of work that inserts the lines. waits for a
+    snapshot of the entities being taken, then only blocks their snapshots,
+    not postings or other entities
+
+    - journal_days: journal id -> journal timestamp, of every line's journal
+    - entity_ids: the entities of those journals
+    """
+    sums = ledger_sums(ledgers, journal_days)
+    if not sums:
+        return
+    await _lock_snapshots(list(entity_ids), shared=True)
+    keys = sorted(sums)
+    await _execute(
+        ("SNAPSHOT", "ADD"),
+        "daily_account_snapshot",
+        ADD_TO_SNAPSHOTS,
+        {
+            "account_ids": [x[0] for x in keys],
+            "days": [x[1] for x in keys],
+            "debits": [sums[x][0] for x in keys],
+            "credits": [sums[x][1] for x in keys],
+        },
+        returns=False,
+    )
+
+
+async def take_daily_snapshot(entity_id: UUID, day: date) -> None:
+    """
+    store every account's sums as of day, computed from the last snapshot
+    before day and the lines since. run daily, for yesterday. taking a day
+    again recomputes it from the one before
+    """
+    async with unit_of_work():
+        # waits for the entity's postings in flight, and holds off new ones
+        # until done, so no line is in neither the snapshot nor
+        # add_to_daily_snapshots. other entities are not held
+        await _lock_snapshots([entity_id], shared=False)
+        await _execute(
+            ("SNAPSHOT", "TAKE"),
+            "daily_account_snapshot",
+            TAKE_SNAPSHOT,
+            {"entity_id": entity_id, "as_of": day},
+            returns=False,
+        )
+
+
+async def fetch_account_balances_as_of(entity_id: UUID, as_of: date) -> list[dict]:
+    """
+    sums of every account of the entity with lines in journals dated up to
+    and including as_of. reads the nearest snapshot and the lines after it
+
+    -> returns dicts of "account_id", "type", "debit", "credit"
+    """
+    return await _execute(
+        ("SNAPSHOT", "AS_OF"),
+        "daily_account_snapshot",
+        AS_OF_SUMS,
+        {"entity_id": entity_id, "as_of": as_of},
+        returns=True,
+    )
+
+
+async def fetch_account_balances(entity_id: UUID) -> list[dict]:
+    """
+    stored sums of every account of the entity that has ledger lines, one
+    row per account
+
+    -> returns dicts of "account_id", "type", "debit", "credit"
+    """
+    return await _execute(
+        ("BALANCE", "FETCH"),
+        "account_balance",
+        SQL(
+            "SELECT b.account_id, a.type, b.debit, b.credit FROM account_balance b "
+            "JOIN account a ON a.id = b.account_id WHERE a.entity_id = {} "
+        ).format(Placeholder("entity_id")),
+        {"entity_id": entity_id},
+        returns=True,
+    )
+
+
+async def check_account_balances(entity_id: Optional[UUID] = None, fix: bool = False) -> list[dict]:
+    """
+    compare the stored sums with the ledger, of one entity or all. if fix,
+    rebuild them from the ledger in the same transaction
+
+    -> returns the drifted accounts, dicts of "account_id", "entity_id",
+       "stored_debit", "stored_credit" (None if no row) and the ledger's
+       "debit", "credit"
+    """
+    by_entity = entity_id is not None
+    vals = {"entity_id": entity_id} if by_entity else {}
+    async with unit_of_work():
+        drift = await _execute(("BALANCE", "DRIFT", by_entity), "account_balance", _compose_drift(by_entity), vals, returns=True)
+        if fix and drift:
+            await rebuild_account_balances(entity_id)
+            logger.warning(f"Rebuilt account balances, {len(drift)} accounts had drifted")
+    return drift
+
+
+async def rebuild_account_balances(entity_id: Optional[UUID] = None) -> None:
+    """recompute the stored sums from the ledger, of one entity or all. for
+    bulk loads that do not go through add_to_account_balances
+    """
+    by_entity = entity_id is not None
+    vals = {"entity_id": entity_id} if by_entity else {}
+    clear, fill = _compose_rebuild(by_entity)
+    async with unit_of_work():
+        await _execute(("BALANCE", "CLEAR", by_entity), "account_balance", clear, vals, returns=False)
+        await _execute(("BALANCE", "REBUILD", by_entity), "account_balance", fill, vals, returns=False)
+
+
+async def rebuild_daily_snapshots(entity_id: Optional[UUID] = None) -> None:
+    """recompute the stored snapshots from the ledger, of one entity or all.
+    for bulk loads that do not go through add_to_daily_snapshots. an account
+    with no row on a snapshot day needs none, its lines are read instead
+    """
+    by_entity = entity_id is not None
+    vals = {"entity_id": entity_id} if by_entity else {}
+    async with unit_of_work():
+        if by_entity:
+            await _lock_snapshots([entity_id], shared=False)
+        await _execute(
+            ("SNAPSHOT", "REBUILD", by_entity),
+            "daily_account_snapshot",
+            _compose_snapshot_rebuild(by_entity),
+            vals,
+            returns=False,
+        )
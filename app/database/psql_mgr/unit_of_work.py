@@ -0,0 +1,111 @@
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Callable, Hashable, Optional
+
+from psycopg import AsyncConnection, IsolationLevel
+
+from app.database.psql_mgr.psql_mgr import get_async_pool
+
+logger = logging.getLogger(__name__)
+
+
+class UnitOfWork:
+    """one connection and transaction shared by every API call in the block"""
+
+    __slots__ = ("conn", "isolation_level", "read_only", "_after_end")
+
+    def __init__(
+        self,
+        conn: AsyncConnection,
+        isolation_level: Optional[IsolationLevel],
+        read_only: bool,
+    ):
+        self.conn = conn
+        self.isolation_level = isolation_level
+        self.read_only = read_only
+        self._after_end: dict[Hashable, Callable[[], None]] = {}
+
+    def after_end(self, key: Hashable, callback: Callable[[], None]) -> None:
+        """run callback once the transaction is committed or rolled back.
+        one callback per key
+        """
+        self._after_end[key] = callback
+
+
+_current: ContextVar[Optional[UnitOfWork]] = ContextVar("unit_of_work", default=None)
+
+
+def current_unit_of_work() -> Optional[UnitOfWork]:
+    return _current.get()
+
+
+@asynccontextmanager
+async def unit_of_work(
+    isolation_level: Optional[IsolationLevel] = None,
+    read_only: bool = False,
+) -> AsyncIterator[UnitOfWork]:
+    """
+    every FETCH_API, INSERT_API and CUSTOM_API call inside the block runs on
+    one pool connection, in one transaction. committed at the end of the
+    block, rolled back if it raises
+
+    usage:
+        async with unit_of_work() as uow:
+            account_type = await FETCH_API.fetch_where_dict(
+                select_cols=c_Account.type,
+                from_table=m_Account,
+                where_dict={c_Account.id: account_id},
+            )
+            await INSERT_API.insert_row(m_Ledger(...))
+
+    - isolation_level: psycopg.IsolationLevel, server default if None
+    - read_only: run as a READ ONLY transaction
+
+    a nested block is a savepoint of the outer one, and can not change its
+    isolation level or read only mode. tasks started inside the block share
+    its connection, and their statements run one at a time
+    """
+    outer = _current.get()
+    if outer is not None:
+        assert isolation_level in (None, outer.isolation_level), (
+            "can't change isolation level of a running unit of work"
+        )
+        assert read_only in (False, outer.read_only), (
+            "can't make a running unit of work read only"
+        )
+        async with outer.conn.transaction():
+            yield outer
+        return
+
+    async with get_async_pool().connection() as conn:
+        uow = UnitOfWork(conn, isolation_level, read_only)
+        if isolation_level is not None:
+            await conn.set_isolation_level(isolation_level)
+        if read_only:
+            await conn.set_read_only(True)
+        token = _current.set(uow)
+        try:
+            async with conn.transaction():
+                yield uow
+        finally:
+            _current.reset(token)
+            # the connection goes back to the pool, as it came out of it
+            if isolation_level is not None:
+                await conn.set_isolation_level(None)
+            if read_only:
+                await conn.set_read_only(None)
+            for callback in uow._after_end.values():
+                callback()
+
+
+@asynccontextmanager
+async def connection() -> AsyncIterator[AsyncConnection]:
+    """the unit of work's connection if in one, a pool connection otherwise"""
+    uow = _current.get()
+    if uow is not None:
+        yield uow.conn
+        return
+
+    async with get_async_pool().connection() as conn:
+        yield conn
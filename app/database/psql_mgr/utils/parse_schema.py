@@ -44,9 +44,20 @@ SQL_CONSTRAINTS = ["PRIMARY", "FOREIGN", "CHECK", "UNIQUE", "CONSTRAINT"]
 assert len(set(SQL_CONSTRAINTS)) == len(SQL_CONSTRAINTS)
 
 
-def read_schema_into_dict(schema_module: ModuleType) -> tuple[dict, dict]:
+def read_references(clause: str) -> tuple[str, tuple[str, ...]]:
+    """'... REFERENCES table(col, ...)' -> (table, (col, ...))"""
+    i_ref = clause.upper().find("REFERENCES")
+    assert i_ref >= 0
+    clause = clause[i_ref + len("REFERENCES") :]
+    ref_table = lh.find_before_l_start(clause, "(").strip()
+    ref_cols = lh.find_between_l_start_l_end(clause, "(", ")").split(",")
+    return ref_table, tuple(c.strip() for c in ref_cols)
+
+
+def read_schema_into_dict(schema_module: ModuleType) -> tuple[dict, dict, dict]:
     enums = OrderedDict()
     tables = OrderedDict()
+    foreign_keys = OrderedDict()
 
     """read and execute the schema file"""
     assert schema_module.__file__ is not None
@@ -155,12 +166,41 @@ def read_schema_into_dict(schema_module: ModuleType) -> tuple[dict, dict]:
                 if is_optional:
                     t = f"Optional[{t}] = None"
 
-                attrs.append((col_name, t))
+                attrs.append((col_name, t, col_type, is_array, is_optional))
 
             tables[table_name] = attrs
             if len(debug_skipped_lines) > 0:
                 logger.debug(f"{table_name} skipped lines: {debug_skipped_lines}")
 
+            # foreign keys need the () deleted above, re-read the raw lines
+            raw_commands = lh.split_outside_parens(
+                lh.find_between_l_start_r_end(command, "(", ")"), ","
+            )
+            for line in raw_commands:
+                if "REFERENCES" not in line.upper():
+                    continue
+                words = line.split()
+                if words[0].upper() == "FOREIGN":
+                    fk_cols = lh.find_between_l_start_l_end(line, "(", ")").split(",")
+                else:
+                    fk_cols = [words[0]]
+                foreign_keys.setdefault(table_name, []).append(
+                    (tuple(c.strip() for c in fk_cols), *read_references(line))
+                )
+
+        # foreign keys added after the table
+        elif (
+            [w.upper() for w in command.split()[:2]] == ["ALTER", "TABLE"]
+            and "FOREIGN KEY" in command.upper()
+        ):
+            table_name = command.split()[2]
+            assert table_name in tables, "alter table before create table"
+            fk_clause = command[command.upper().find("FOREIGN KEY") :]
+            fk_cols = lh.find_between_l_start_l_end(fk_clause, "(", ")").split(",")
+            foreign_keys.setdefault(table_name, []).append(
+                (tuple(c.strip() for c in fk_cols), *read_references(fk_clause))
+            )
+
         # all other commands
         else:
             logger.debug(f"non table/enum command in schema file {command}")
@@ -169,8 +209,9 @@ def read_schema_into_dict(schema_module: ModuleType) -> tuple[dict, dict]:
 
     logger.debug(f"enums: {pformat(enums)}")
     logger.debug(f"tables: {pformat(tables)}")
+    logger.debug(f"foreign keys: {pformat(foreign_keys)}")
 
-    return enums, tables
+    return enums, tables, foreign_keys
 
 
 def read_models_into_dict(models_module: ModuleType):
@@ -236,9 +277,16 @@ def to_underscore(model_name: str) -> str:
     return table_name
 
 
+def to_py_tuple(items: tuple | list) -> str:
+    """python source of a flat tuple of str / bool, double quoted like black"""
+    vals = [f'"{x}"' if isinstance(x, str) else str(x) for x in items]
+    return f"({', '.join(vals)},)" if len(vals) == 1 else f"({', '.join(vals)})"
+
+
 def write_dict_to_models_and_cols(
     enums: dict[str, list[str]],
-    tables: dict[str, list[tuple[str, str]]],
+    tables: dict[str, list[tuple[str, str, str, bool, bool]]],
+    foreign_keys: dict[str, list[tuple[tuple[str, ...], str, tuple[str, ...]]]],
     model_module: ModuleType,
 ) -> None:
     assert model_module.__file__ is not None
@@ -256,6 +304,9 @@ def write_dict_to_models_and_cols(
         f.write("\n")
         f.write("from pydantic import BaseModel\n")
 
+        f.write("\n")
+        f.write("from app.database.psql_mgr.utils.schema_meta import SchemaMeta\n")
+
         f.write("\n")
         f.write('""" This class is autogenerated """\n')
 
@@ -290,3 +341,29 @@ def write_dict_to_models_and_cols(
             f.write(f"class c_{to_cc(k)}:\n")
             for i in v:
                 f.write(f'    {i[0]} = "{k}.{i[0]}"\n')
+
+        # schema metadata registry
+        f.write("\n\n")
+        f.write("SCHEMA_META = SchemaMeta.build(\n")
+        f.write("    enums={\n")
+        for k, v in enums.items():
+            f.write(f'        "{k}": {to_py_tuple(v)},\n')
+        f.write("    },\n")
+        f.write("    tables={\n")
+        for k, v in tables.items():
+            f.write(f'        "{k}": (\n')
+            for i in v:
+                f.write(f"            {to_py_tuple((i[0], i[2], i[3], i[4]))},\n")
+            f.write("        ),\n")
+        f.write("    },\n")
+        f.write("    foreign_keys={\n")
+        for k, v in foreign_keys.items():
+            f.write(f'        "{k}": (\n')
+            for fk_cols, ref_table, ref_cols in v:
+                f.write(
+                    f"            ({to_py_tuple(fk_cols)}, "
+                    f'"{ref_table}", {to_py_tuple(ref_cols)}),\n'
+                )
+            f.write("        ),\n")
+        f.write("    },\n")
+        f.write(")\n")
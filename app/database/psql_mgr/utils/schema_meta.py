@@ -0,0 +1,100 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from importlib import import_module
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from app.database.psql_mgr.psql_mgr import get_schema_version
+
+# schema types whose postgres array type is not just "<type>[]"
+# (char[] would truncate every element to one character)
+SQL_ARRAY_TYPE_OVERRIDES = {
+    "CHAR": "text",
+    "VARCHAR": "text",
+    "SERIAL": "integer",
+}
+
+
+@dataclass(frozen=True)
+class ColumnMeta:
+    table: str
+    name: str
+    sql_type: str  # as written in the schema, without params. enum name if enum
+    is_array: bool
+    is_optional: bool  # nullable or has a default
+    enum: Optional[frozenset[str]]
+
+    @property
+    def array_type(self) -> str:
+        """postgres type to cast a bound list of this col's values to"""
+        return SQL_ARRAY_TYPE_OVERRIDES.get(self.sql_type, self.sql_type.lower())
+
+
+@dataclass(frozen=True)
+class ForeignKeyMeta:
+    table: str
+    cols: tuple[str, ...]
+    ref_table: str
+    ref_cols: tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class TableMeta:
+    name: str
+    columns: Mapping[str, ColumnMeta]  # col -> meta
+    required: frozenset[str]  # cols every insert must set
+    foreign_keys: tuple[ForeignKeyMeta, ...]
+
+
+@dataclass(frozen=True)
+class SchemaMeta:
+    """read only view of the schema, generated with the models"""
+
+    enums: Mapping[str, frozenset[str]]
+    tables: Mapping[str, TableMeta]
+    columns: Mapping[str, ColumnMeta]  # "table.col" -> meta, same as c_ classes
+
+    @staticmethod
+    def build(
+        enums: dict[str, tuple[str, ...]],
+        tables: dict[str, tuple[tuple[str, str, bool, bool], ...]],
+        foreign_keys: dict[str, tuple[tuple[tuple[str, ...], str, tuple[str, ...]], ...]],
+    ) -> "SchemaMeta":
+        enum_sets = {k: frozenset(v) for k, v in enums.items()}
+
+        table_metas = {}
+        all_columns = {}
+        for table_name, cols in tables.items():
+            columns = {
+                col_name: ColumnMeta(
+                    table=table_name,
+                    name=col_name,
+                    sql_type=sql_type,
+                    is_array=is_array,
+                    is_optional=is_optional,
+                    enum=enum_sets.get(sql_type),
+                )
+                for col_name, sql_type, is_array, is_optional in cols
+            }
+            table_metas[table_name] = TableMeta(
+                name=table_name,
+                columns=MappingProxyType(columns),
+                required=frozenset(k for k, v in columns.items() if not v.is_optional),
+                foreign_keys=tuple(
+                    ForeignKeyMeta(table_name, fk_cols, ref_table, ref_cols)
+                    for fk_cols, ref_table, ref_cols in foreign_keys.get(table_name, ())
+                ),
+            )
+            all_columns.update({f"{table_name}.{k}": v for k, v in columns.items()})
+
+        return SchemaMeta(
+            enums=MappingProxyType(enum_sets),
+            tables=MappingProxyType(table_metas),
+            columns=MappingProxyType(all_columns),
+        )
+
+
+@lru_cache(maxsize=1)
+def get_schema_meta() -> SchemaMeta:
+    models = import_module(f"app.database.psql_mgr.models.{get_schema_version()}")
+    return models.SCHEMA_META
@@ -51,6 +51,23 @@ def delete_between_l_start_l_end(s, start, end) -> tuple[str, int]:
     return s, n_deletes
 
 
+def split_outside_parens(s, sep) -> list[str]:
+    # split on sep, but not inside of (), eg "a(b, c), d" -> ["a(b, c)", " d"]
+    parts = []
+    depth = 0
+    i_last = 0
+    for i, char in enumerate(s):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == sep and depth == 0:
+            parts.append(s[i_last:i])
+            i_last = i + 1
+    parts.append(s[i_last:])
+    return parts
+
+
 def find_before_l_start(s, start) -> str:
     start = s.find(start)
     return s[0:start]
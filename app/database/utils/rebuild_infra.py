@@ -54,7 +54,7 @@ async def create_psql_schema_and_tables(
 
 def rebuild_models(schema_module: ModuleType, models_module: ModuleType):
     logger.info("Model Builder: Starting schema to dict")
-    ret_enums, ret_tables = parse_schema.read_schema_into_dict(
+    ret_enums, ret_tables, ret_foreign_keys = parse_schema.read_schema_into_dict(
         schema_module=schema_module,
     )
 
@@ -62,6 +62,7 @@ def rebuild_models(schema_module: ModuleType, models_module: ModuleType):
     parse_schema.write_dict_to_models_and_cols(
         enums=ret_enums,
         tables=ret_tables,
+        foreign_keys=ret_foreign_keys,
         model_module=models_module,
     )
 
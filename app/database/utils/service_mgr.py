@@ -3,6 +3,7 @@ import logging
 from app.utils.env_mgr import get_env
 from app.utils.log_helper import log_setup
 from app.database.psql_mgr.psql_mgr import start_async_pool, stop_async_pool
+from app.database.cache_mgr.cache_mgr import stop_cache
 
 logger = logging.getLogger(__name__)
 
@@ -31,5 +32,6 @@ async def start_services(
 
 async def stop_services():
     await stop_async_pool()
+    await stop_cache()
 
     logger.info("Stopped all services")
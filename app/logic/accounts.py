@@ -1,14 +1,19 @@
+from datetime import date
+from typing import Optional
 from uuid import UUID
 
+from app.database.cache_mgr.cache_mgr import cached_for_entity
 from app.database.psql_mgr.api.fetch import FETCH_API, NoRecordsFoundError
 from app.database.psql_mgr.models.v1 import (
     m_Account,
     c_Account,
-    m_Ledger,
-    c_Ledger,
     m_AccountActions,
     m_AccountType,
+    m_Person,
 )
+from app.database.psql_mgr.schema_specific_helpers.accounts import fetch_subtree
+from app.database.psql_mgr.schema_specific_helpers.balances import fetch_account_balances, fetch_account_balances_as_of
+from app.logic.users import user_in_entity
 
 
 master_account_names = {
@@ -32,6 +37,16 @@ class BusinessLogicException(Exception):
     pass
 
 
+class PermissionDeniedException(BusinessLogicException):
+    pass
+
+
+async def raise_if_not_member(user: Optional[m_Person], entity_id: UUID):
+    """after a member filtered query came back empty, find out why"""
+    if user is not None and not await user_in_entity(user, entity_id):
+        raise PermissionDeniedException("This user is not allowed to access this entity")
+
+
 def sign_scalar(account_type: str, transaction_direction: str) -> float:
     if account_type in DEBIT_ACCOUNTS:
         if transaction_direction == m_AccountActions.DEBIT:
@@ -47,144 +62,249 @@ def sign_scalar(account_type: str, transaction_direction: str) -> float:
         raise BusinessLogicException("unrecognized account type")
 
 
-async def get_tree_from_master(master_type_key: str, entity_id: UUID):
+def balance_sign(account_type: Optional[str]) -> int:
+    """+1 if a debit raises the balance of this type of account, -1 if a
+    credit does. income summary is closed into equity, so it is credit
+    normal. an account with no type has no balance, 0
+    """
+    if account_type is None:
+        return 0
+    if account_type == m_AccountType.INCOME_SUMMARY:
+        return -1
+    return int(sign_scalar(account_type, m_AccountActions.DEBIT))
+
+
+async def get_tree_from_master(master_type_key: str, entity_id: UUID, user: Optional[m_Person] = None):
+    """user, if given, must be in the entity. checked in the same query"""
     if master_type_key not in master_account_names:
         raise BusinessLogicException("Invalid master type key")
 
+    # the master is found by name in the same query that walks its subtree
     try:
-        results = await FETCH_API.fetch_where_dict(
-            select_cols=[c_Account.id, c_Account.entity_id],
-            from_table=m_Account,
-            where_dict={
-                c_Account.name: master_account_names[master_type_key],
-                c_Account.entity_id: entity_id,
-            },
+        account_list = await fetch_subtree(
+            entity_id,
+            account_name=master_account_names[master_type_key],
+            user_id=None if user is None else user.id,
         )
-        tree = await get_tree_from_account(results[c_Account.id], results[c_Account.entity_id])
-        return tree
-
     except NoRecordsFoundError:
+        await raise_if_not_member(user, entity_id)
         raise BusinessLogicException("Couldn't find master account")
 
+    return build_tree(account_list[0], index_children(account_list))
+
+
+def index_children(account_list: list[dict]) -> dict[UUID, list[dict]]:
+    """parent id -> child accounts, in account_list order. built once per request"""
+    children = {}
+    for account in account_list:
+        children.setdefault(account[c_Account.parent_account_id], []).append(account)
+    return children
+
+
+def build_tree(head_account: dict, children: dict[UUID, list[dict]]) -> dict:
+    """nested {name, id, children} from head_account down. iterative, so the
+    depth of the chart is not limited by the recursion limit
+    """
+    def make_node(account):
+        return {
+            "name": account[c_Account.name],
+            "id": str(account[c_Account.id]),
+            "children": [],
+        }
+
+    tree = make_node(head_account)
+    stack = [(head_account, tree)]
+    while stack:
+        account, node = stack.pop()
+        for child in children.get(account[c_Account.id], []):
+            child_node = make_node(child)
+            node["children"].append(child_node)
+            stack.append((child, child_node))
+    return tree
 
-def tree_recursion(current_account, account_list):
-    children_indices = [idx for (idx, account) in enumerate(account_list) if account[c_Account.parent_account_id] == current_account[c_Account.id]]
-    children = [tree_recursion(account_list[child_idx], account_list) for child_idx in children_indices]
-    return {
-        "name": current_account[c_Account.name],
-        "id": str(current_account[c_Account.id]),
-        "children": children,
-    }
 
+def build_list(head_account: dict, children: dict[UUID, list[dict]], b_only_childless: bool) -> list[dict]:
+    """head_account and everything under it, depth first, each account
+    before its children. only the leaves if b_only_childless
+    """
+    my_list = []
+    stack = [head_account]
+    while stack:
+        account = stack.pop()
+        my_children = children.get(account[c_Account.id], [])
+        if not (b_only_childless and my_children):
+            my_list.append({
+                c_Account.name: account[c_Account.name],
+                c_Account.id: str(account[c_Account.id]),
+            })
+        # reversed, so the first child comes off the stack first
+        stack.extend(reversed(my_children))
+    return my_list
+
+
+def build_balance_trees(account_list: list[dict]) -> list[dict]:
+    """
+    nested {name, id, type, balance, total, children} of each head in
+    account_list, a fetch_subtree(with_amounts=True) result. balance is the
+    account's own, signed by sign_scalar, total adds everything under it.
+    the list has parents before children, so one pass links the nodes and
+    one pass back up rolls the totals
+    """
+    heads = []
+    nodes = {}
+    for account in account_list:
+        sign = balance_sign(account[c_Account.type])
+        balance = sign * (account["debit"] - account["credit"])
+        node = {
+            "name": account[c_Account.name],
+            "id": str(account[c_Account.id]),
+            "type": account[c_Account.type],
+            "balance": balance,
+            "total": balance,
+            "children": [],
+        }
+        nodes[account[c_Account.id]] = node
+        parent = nodes.get(account[c_Account.parent_account_id])
+        (heads if parent is None else parent["children"]).append(node)
+
+    # children before parents, so a node's total is final when it is reached
+    for account in reversed(account_list):
+        node = nodes[account[c_Account.id]]
+        parent = nodes.get(account[c_Account.parent_account_id])
+        if parent is not None:
+            parent["total"] += node["total"]
+        # summed as Decimal, so no float drift up the tree
+        node["balance"] = float(node["balance"])
+        node["total"] = float(node["total"])
+    return heads
+
+
+async def get_balance_trees(
+        entity_id: UUID,
+        master_type_key: Optional[str] = None,
+        user: Optional[m_Person] = None,
+        as_of: Optional[date] = None,
+) -> list[dict]:
+    """
+    the tree under a master account, or under every root account of the
+    entity if no master_type_key, with balances. one query. user, if
+    given, must be in the entity. checked in the same query
+
+    - as_of: balances of journals dated up to and including this day, from
+      the nearest daily snapshot. the sums are a second query
+    """
+    if master_type_key is not None and master_type_key not in master_account_names:
+        raise BusinessLogicException("Invalid master type key")
 
-async def get_tree_from_account(account_id: UUID, entity_id: UUID) -> dict:
     try:
-        account_list = await FETCH_API.fetch_where_dict(
-            select_cols=[c_Account.id, c_Account.name, c_Account.parent_account_id],
-            from_table=m_Account,
-            where_dict={c_Account.entity_id: entity_id},
-            order_by=[(c_Account.name, FETCH_API.order.ASC)],
+        account_list = await fetch_subtree(
+            entity_id,
+            account_name=None if master_type_key is None else master_account_names[master_type_key],
+            user_id=None if user is None else user.id,
+            with_amounts=as_of is None,
         )
     except NoRecordsFoundError:
-        raise BusinessLogicException("No accounts found associated with your entity")
+        await raise_if_not_member(user, entity_id)
+        raise BusinessLogicException("Couldn't find the accounts to make trees for")
+
+    if as_of is not None:
+        # after the tree's query, which checked the user
+        sums = {x["account_id"]: x for x in await fetch_account_balances_as_of(entity_id, as_of)}
+        for account in account_list:
+            item = sums.get(account[c_Account.id])
+            account["debit"] = 0 if item is None else item["debit"]
+            account["credit"] = 0 if item is None else item["credit"]
+    return build_balance_trees(account_list)
 
-    head_account = next((account for account in account_list if account[c_Account.id] == account_id), None)
-    if head_account is None:
+
+async def get_tree_from_account(account_id: UUID, entity_id: UUID) -> dict:
+    try:
+        account_list = await fetch_subtree(entity_id, account_id=account_id)
+    except NoRecordsFoundError:
         raise BusinessLogicException("Could not find the account to make tree for")
 
-    tree = tree_recursion(head_account, account_list)
+    tree = build_tree(account_list[0], index_children(account_list))
     return tree
 
 
-async def get_all_account_amounts(entity_id: UUID) -> dict[str, float]:
-    results = await FETCH_API.fetch_join_where(
-        select_cols=[c_Account.id, c_Account.type, c_Ledger.direction, FETCH_API.make_agg_col(FETCH_API.agg_funcs.SUM, c_Ledger.amount)],
-        from_table=m_Ledger,
-        join_tables=[m_Account],
-        join_on=(c_Account.id, c_Ledger.account_id),
-        where_dict={c_Account.entity_id: entity_id},
-        group_by=[c_Account.id, c_Account.type, c_Ledger.direction],
-        order_by=[(c_Account.id, FETCH_API.order.ASC),
-                  (c_Ledger.direction, FETCH_API.order.ASC)],
-    )
-    d = {}
-    key1 = 'SUM.ledger.amount'
-    for item in results:
-        key = str(item[c_Account.id])
-        amount = sign_scalar(item[c_Account.type], item[c_Ledger.direction]) * float(item[key1])
-        if key in d:
-            d[key] += amount
+async def get_all_account_amounts(entity_id: UUID, as_of: Optional[date] = None) -> dict[str, float]:
+    """signed balance of every account with ledger lines, from the stored
+    sums, so one row per account however long the history. cached per entity
+
+    - as_of: only journals dated up to and including this day. from the
+      nearest daily snapshot plus the lines after it
+    """
+    async def load():
+        if as_of is None:
+            balances = await fetch_account_balances(entity_id)
         else:
-            d[key] = amount
-    return d
+            balances = await fetch_account_balances_as_of(entity_id, as_of)
+        d = {}
+        for item in balances:
+            sign = balance_sign(item["type"])
+            d[str(item["account_id"])] = float(sign * (item["debit"] - item["credit"]))
+        return d
+
+    name = "account_amounts" if as_of is None else f"account_amounts:{as_of.isoformat()}"
+    return await cached_for_entity(entity_id, name, load)
 
 
 async def get_list_from_entity(entity_id: UUID) -> list[dict]:
-    try:
-        results = await FETCH_API.fetch_where_dict(
-            select_cols=[c_Account.id, c_Account.name],
-            from_table=m_Account,
-            where_dict={c_Account.entity_id: entity_id},
-            order_by=(c_Account.name, FETCH_API.order.ASC),
-        )
-        return results
+    """cached per entity"""
+    async def load():
+        try:
+            results = await FETCH_API.fetch_where_dict(
+                select_cols=[c_Account.id, c_Account.name],
+                from_table=m_Account,
+                where_dict={c_Account.entity_id: entity_id},
+                order_by=(c_Account.name, FETCH_API.order.ASC),
+                flatten_return=False,
+            )
+            return [{c_Account.id: str(x[c_Account.id]), c_Account.name: x[c_Account.name]} for x in results]
 
-    except NoRecordsFoundError:
-        raise BusinessLogicException(f"No accounts found matching entity id {entity_id}")
+        except NoRecordsFoundError:
+            raise BusinessLogicException(f"No accounts found matching entity id {entity_id}")
 
+    return await cached_for_entity(entity_id, "account_list", load)
 
-async def get_list_from_entity_and_type(entity_id: UUID, account_type: m_AccountType) -> list[dict]:
-    try:
-        results = await FETCH_API.fetch_where_dict(
-            select_cols=[c_Account.id, c_Account.name],
-            from_table=m_Account,
-            where_dict={
-                c_Account.entity_id: entity_id,
-                c_Account.type: account_type,
-            },
-            order_by=(c_Account.name, FETCH_API.order.ASC),
-        )
-        return results
-
-    except NoRecordsFoundError:
-        raise BusinessLogicException(f"No accounts found matching entity id {entity_id}")
-
-
-def list_recursion(current_account, account_list, b_only_childless):
-    me = {
-        c_Account.name: current_account[c_Account.name],
-        c_Account.id: str(current_account[c_Account.id]),
-    }
-    children_indices = [idx for (idx, account) in enumerate(account_list) if account[c_Account.parent_account_id] == current_account[c_Account.id]]
-    if b_only_childless:
-        if not children_indices:
-            return [me]
-        else:
-            my_list = []
-    else:
-        my_list = [me]
-    for child_idx in children_indices:
-        my_list += list_recursion(account_list[child_idx], account_list, b_only_childless)
-    return my_list
 
+async def get_list_from_entity_and_type(entity_id: UUID, account_type: m_AccountType) -> list[dict]:
+    """cached per entity and type"""
+    async def load():
+        try:
+            results = await FETCH_API.fetch_where_dict(
+                select_cols=[c_Account.id, c_Account.name],
+                from_table=m_Account,
+                where_dict={
+                    c_Account.entity_id: entity_id,
+                    c_Account.type: account_type,
+                },
+                order_by=(c_Account.name, FETCH_API.order.ASC),
+                flatten_return=False,
+            )
+            return [{c_Account.id: str(x[c_Account.id]), c_Account.name: x[c_Account.name]} for x in results]
+
+        except NoRecordsFoundError:
+            raise BusinessLogicException(f"No accounts found matching entity id {entity_id}")
+
+    return await cached_for_entity(entity_id, f"account_list:{account_type.value}", load)
+
+
+async def get_list_from_master(master_type_key: str, entity_id: UUID, b_only_childless: bool, user: Optional[m_Person] = None):
+    """user, if given, must be in the entity. checked in the same query"""
+    if master_type_key not in master_account_names:
+        raise BusinessLogicException("Invalid master type key")
 
-async def get_list_from_master(master_type_key: str, entity_id: UUID, b_only_childless: bool):
     try:
-        # all accounts associated with this entity
-        account_list = await FETCH_API.fetch_where_dict(
-            select_cols=[c_Account.id, c_Account.name, c_Account.parent_account_id],
-            from_table=m_Account,
-            where_dict={c_Account.entity_id: entity_id},
-            order_by=[(c_Account.name, FETCH_API.order.ASC)],
+        # the master account and everything under it
+        account_list = await fetch_subtree(
+            entity_id,
+            account_name=master_account_names[master_type_key],
+            user_id=None if user is None else user.id,
         )
     except NoRecordsFoundError:
-        raise BusinessLogicException("No accounts found associated with your entity")
-
-    head_account = next((account for account in account_list if account[c_Account.name] == master_account_names[master_type_key]), None)
-    if head_account is None:
+        await raise_if_not_member(user, entity_id)
         raise BusinessLogicException("Could not find the account to make tree for")
 
-    my_list = list_recursion(head_account, account_list, b_only_childless)
+    my_list = build_list(account_list[0], index_children(account_list), b_only_childless)
     return my_list
-
-
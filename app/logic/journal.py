@@ -1,9 +1,11 @@
+import base64
 import datetime
+import json
 import logging
-from uuid import UUID
+from uuid import UUID, uuid4
 
+from app.database.cache_mgr.cache_mgr import invalidate_entity
 from app.database.psql_mgr.api.insert import INSERT_API
-from app.database.psql_mgr.api.custom import CUSTOM_API
 from app.database.psql_mgr.api.fetch import FETCH_API, NoRecordsFoundError
 from app.database.psql_mgr.models.v1 import (
     m_Account,
@@ -15,25 +17,74 @@ from app.database.psql_mgr.models.v1 import (
     m_Person,
     c_Person,
 )
-from app.logic.accounts import BusinessLogicException
+from app.database.psql_mgr.schema_specific_helpers.balances import add_to_account_balances, add_to_daily_snapshots
+from app.database.psql_mgr.unit_of_work import unit_of_work
+from app.logic.accounts import BusinessLogicException, raise_if_not_member
+from app.logic.users import entity_member_filter, user_entities_of
 
 logger = logging.getLogger(__name__)
 
 
+JOURNAL_PAGE_SIZE = 100
+JOURNAL_MAX_PAGE_SIZE = 1000
+JOURNAL_MAX_BATCH_SIZE = 1000
+
+
+class InvalidPageException(BusinessLogicException):
+    pass
+
+
+class InvalidBatchException(BusinessLogicException):
+    pass
+
+
+def encode_journal_cursor(timestamp: datetime.date, journal_id: UUID, backward: bool = False) -> str:
+    """opaque keyset cursor for the journal entry a page ended on, or
+    started on if backward (the page before it)
+    """
+    raw = {"timestamp": timestamp.isoformat(), "id": str(journal_id)}
+    if backward:
+        raw["backward"] = True
+    return base64.urlsafe_b64encode(json.dumps(raw).encode()).decode()
+
+
+def decode_journal_cursor(cursor: str) -> tuple[dict, bool]:
+    """-> returns the keyset and if the page is before it"""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        keyset = {
+            c_Journal.timestamp: datetime.date.fromisoformat(raw["timestamp"]),
+            c_Journal.id: UUID(raw["id"]),
+        }
+        return keyset, raw.get("backward") is True
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        raise InvalidPageException("Invalid journal cursor") from e
+
+
 async def get_journal_entries(
         entity_id: UUID,
         max_rows: int,
         start_date: datetime.date,
         stop_date: datetime.date,
         account_name: str,
-) -> list:
+        cursor: str = None,
+        user: m_Person = None,
+) -> tuple[list, str | None, str | None]:
+    """one page of journal entries, newest first
+
+    pages are keyed on (timestamp, journal id), so every page costs the same
+    no matter how deep it is. max_rows is the page size in journal entries,
+    JOURNAL_PAGE_SIZE if None. it used to cap ledger lines at 10000, callers
+    that relied on that now page with the cursors. user, if given, must be
+    in the entity. checked in the page query
 
-    # This is how I handle the user not providing a max_rows
-    arbitrary_max = 10000
-    if max_rows is None:
-        limit = arbitrary_max
-    else:
-        limit = max_rows
+    -> returns the entries, the cursor of the next (older) page and of the
+       previous (newer) page, None if there is none
+    """
+    page_size = JOURNAL_PAGE_SIZE if max_rows is None else max_rows
+    if not 0 < page_size <= JOURNAL_MAX_PAGE_SIZE:
+        raise InvalidPageException(f"Page size must be between 1 and {JOURNAL_MAX_PAGE_SIZE}")
+    after, backward = (None, False) if cursor is None else decode_journal_cursor(cursor)
 
     # Format the where_dict based on which constraints are specified by user
     where_dict = {
@@ -50,7 +101,69 @@ async def get_journal_entries(
     if account_name is not None:
         where_dict[c_Account.name] = account_name
 
-    # make DB call
+    page_order = [
+        (c_Journal.timestamp, FETCH_API.order.DESC),
+        (c_Journal.id, FETCH_API.order.DESC),
+    ]
+    # a page before the cursor is read oldest first from it, then flipped
+    fetch_order = page_order
+    if backward:
+        fetch_order = [(x, FETCH_API.order.ASC) for x, _ in page_order]
+    member_filter = None if user is None else entity_member_filter(user, c_Journal.entity_id)
+
+    # make DB calls
+    try:
+        # first the page of journal ids. one extra tells us if there is a next page
+        if account_name is None:
+            page = await FETCH_API.fetch_where_dict(
+                select_cols=[c_Journal.id, c_Journal.timestamp],
+                from_table=m_Journal,
+                where_dict=where_dict,
+                order_by=fetch_order,
+                limit=page_size + 1,
+                flatten_return=False,
+                after=after,
+                exists=member_filter,
+            )
+        else:
+            page = await FETCH_API.fetch_join_where(
+                select_cols=[c_Journal.id, c_Journal.timestamp],
+                from_table=m_Journal,
+                join_tables=[m_Ledger, m_Account],
+                join_on=[
+                    (c_Ledger.journal_id, c_Journal.id),
+                    (c_Ledger.account_id, c_Account.id),
+                ],
+                where_dict=where_dict,
+                group_by=[c_Journal.id, c_Journal.timestamp],
+                order_by=fetch_order,
+                limit=page_size + 1,
+                flatten_return=False,
+                after=after,
+                exists=member_filter,
+            )
+    except NoRecordsFoundError:
+        await raise_if_not_member(user, entity_id)
+        if after is not None:
+            return [], None, None
+        raise BusinessLogicException("No matching journal entries found")
+
+    has_more = len(page) > page_size
+    page = page[:page_size]
+    if backward:
+        page.reverse()
+
+    # coming back from a later page there is always one after, and going on
+    # from any page there is always one before
+    next_cursor = None
+    if has_more or backward:
+        next_cursor = encode_journal_cursor(page[-1][c_Journal.timestamp], page[-1][c_Journal.id])
+    prev_cursor = None
+    if (has_more and backward) or (after is not None and not backward):
+        prev_cursor = encode_journal_cursor(page[0][c_Journal.timestamp], page[0][c_Journal.id], backward=True)
+
+    # then every ledger line of just those journals
+    where_dict[c_Journal.id] = (FETCH_API.where_operator.IN, [item[c_Journal.id] for item in page])
     try:
         results = await FETCH_API.fetch_join_where(
             select_cols=[
@@ -72,41 +185,33 @@ async def get_journal_entries(
                 (c_Journal.created_by, c_Person.id),
             ],
             where_dict=where_dict,
-            order_by=[(c_Journal.timestamp, FETCH_API.order.DESC)],
-            limit=limit,
+            order_by=page_order,
+            flatten_return=False,
         )
-        if len(results) == arbitrary_max:
-            logger.warning("The number of records returned exceeded the internal limit.")
-
-        # list of unique journal IDs sorted by date
-        results_journal_only = sorted(list(set([(
-            item[c_Journal.id],
-            item[c_Journal.timestamp],
-            item[c_Person.first_name] + " " + item[c_Person.last_name],
-            item[c_Journal.vendor],
-            item[c_Journal.description]
-        ) for item in results])), key=(lambda x: x[1]), reverse=True)
-
-        list_out = []
-        for journal in results_journal_only:
-            journal_id = journal[0]
-
-            credits = [{"amount": str(item[c_Ledger.amount]), "account": item[c_Account.name]} for item in results if item[c_Journal.id] == journal_id and item[c_Ledger.direction] == "CREDIT"]
-            debits = [{"amount": str(item[c_Ledger.amount]), "account": item[c_Account.name]} for item in results if item[c_Journal.id] == journal_id and item[c_Ledger.direction] == "DEBIT"]
-
-            list_out.append({
-                "date": journal[1].isoformat(),
-                "user": journal[2],
-                "vendor": journal[3],
-                "description": journal[4],
-                "credits": credits,
-                "debits": debits,
-            })
-
-        return list_out
-
     except NoRecordsFoundError:
-        raise BusinessLogicException("No matching journal entries found")
+        # journals on this page were removed between the two queries
+        results = []
+
+    # group the ledger lines under their journal, keeping page order
+    journals = {}
+    for item in results:
+        journal = journals.get(item[c_Journal.id])
+        if journal is None:
+            journal = journals[item[c_Journal.id]] = {
+                "date": item[c_Journal.timestamp].isoformat(),
+                "user": item[c_Person.first_name] + " " + item[c_Person.last_name],
+                "vendor": item[c_Journal.vendor],
+                "description": item[c_Journal.description],
+                "credits": [],
+                "debits": [],
+            }
+        line = {"amount": str(item[c_Ledger.amount]), "account": item[c_Account.name]}
+        if item[c_Ledger.direction] == "CREDIT":
+            journal["credits"].append(line)
+        elif item[c_Ledger.direction] == "DEBIT":
+            journal["debits"].append(line)
+
+    return list(journals.values()), next_cursor, prev_cursor
 
 
 async def add_transaction(
@@ -118,37 +223,111 @@ async def add_transaction(
     if not ledger_balance_check(ledger_list):
         raise BusinessLogicException("Ledger entries not balanced. ")
 
-    # add new journal entry to DB
+    # the journal and its ledger lines go in as one transaction. the inserts
+    # are one pipelined round trip, then the balance and snapshot statements
+    # and the commit follow, a fixed number of round trips for any number of
+    # lines. the journal id is made here so the lines can reference it
+    if journal.id is None:
+        journal.id = uuid4()
+    journal.valid = True
+    for ledger in ledger_list:
+        ledger.journal_id = journal.id
+
     try:
-        journal_id = await INSERT_API.insert_row_ret_uuid(journal)
-        logger.info(f"New journal entry {journal_id} added to DB.")
+        # the balances are added to in the same transaction
+        async with unit_of_work():
+            await INSERT_API.insert_in_transaction([journal], ledger_list)
+            await add_to_account_balances(ledger_list)
+            await add_to_daily_snapshots(ledger_list, {journal.id: journal.timestamp}, {journal.entity_id})
     except Exception as e:
-        logger.error(f"Error adding new journal entry to DB. Exception {e}.")
+        logger.error(f"Error adding transaction to DB. Exception {e}.")
         raise BusinessLogicException("Error adding transaction to DB.")
 
-    # add all ledger rows to DB
-    for ledger in ledger_list:
-        # augment with journal id from above
-        ledger.journal_id = journal_id
-        try:
-            ledger_id = await INSERT_API.insert_row_ret_uuid(ledger)
-            logger.debug(f"New ledger entry {ledger_id} added to DB.")
-        except Exception as e:
-            logger.error(f"Error adding new ledger entry to DB. Exception {e}.")
-            raise BusinessLogicException("Error adding transaction to DB.")
-
-    # if you made it this far, the full transaction is valid. update valid col
+    # committed, the entity's cached balances are stale now
+    await invalidate_entity(journal.entity_id)
+    logger.info(f"New journal entry {journal.id} added to DB.")
+    return journal.id
+
+
+async def add_transactions(
+        entries: list[tuple[m_Journal, list[m_Ledger]]],
+        user: m_Person,
+) -> list[dict]:
+    """post many journal entries at once
+
+    balances are checked in one pass, the user is checked against every
+    entity in one query, and all entries that pass go in as one transaction.
+    an entry that fails a check is left out, the others still go in
+
+    -> returns {"id": journal id} or {"error": reason} per entry, in order
+    """
+    if not 0 < len(entries) <= JOURNAL_MAX_BATCH_SIZE:
+        raise InvalidBatchException(f"Batch size must be between 1 and {JOURNAL_MAX_BATCH_SIZE}")
+
+    balanced = ledger_balance_checks([ledger_list for _, ledger_list in entries])
+    allowed = await user_entities_of(user, {journal.entity_id for journal, _ in entries})
+
+    results = [{} for _ in entries]
+    journals = []
+    ledgers = []
+    for result, is_balanced, (journal, ledger_list) in zip(results, balanced, entries):
+        if journal.entity_id not in allowed:
+            result["error"] = "User is not part of the entity specified in the journal entry"
+            continue
+        if not is_balanced:
+            result["error"] = "Ledger entries not balanced. "
+            continue
+
+        # same as add_transaction, ids are made here so the lines can reference them
+        if journal.id is None:
+            journal.id = uuid4()
+        journal.valid = True
+        for ledger in ledger_list:
+            ledger.journal_id = journal.id
+        journals.append(journal)
+        ledgers.extend(ledger_list)
+        result["id"] = journal.id
+
+    if not journals:
+        return results
+
     try:
-        query_str = f"UPDATE journal SET valid = true WHERE id = '{journal_id}';"
-        await CUSTOM_API.generic_query_no_return(query_str)
-        return journal_id
+        async with unit_of_work():
+            await INSERT_API.insert_in_transaction(journals, ledgers)
+            await add_to_account_balances(ledgers)
+            await add_to_daily_snapshots(
+                ledgers,
+                {x.id: x.timestamp for x in journals},
+                {x.entity_id for x in journals},
+            )
     except Exception as e:
-        logger.error(f"Error flipping journal valid flag to true. Exception {e}.")
-        raise BusinessLogicException("Error adding transaction to DB.")
+        logger.error(f"Error adding {len(journals)} transactions to DB. Exception {e}.")
+        # one transaction, so none of them went in
+        for result in results:
+            if "id" in result:
+                result.clear()
+                result["error"] = "Error adding transaction to DB."
+        return results
+
+    for entity_id in {x.entity_id for x in journals}:
+        await invalidate_entity(entity_id)
+    logger.info(f"{len(journals)} new journal entries added to DB.")
+    return results
 
 
 def ledger_balance_check(ledger_list: list[m_Ledger]):
-    sum_debit = sum([ledger.amount for ledger in ledger_list if ledger.direction == 'DEBIT'])
-    sum_credit = sum([ledger.amount for ledger in ledger_list if ledger.direction == 'CREDIT'])
+    return ledger_balance_checks([ledger_list])[0]
+
+
+def ledger_balance_checks(ledger_lists: list[list[m_Ledger]]) -> list[bool]:
+    """ledger_balance_check of each list, in one pass over all the lines"""
+    sum_debit = [0] * len(ledger_lists)
+    sum_credit = [0] * len(ledger_lists)
+    for i, ledger_list in enumerate(ledger_lists):
+        for ledger in ledger_list:
+            if ledger.direction == 'DEBIT':
+                sum_debit[i] += ledger.amount
+            elif ledger.direction == 'CREDIT':
+                sum_credit[i] += ledger.amount
 
-    return True if sum_debit == sum_credit else False
+    return [debit == credit for debit, credit in zip(sum_debit, sum_credit)]
@@ -1,7 +1,7 @@
 from uuid import UUID
 
 from app.database.psql_mgr.models.v1 import m_Person, m_PersonEntityJunction, c_PersonEntityJunction
-from app.database.psql_mgr.api.fetch import FETCH_API, NoRecordsFoundError
+from app.database.psql_mgr.api.fetch import FETCH_API, Exists, NoRecordsFoundError
 
 
 class BusinessLogicException(Exception):
@@ -25,3 +25,34 @@ async def user_in_entity(user: m_Person, entity_id: UUID) -> bool:
 
     except NoRecordsFoundError:
         return False
+
+
+def entity_member_filter(user: m_Person, entity_col: str) -> Exists:
+    """EXISTS filter keeping rows whose entity_col is an entity of user.
+    lets a data query do the user_in_entity check in the same round trip
+    """
+    return FETCH_API.exists(
+        table=m_PersonEntityJunction,
+        correlate=(c_PersonEntityJunction.entity_id, entity_col),
+        where_dict={c_PersonEntityJunction.user_id: user.id},
+    )
+
+
+async def user_entities_of(user: m_Person, entity_ids: set[UUID]) -> set[UUID]:
+    """which of entity_ids user is part of. one query for any number of entities"""
+    if not entity_ids:
+        return set()
+    try:
+        results = await FETCH_API.fetch_where_dict(
+            select_cols=c_PersonEntityJunction.entity_id,
+            from_table=m_PersonEntityJunction,
+            where_dict={
+                c_PersonEntityJunction.entity_id: (FETCH_API.where_operator.IN, list(entity_ids)),
+                c_PersonEntityJunction.user_id: user.id,
+            },
+            flatten_return=False,
+        )
+    except NoRecordsFoundError:
+        return set()
+
+    return {x[c_PersonEntityJunction.entity_id] for x in results}
@@ -1,4 +1,5 @@
 import logging
+from datetime import date
 from typing import Annotated
 from uuid import UUID
 
@@ -9,7 +10,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from app.database.psql_mgr.models.v1 import m_Person, m_AccountType
 from ..dependencies import get_current_active_user
 from app.security.auth import check_entity_permissions
-from app.logic.accounts import get_tree_from_master, BusinessLogicException, get_all_account_amounts, get_list_from_entity, get_list_from_entity_and_type, get_list_from_master
+from app.logic.accounts import get_tree_from_master, BusinessLogicException, PermissionDeniedException, get_all_account_amounts, get_list_from_entity, get_list_from_entity_and_type, get_list_from_master, get_balance_trees
 
 logger = logging.getLogger(__name__)
 
@@ -28,17 +29,16 @@ async def accounts_get_tree(
         entity_id: UUID
 ) -> dict:
 
-    # First, make sure this user is allowed to access this entity
-    if not await check_entity_permissions(current_user.id, entity_id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="This user is not allowed to access this entity",
-        )
-
+    # that the user is allowed to access this entity is checked in the same query
     try:
-        tree = await get_tree_from_master(master_type_key, entity_id)
+        tree = await get_tree_from_master(master_type_key, entity_id, current_user)
         return tree
 
+    except PermissionDeniedException as e:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=str(e),
+        )
     except BusinessLogicException as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -54,17 +54,16 @@ async def accounts_get_list(
         b_only_childless: bool | None = False,
 ) -> dict:
 
-    # First, make sure this user is allowed to access this entity
-    if not await check_entity_permissions(current_user.id, entity_id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="This user is not allowed to access this entity",
-        )
-
+    # that the user is allowed to access this entity is checked in the same query
     try:
-        my_list = await get_list_from_master(master_type_key, entity_id, b_only_childless)
+        my_list = await get_list_from_master(master_type_key, entity_id, b_only_childless, current_user)
         return {"accounts": my_list}
 
+    except PermissionDeniedException as e:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=str(e),
+        )
     except BusinessLogicException as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -75,7 +74,8 @@ async def accounts_get_list(
 @router.get("/amounts")
 async def accounts_get_tree(
         current_user: ANNOTATED_USER,
-        entity_id: UUID
+        entity_id: UUID,
+        as_of: date | None = None,
 ) -> dict:
 
     # First, make sure this user is allowed to access this entity
@@ -86,8 +86,8 @@ async def accounts_get_tree(
         )
 
     try:
-        # good opportunity for Redis
-        tree = await get_all_account_amounts(entity_id)
+        # cached per entity, invalidated by journal posts and account inserts
+        tree = await get_all_account_amounts(entity_id, as_of)
         return tree
 
     except BusinessLogicException as e:
@@ -97,6 +97,31 @@ async def accounts_get_tree(
         )
 
 
+@router.get("/balances")
+async def accounts_get_balance_trees(
+        current_user: ANNOTATED_USER,
+        entity_id: UUID,
+        master_type_key: str | None = None,
+        as_of: date | None = None,
+) -> dict:
+
+    # that the user is allowed to access this entity is checked in the same query
+    try:
+        trees = await get_balance_trees(entity_id, master_type_key, current_user, as_of)
+        return {"accounts": trees}
+
+    except PermissionDeniedException as e:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=str(e),
+        )
+    except BusinessLogicException as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e),
+        )
+
+
 @router.get("/list_of_accounts")
 async def accounts_get_list(
         current_user: ANNOTATED_USER,
@@ -113,7 +138,7 @@ async def accounts_get_list(
 
     try:
         if account_type is None:
-            # good opportunity for Redis
+            # cached per entity, invalidated by journal posts and account inserts
             list_of_accounts = await get_list_from_entity(entity_id)
         else:
             list_of_accounts = await get_list_from_entity_and_type(entity_id, account_type)
@@ -9,6 +9,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 
 from app.database.psql_mgr.models.v1 import m_Person, m_AccessLevels, c_Person, m_Entity, c_Entity, m_PersonEntityJunction, c_PersonEntityJunction
 from app.database.psql_mgr.api.custom import CUSTOM_API
+from app.database.psql_mgr.api.delete import DELETE_API
 from app.database.psql_mgr.api.fetch import FETCH_API, NoRecordsFoundError
 from app.database.psql_mgr.api.insert import INSERT_API
 from ..dependencies import get_current_active_user
@@ -129,13 +130,18 @@ async def entity_add_user(
             detail="Only admins can join users and entities"
         )
 
-    # add new entity to DB
+    # add new entity to DB. adding a user that is already in is a no op
     try:
-        new_junc = await INSERT_API.insert_row_ret_model(
-            m_PersonEntityJunction(
-                entity_id=entity_id,
-                user_id=user_id,
-            )
+        new_junc, = await INSERT_API.upsert_rows(
+            [
+                m_PersonEntityJunction(
+                    entity_id=entity_id,
+                    user_id=user_id,
+                )
+            ],
+            conflict_cols=[c_PersonEntityJunction.user_id, c_PersonEntityJunction.entity_id],
+            update_cols=c_PersonEntityJunction.user_id,
+            return_cols=FETCH_API.all,
         )
         logger.info(f"New user/entity junction added to DB.")
         return new_junc
@@ -163,15 +169,16 @@ async def entity_remove_user(
 
     # remove users access from this entity in DB
     try:
-        junc_id = await FETCH_API.fetch_where_dict(
-            select_cols=c_PersonEntityJunction.id,
-            from_table=m_PersonEntityJunction,
+        n_deleted = await DELETE_API.delete_where(
+            m_PersonEntityJunction,
             where_dict={
                 c_PersonEntityJunction.entity_id: entity_id,
                 c_PersonEntityJunction.user_id: user_id,
             },
         )
-        await CUSTOM_API.delete_row(m_PersonEntityJunction, junc_id)
+        # the user was not in the entity
+        if n_deleted == 0:
+            raise NoRecordsFoundError
         logger.info(f"User with id {user_id} removed from Entity with id {entity_id} in the DB.")
 
     except Exception as e:
@@ -4,12 +4,18 @@ from typing import Annotated
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import BaseModel
 
 from app.database.psql_mgr.models.v1 import m_Person, m_Journal, m_Ledger
 from ..dependencies import get_current_active_user
-from app.security.auth import check_entity_permissions
-from app.logic.accounts import BusinessLogicException
-from app.logic.journal import get_journal_entries, add_transaction
+from app.logic.accounts import BusinessLogicException, PermissionDeniedException
+from app.logic.journal import (
+    get_journal_entries,
+    add_transaction,
+    add_transactions,
+    InvalidPageException,
+    InvalidBatchException,
+)
 from app.logic.users import user_in_entity
 
 logger = logging.getLogger(__name__)
@@ -22,6 +28,11 @@ router = APIRouter(
 ANNOTATED_USER = Annotated[m_Person, Depends(get_current_active_user)]
 
 
+class JournalBatchEntry(BaseModel):
+    journal: m_Journal
+    ledger_list: list[m_Ledger]
+
+
 @router.post("/", status_code=201)
 async def add_journal_entry(
         current_user: ANNOTATED_USER,
@@ -46,6 +57,28 @@ async def add_journal_entry(
         )
 
 
+@router.post("/batch", status_code=201)
+async def add_journal_entries(
+        current_user: ANNOTATED_USER,
+        entries: list[JournalBatchEntry],
+) -> list[dict]:
+    # authorization is checked per entry, with one query for the whole batch
+    try:
+        for entry in entries:
+            entry.journal.created_by = current_user.id
+        return await add_transactions([(x.journal, x.ledger_list) for x in entries], current_user)
+    except InvalidBatchException as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed trying to add journal entries to DB"
+        )
+
+
 @router.get("/")
 async def get_journal(
         current_user: ANNOTATED_USER,
@@ -54,20 +87,35 @@ async def get_journal(
         start_date: datetime.date = None,
         stop_date: datetime.date = None,
         account_name: str = None,
+        cursor: str = None,
 ) -> dict:
-    # First, make sure this user is allowed to access this entity
-    if not await check_entity_permissions(current_user.id, entity_id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="This user is not allowed to access this entity",
-        )
-
+    """
+    one page of journal entries, newest first. max_rows is the page size in
+    journal entries, default 100 and at most 1000 (it used to be up to 10000
+    ledger lines). pass next_cursor or prev_cursor back as cursor for the
+    older or newer page, they are None at either end
+    """
+    # that the user is allowed to access this entity is checked in the page query
     try:
-        entries = await get_journal_entries(entity_id, max_rows, start_date, stop_date, account_name)
+        entries, next_cursor, prev_cursor = await get_journal_entries(
+            entity_id, max_rows, start_date, stop_date, account_name, cursor, current_user
+        )
         return {
             "journal_entries": entries,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor,
         }
 
+    except PermissionDeniedException as e:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=str(e),
+        )
+    except InvalidPageException as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
     except BusinessLogicException as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
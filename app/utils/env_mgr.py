@@ -20,6 +20,29 @@ class Env(BaseSettings):
     PSQL_PORT: str
     PSQL_SCHEMA_VERSION: str
     PASSWORD_SALT: str
+    # server-side prepared statement policy (opt-in, off keeps psycopg's
+    # default of preparing after 5 executions)
+    PSQL_PREPARE: bool = False
+    PSQL_PREPARE_THRESHOLD: int = 0
+    PSQL_PREPARED_MAX: int = 100
+    # query instrumentation
+    PSQL_SLOW_QUERY_MS: float = 250.0
+    PSQL_SLOW_QUERY_SAMPLE_RATE: float = 1.0
+    # skip per call validation of query shapes that already passed once
+    PSQL_PRODUCTION_MODE: bool = False
+    # read cache, comma separated tables eg "account,entity". empty is off
+    PSQL_READ_CACHE_TABLES: str = ""
+    PSQL_READ_CACHE_TTL_S: float = 30.0
+    PSQL_READ_CACHE_MAX_ROWS: int = 10000
+    # per entity cache of balances and account lists, "off" by default.
+    # "resp" is redis or anything speaking its protocol at CACHE_URL, shared
+    # by every worker. "memory" is in process, only for a single worker, with
+    # more the others stay stale for up to CACHE_TTL_S after a write
+    CACHE_BACKEND: str = "off"
+    CACHE_URL: str = "redis://localhost:6379/0"
+    CACHE_TTL_S: float = 300.0
+    CACHE_MAX_ENTRIES: int = 10000
+    CACHE_TIMEOUT_S: float = 0.5
 
 
 @lru_cache(maxsize=1)
@@ -0,0 +1,92 @@
+import random
+import sys
+import time
+from uuid import uuid4
+
+from app.database.psql_mgr.models.v1 import c_Account
+from app.logic.accounts import build_list, build_tree, index_children
+
+# (n accounts, length of the chain under the master, so at least this deep)
+CHARTS = [(1_000, 20), (10_000, 25), (50_000, 40)]
+# the old builders rescan every account per node, past this they take minutes
+OLD_MAX_ACCOUNTS = 10_000
+
+
+def make_chart(n_accounts: int, depth: int) -> list[dict]:
+    """one master, a chain depth deep under it, the rest hung off random
+    accounts. sorted on name like the fetch in get_tree_from_account
+    """
+    random.seed(n_accounts)
+    master = {c_Account.id: uuid4(), c_Account.name: "Master", c_Account.parent_account_id: None}
+    accounts = [master]
+    for i in range(n_accounts - 1):
+        parent = accounts[-1] if i < depth else random.choice(accounts)
+        accounts.append({
+            c_Account.id: uuid4(),
+            c_Account.name: f"Account {i}",
+            c_Account.parent_account_id: parent[c_Account.id],
+        })
+    return sorted(accounts, key=lambda x: x[c_Account.name])
+
+
+# the builders before the children index, kept here as the baseline
+def old_tree_recursion(current_account, account_list):
+    children_indices = [idx for (idx, account) in enumerate(account_list) if account[c_Account.parent_account_id] == current_account[c_Account.id]]
+    children = [old_tree_recursion(account_list[child_idx], account_list) for child_idx in children_indices]
+    return {
+        "name": current_account[c_Account.name],
+        "id": str(current_account[c_Account.id]),
+        "children": children,
+    }
+
+
+def old_list_recursion(current_account, account_list, b_only_childless):
+    me = {
+        c_Account.name: current_account[c_Account.name],
+        c_Account.id: str(current_account[c_Account.id]),
+    }
+    children_indices = [idx for (idx, account) in enumerate(account_list) if account[c_Account.parent_account_id] == current_account[c_Account.id]]
+    if b_only_childless:
+        if not children_indices:
+            return [me]
+        else:
+            my_list = []
+    else:
+        my_list = [me]
+    for child_idx in children_indices:
+        my_list += old_list_recursion(account_list[child_idx], account_list, b_only_childless)
+    return my_list
+
+
+def timed(func) -> tuple[float, object]:
+    before = time.perf_counter()
+    result = func()
+    return time.perf_counter() - before, result
+
+
+def main():
+    sys.setrecursionlimit(10_000)
+    for n_accounts, depth in CHARTS:
+        accounts = make_chart(n_accounts, depth)
+        master = next(x for x in accounts if x[c_Account.parent_account_id] is None)
+
+        new_tree_s, tree = timed(lambda: build_tree(master, index_children(accounts)))
+        new_list_s, leaves = timed(lambda: build_list(master, index_children(accounts), True))
+        line = (
+            f"{n_accounts:>7} accounts, depth {depth:>3}   "
+            f"tree: {new_tree_s * 1e3:8.1f} ms   list: {new_list_s * 1e3:8.1f} ms"
+        )
+
+        if n_accounts <= OLD_MAX_ACCOUNTS:
+            old_tree_s, old_tree = timed(lambda: old_tree_recursion(master, accounts))
+            old_list_s, old_leaves = timed(lambda: old_list_recursion(master, accounts, True))
+            assert tree == old_tree and leaves == old_leaves, "builders disagree"
+            line += (
+                f"   before: tree {old_tree_s * 1e3:9.1f} ms, list {old_list_s * 1e3:9.1f} ms"
+                f"   speedup: {old_tree_s / new_tree_s:6.0f}x"
+            )
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import time
+from datetime import date
+
+from app.database.utils.service_mgr import start_services, stop_services
+from app.database.psql_mgr.api.delete import DELETE_API, DELETE_CHUNK_ROWS
+from app.database.psql_mgr.api.insert import INSERT_API
+from app.database.psql_mgr.models.v1 import (
+    m_Account,
+    c_Account,
+    m_AccountActions,
+    m_AccountType,
+    m_Entity,
+    m_Journal,
+    m_Ledger,
+    c_Ledger,
+)
+
+APP_NAME = "app"
+logger = logging.getLogger(APP_NAME)
+
+N_ROWS = [1_000, 100_000, 1_000_000]
+# one task and pool connection per row, past this it only measures the pool
+TG_MAX_ROWS = 100_000
+
+
+def ledger_rows(n_rows: int, journal_id, account_ids):
+    # generator, so copy_rows never has the whole load in memory
+    for i in range(n_rows):
+        yield m_Ledger(
+            journal_id=journal_id,
+            account_id=account_ids[i % 2],
+            amount=float(i % 1000) + 0.25,
+            direction=m_AccountActions.DEBIT if i % 2 else m_AccountActions.CREDIT,
+        )
+
+
+async def setup() -> tuple:
+    entity_id = await INSERT_API.insert_row_ret_uuid(m_Entity(name=f"bench {time.time()}"))
+    account_ids = [
+        await INSERT_API.insert_row_ret_uuid(
+            m_Account(entity_id=entity_id, name=name, type=m_AccountType.ASSET)
+        )
+        for name in ["bench debit", "bench credit"]
+    ]
+    journal_id = await INSERT_API.insert_row_ret_uuid(
+        m_Journal(entity_id=entity_id, timestamp=date.today(), description="bench")
+    )
+    return entity_id, journal_id, account_ids
+
+
+async def teardown(entity_id, journal_id):
+    await clear_ledger(journal_id)
+    await DELETE_API.delete_ids(m_Journal, [journal_id])
+    await DELETE_API.delete_where(m_Account, {c_Account.entity_id: entity_id})
+    await DELETE_API.delete_ids(m_Entity, [entity_id])
+
+
+async def clear_ledger(journal_id):
+    # chunked, so the 1M row delete does not hold every row lock at once
+    await DELETE_API.delete_where(m_Ledger, {c_Ledger.journal_id: journal_id}, chunk_size=DELETE_CHUNK_ROWS)
+
+
+async def timed(coro) -> str:
+    before = time.perf_counter()
+    try:
+        await coro
+    except Exception as e:
+        return f"failed ({e.__class__.__name__})"
+    after = time.perf_counter()
+    return f"{after - before:8.2f} s"
+
+
+async def main():
+    await start_services(app_name=APP_NAME)
+    entity_id, journal_id, account_ids = await setup()
+
+    try:
+        for n_rows in N_ROWS:
+            results = {}
+
+            results["copy_rows"] = await timed(
+                INSERT_API.copy_rows(ledger_rows(n_rows, journal_id, account_ids))
+            )
+            await clear_ledger(journal_id)
+
+            results["bulk_insert"] = await timed(
+                INSERT_API.bulk_insert(list(ledger_rows(n_rows, journal_id, account_ids)))
+            )
+            await clear_ledger(journal_id)
+
+            if n_rows <= TG_MAX_ROWS:
+                results["tg_insert_rows"] = await timed(
+                    INSERT_API.tg_insert_rows(list(ledger_rows(n_rows, journal_id, account_ids)))
+                )
+                await clear_ledger(journal_id)
+            else:
+                results["tg_insert_rows"] = "skipped"
+
+            for name, result in results.items():
+                print(f"{n_rows:>9} rows  {name:<15} {result}")
+    finally:
+        await teardown(entity_id, journal_id)
+        await stop_services()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,155 @@
+import argparse
+import asyncio
+import time
+import timeit
+from uuid import UUID, uuid4
+
+from app.database.utils.service_mgr import start_services, stop_services
+from app.database.psql_mgr.api.fetch import FETCH_API, NoRecordsFoundError, _prepare_fetch
+from app.database.psql_mgr.models.v1 import (
+    m_Account,
+    c_Account,
+    m_Journal,
+    c_Journal,
+    m_Ledger,
+    c_Ledger,
+    m_Person,
+    c_Person,
+    m_Entity,
+    c_Entity,
+)
+
+APP_NAME = "app"
+N_CALLS = 20000
+# calls per end to end run, each one a round trip to the database
+N_DB_CALLS = 2000
+
+
+def where_dict_args(entity_id: UUID = None):
+    # shape used by fetch_where_dict, e.g. get_tree_from_account
+    return dict(
+        select_cols=[c_Account.id, c_Account.name, c_Account.parent_account_id],
+        from_table=m_Account,
+        join_tables=None,
+        join_on=None,
+        where_dict={c_Account.entity_id: entity_id or uuid4()},
+        group_by=None,
+        order_by=[(c_Account.name, FETCH_API.order.ASC)],
+        limit=None,
+    )
+
+
+def join_where_args(entity_id: UUID = None):
+    # shape used by fetch_join_where, e.g. get_journal_entries
+    return dict(
+        select_cols=[
+            c_Journal.id,
+            c_Journal.description,
+            c_Journal.timestamp,
+            c_Person.first_name,
+            c_Ledger.amount,
+            c_Ledger.direction,
+            c_Account.name,
+        ],
+        from_table=m_Journal,
+        join_tables=[m_Ledger, m_Account, m_Person],
+        join_on=[
+            (c_Ledger.journal_id, c_Journal.id),
+            (c_Ledger.account_id, c_Account.id),
+            (c_Journal.created_by, c_Person.id),
+        ],
+        where_dict={c_Journal.entity_id: entity_id or uuid4(), c_Journal.valid: True},
+        group_by=None,
+        order_by=[(c_Journal.timestamp, FETCH_API.order.DESC)],
+        limit=1000,
+    )
+
+
+def uncached(kwargs):
+    # every call compiles, which is what _fetch did before the cache
+    FETCH_API.clear_query_cache()
+    _prepare_fetch(**kwargs)
+
+
+def cached(kwargs):
+    _prepare_fetch(**kwargs)
+
+
+async def call_api(name: str, kwargs: dict) -> None:
+    # the whole call, compile, execute and fetch. the read cache is skipped,
+    # so every call goes to the database
+    try:
+        if name == "fetch_where_dict":
+            kwargs = {k: v for k, v in kwargs.items() if k not in ("join_tables", "join_on")}
+            await FETCH_API.fetch_where_dict(**kwargs, flatten_return=False, use_cache=False)
+        else:
+            await FETCH_API.fetch_join_where(**kwargs, flatten_return=False, use_cache=False)
+    except NoRecordsFoundError:
+        pass
+
+
+async def time_calls(name: str, kwargs: dict, compile_each: bool) -> float:
+    start = time.perf_counter()
+    for _ in range(N_DB_CALLS):
+        if compile_each:
+            FETCH_API.clear_query_cache()
+        await call_api(name, kwargs)
+    return time.perf_counter() - start
+
+
+async def end_to_end() -> None:
+    """the same shapes, timed through FETCH_API against the database.
+    compiling is a small part of a call that waits on the database, so the
+    speedup here is much smaller than the compile only one
+    """
+    await start_services(app_name=APP_NAME)
+    try:
+        # a real entity if there is one, else the calls find no rows
+        try:
+            entity_id = (await FETCH_API.fetch_all(c_Entity.id, m_Entity, limit=1, use_cache=False))[0]
+        except NoRecordsFoundError:
+            entity_id = None
+        for name, kwargs in [
+            ("fetch_where_dict", where_dict_args(entity_id)),
+            ("fetch_join_where", join_where_args(entity_id)),
+        ]:
+            # warm the pool and the server's plan cache
+            await time_calls(name, kwargs, compile_each=False)
+            before = await time_calls(name, kwargs, compile_each=True)
+            FETCH_API.clear_query_cache()
+            after = await time_calls(name, kwargs, compile_each=False)
+            print_row(name, before, after, N_DB_CALLS)
+    finally:
+        await stop_services()
+
+
+def print_row(name: str, before: float, after: float, n_calls: int) -> None:
+    print(
+        f"{name:<18} before: {before / n_calls * 1e6:8.1f} us/call   "
+        f"after: {after / n_calls * 1e6:8.1f} us/call   "
+        f"speedup: {before / after:5.1f}x"
+    )
+
+
+def main(db: bool):
+    print("compile only (_prepare_fetch)")
+    for name, kwargs in [
+        ("fetch_where_dict", where_dict_args()),
+        ("fetch_join_where", join_where_args()),
+    ]:
+        before = timeit.timeit(lambda: uncached(kwargs), number=N_CALLS)
+        FETCH_API.clear_query_cache()
+        after = timeit.timeit(lambda: cached(kwargs), number=N_CALLS)
+        print_row(name, before, after, N_CALLS)
+    print(FETCH_API.query_cache_info())
+
+    if db:
+        print("end to end (FETCH_API call against the database)")
+        asyncio.run(end_to_end())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="time compiling fetch queries with and without the query cache")
+    parser.add_argument("--db", action="store_true", help="also time whole FETCH_API calls against the database")
+    args = parser.parse_args()
+    main(args.db)
@@ -0,0 +1,43 @@
+import argparse
+import asyncio
+import logging
+from uuid import UUID
+
+from app.database.utils.service_mgr import start_services, stop_services
+from app.database.cache_mgr.cache_mgr import invalidate_entity
+from app.database.psql_mgr.schema_specific_helpers.balances import check_account_balances
+
+APP_NAME = "app"
+logger = logging.getLogger(APP_NAME)
+
+
+async def main(entity_id: UUID | None, fix: bool) -> int:
+    await start_services(app_name=APP_NAME)
+    try:
+        drift = await check_account_balances(entity_id, fix)
+        # only reaches the app's workers with the resp backend. with the
+        # memory backend their cached balances stay stale up to CACHE_TTL_S
+        if fix:
+            for drifted_entity_id in {x["entity_id"] for x in drift}:
+                await invalidate_entity(drifted_entity_id)
+    finally:
+        await stop_services()
+
+    for item in drift:
+        print(
+            f"entity {item['entity_id']} account {item['account_id']}   "
+            f"stored debit {item['stored_debit']} credit {item['stored_credit']}   "
+            f"ledger debit {item['debit']} credit {item['credit']}"
+        )
+    scope = "all entities" if entity_id is None else f"entity {entity_id}"
+    print(f"{len(drift)} accounts drifted, {scope}" + (", rebuilt from the ledger" if fix and drift else ""))
+    # non zero if drifted and left that way, for cron / CI
+    return 1 if drift and not fix else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="compare account_balance with the ledger sums")
+    parser.add_argument("--entity-id", type=UUID, default=None, help="only this entity, default all")
+    parser.add_argument("--fix", action="store_true", help="rebuild account_balance from the ledger if drifted")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(main(args.entity_id, args.fix)))
@@ -4,7 +4,9 @@ from app.database.psql_mgr.models.v1 import (
     m_Person,
     m_AccessLevels,
     m_Entity,
+    c_Entity,
     m_PersonEntityJunction,
+    c_PersonEntityJunction,
     m_Account,
     c_Account,
     m_AccountType,
@@ -12,8 +14,14 @@ from app.database.psql_mgr.models.v1 import (
     m_Ledger,
     m_AccountActions,
 )
+from app.database.cache_mgr.cache_mgr import invalidate_entity
 from app.database.psql_mgr.api.insert import INSERT_API
-from app.database.psql_mgr.api.fetch import FETCH_API
+from app.database.psql_mgr.api.pipeline import Pipeline
+from app.database.psql_mgr.schema_specific_helpers.accounts import add_account_closure
+from app.database.psql_mgr.schema_specific_helpers.balances import (
+    rebuild_account_balances,
+    rebuild_daily_snapshots,
+)
 from app.security.auth import get_password_hash
 from account_tree import tree as TREE
 from sample_journal import journal as JOURNAL
@@ -36,162 +44,123 @@ async def add_users():
 
 
 async def add_entities(admin_id):
-    entity_id = await INSERT_API.insert_row_ret_uuid(
-        m_Entity(
-            name="1982 Counts",
-        )
-    )
-
-    await INSERT_API.insert_row(
-        m_Entity(
-            name="Dummy Entity"
-        )
-    )
-
-    await INSERT_API.insert_row(
-        m_PersonEntityJunction(
-            entity_id=entity_id,
-            user_id=admin_id,
-        )
+    # upserts, so seeding an existing database does not trip the unique names
+    entity_ids = await INSERT_API.upsert_rows(
+        [
+            m_Entity(name="1982 Counts"),
+            m_Entity(name="Dummy Entity"),
+        ],
+        conflict_cols=c_Entity.name,
+        update_cols=c_Entity.name,
+        return_cols=[c_Entity.id, c_Entity.name],
+    )
+    entity_id = next(x[c_Entity.id] for x in entity_ids if x[c_Entity.name] == "1982 Counts")
+
+    await INSERT_API.upsert_rows(
+        [
+            m_PersonEntityJunction(
+                entity_id=entity_id,
+                user_id=admin_id,
+            )
+        ],
+        conflict_cols=[c_PersonEntityJunction.user_id, c_PersonEntityJunction.entity_id],
     )
 
     return entity_id
 
 
-async def add_master_accounts(entity_id):
-    a_long = await INSERT_API.insert_row_ret_uuid(
-        m_Account(
-            entity_id=entity_id,
-            name="Long Term Assets (Master)",
-            type=m_AccountType.ASSET,
-        )
-    )
-
-    a_short = await INSERT_API.insert_row_ret_uuid(
-        m_Account(
-            entity_id=entity_id,
-            name="Short Term Assets (Master)",
-            type=m_AccountType.ASSET,
-        )
-    )
+# key -> (name, type) of the master accounts every entity starts with
+MASTER_ACCOUNTS = {
+    "assets_long": ("Long Term Assets (Master)", m_AccountType.ASSET),
+    "assets_short": ("Short Term Assets (Master)", m_AccountType.ASSET),
+    "assets_owed": ("Owed Assets (Master)", m_AccountType.ASSET),
+    "expenses_operating": ("Operating Expenses (Master)", m_AccountType.EXPENSE),
+    "expenses_cogr": ("COGR Expenses (Master)", m_AccountType.EXPENSE),
+    "liabilities_short": ("Short Term Liabilities (Master)", m_AccountType.EQUITY),
+    "liabilities_long": ("Long Term Liabilities (Master)", m_AccountType.EQUITY),
+    "equity": ("Equity (Master)", m_AccountType.EQUITY),
+    "income": ("Income (Master)", m_AccountType.INCOME),
+    "dividends": ("Dividends (Master)", m_AccountType.DIVIDEND),
+    "income_summary": ("Income Summary", m_AccountType.INCOME_SUMMARY),
+}
 
-    a_owed = await INSERT_API.insert_row_ret_uuid(
-        m_Account(
-            entity_id=entity_id,
-            name="Owed Assets (Master)",
-            type=m_AccountType.ASSET,
-        )
-    )
-
-    ex_operating = await INSERT_API.insert_row_ret_uuid(
-        m_Account(
-            entity_id=entity_id,
-            name="Operating Expenses (Master)",
-            type=m_AccountType.EXPENSE,
-        )
-    )
-
-    ex_cogr = await INSERT_API.insert_row_ret_uuid(
-        m_Account(
-            entity_id=entity_id,
-            name="COGR Expenses (Master)",
-            type=m_AccountType.EXPENSE,
-        )
-    )
-
-    equity = await INSERT_API.insert_row_ret_uuid(
-        m_Account(
-            entity_id=entity_id,
-            name="Equity (Master)",
-            type=m_AccountType.EQUITY,
-        )
-    )
-
-    l_short = await INSERT_API.insert_row_ret_uuid(
-        m_Account(
-            entity_id=entity_id,
-            name="Short Term Liabilities (Master)",
-            type=m_AccountType.EQUITY,
-        )
-    )
-
-    l_long = await INSERT_API.insert_row_ret_uuid(
-        m_Account(
-            entity_id=entity_id,
-            name="Long Term Liabilities (Master)",
-            type=m_AccountType.EQUITY,
-        )
-    )
 
-    income = await INSERT_API.insert_row_ret_uuid(
-        m_Account(
-            entity_id=entity_id,
-            name="Income (Master)",
-            type=m_AccountType.INCOME,
-        )
-    )
-
-    dividend = await INSERT_API.insert_row_ret_uuid(
-        m_Account(
-            entity_id=entity_id,
-            name="Dividends (Master)",
-            type=m_AccountType.DIVIDEND,
-        )
-    )
-
-    income_summary = await INSERT_API.insert_row_ret_uuid(
-        m_Account(
-            entity_id=entity_id,
-            name="Income Summary",
-            type=m_AccountType.INCOME_SUMMARY,
+async def add_master_accounts(entity_id):
+    # one upsert, so seeding an existing entity does not trip the unique names
+    account_ids = {
+        x[c_Account.name]: x[c_Account.id]
+        for x in await INSERT_API.upsert_rows(
+            [
+                m_Account(
+                    entity_id=entity_id,
+                    name=name,
+                    type=account_type,
+                )
+                for name, account_type in MASTER_ACCOUNTS.values()
+            ],
+            conflict_cols=[c_Account.entity_id, c_Account.name],
+            update_cols=c_Account.type,
+            return_cols=[c_Account.id, c_Account.name],
         )
-    )
-
-    return {
-        "assets_long": a_long,
-        "assets_short": a_short,
-        "assets_owed": a_owed,
-        "expenses_operating": ex_operating,
-        "expenses_cogr": ex_cogr,
-        "liabilities_short": l_short,
-        "liabilities_long": l_long,
-        "equity": equity,
-        "income": income,
-        "dividends": dividend,
-        "income_summary": income_summary,
     }
 
+    master_dict = {key: account_ids[name] for key, (name, _) in MASTER_ACCOUNTS.items()}
+    await add_account_closure(list(master_dict.values()))
+    await invalidate_entity(entity_id)
+    return master_dict
 
-async def add_one_account(entity_id, parent_id, acct_dict):
-    parent_type = await FETCH_API.fetch_where_dict(
-        select_cols=c_Account.type,
-        from_table=m_Account,
-        where_dict={c_Account.id: parent_id},
-    )
-
-    account_id = await INSERT_API.insert_row_ret_uuid(
-        m_Account(
-            entity_id=entity_id,
-            name=acct_dict["name"],
-            parent_account_id=parent_id,
-            type=parent_type,
-        )
-    )
 
-    if "children" in acct_dict and len(acct_dict["children"]) > 0:
-        for child_acct in acct_dict["children"]:
-            await add_one_account(entity_id, account_id, child_acct)
+async def add_accounts(entity_id, master_dict, tree):
+    """one upsert per level of the tree. an account has the type of its
+    master, from MASTER_ACCOUNTS, so nothing is read
+    """
+    # (parent id, parent type, acct_dict) of every account on this level
+    level = [
+        (master_dict[key], MASTER_ACCOUNTS[key][1], acct)
+        for key in master_dict
+        for acct in tree[key]
+    ]
+    while level:
+        rows = [
+            m_Account(
+                entity_id=entity_id,
+                name=acct_dict["name"],
+                parent_account_id=parent_id,
+                type=parent_type,
+            )
+            for parent_id, parent_type, acct_dict in level
+        ]
+        account_ids = {
+            x[c_Account.name]: x[c_Account.id]
+            for x in await INSERT_API.upsert_rows(
+                rows,
+                conflict_cols=[c_Account.entity_id, c_Account.name],
+                # not parent_account_id, moving an existing account has to
+                # go through reparent_account to keep the closure right
+                update_cols=c_Account.type,
+                return_cols=[c_Account.id, c_Account.name],
+            )
+        }
+        await add_account_closure(list(account_ids.values()))
 
+        level = [
+            (account_ids[acct_dict["name"]], parent_type, child_acct)
+            for _, parent_type, acct_dict in level
+            for child_acct in acct_dict.get("children", [])
+        ]
 
-async def add_accounts(entity_id, master_dict, tree):
-    for key in master_dict:
-        for acct in tree[key]:
-            await add_one_account(entity_id, master_dict[key], acct)
+    await invalidate_entity(entity_id)
 
 
 async def add_journal(user_id, entity_id, transaction_list):
     for transaction in transaction_list:
-        journal_id = await INSERT_API.insert_row_ret_uuid(
+        lines = [(m_AccountActions.CREDIT, x) for x in transaction["credits"]]
+        lines += [(m_AccountActions.DEBIT, x) for x in transaction["debits"]]
+
+        # the journal and the lookups of its lines' accounts are independent,
+        # all sent in one round trip
+        pipe = Pipeline()
+        pipe.insert_row_ret_uuid(
             m_Journal(
                 vendor=transaction["vendor"] if "vendor" in transaction else None,
                 description=transaction["description"],
@@ -201,38 +170,27 @@ async def add_journal(user_id, entity_id, transaction_list):
                 valid=True,
             )
         )
-
-        for credit in transaction["credits"]:
-            credit_account_id = await FETCH_API.fetch_where_dict(
-                select_cols=c_Account.id,
-                from_table=m_Account,
-                where_dict={c_Account.name: credit["account"]}
-            )
-
-            await INSERT_API.insert_row(
-                m_Ledger(
-                    journal_id=journal_id,
-                    account_id=credit_account_id,
-                    direction=m_AccountActions.CREDIT,
-                    amount=credit["amount"],
-                )
-            )
-
-        for debit in transaction["debits"]:
-            debit_account_id = await FETCH_API.fetch_where_dict(
+        for _, line in lines:
+            pipe.fetch_where_dict(
                 select_cols=c_Account.id,
                 from_table=m_Account,
-                where_dict={c_Account.name: debit["account"]}
+                where_dict={c_Account.entity_id: entity_id, c_Account.name: line["account"]},
             )
+        journal_id, *account_ids = await pipe.execute()
+        missing = [line["account"] for (_, line), x in zip(lines, account_ids) if x is None]
+        assert not missing, f"no such accounts: {missing}"
 
-            await INSERT_API.insert_row(
+        await INSERT_API.bulk_insert(
+            [
                 m_Ledger(
                     journal_id=journal_id,
-                    account_id=debit_account_id,
-                    direction=m_AccountActions.DEBIT,
-                    amount=debit["amount"]
+                    account_id=account_id,
+                    direction=direction,
+                    amount=line["amount"],
                 )
-            )
+                for (direction, line), account_id in zip(lines, account_ids)
+            ]
+        )
 
 
 async def populate_infra():
@@ -241,3 +199,7 @@ async def populate_infra():
     master_accounts = await add_master_accounts(entity_id)
     await add_accounts(entity_id, master_accounts, TREE)
     await add_journal(admin_id, entity_id, JOURNAL)
+    # a bulk load, the balances and snapshots are summed once at the end
+    await rebuild_account_balances(entity_id)
+    await rebuild_daily_snapshots(entity_id)
+    await invalidate_entity(entity_id)
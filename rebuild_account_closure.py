@@ -0,0 +1,42 @@
+import argparse
+import asyncio
+import logging
+from uuid import UUID
+
+from app.database.utils.service_mgr import start_services, stop_services
+from app.database.cache_mgr.cache_mgr import invalidate_entity
+from app.database.psql_mgr.api.fetch import FETCH_API
+from app.database.psql_mgr.models.v1 import m_Entity, c_Entity
+from app.database.psql_mgr.schema_specific_helpers.accounts import rebuild_account_closure
+
+APP_NAME = "app"
+logger = logging.getLogger(APP_NAME)
+
+
+async def main(entity_id: UUID | None) -> None:
+    await start_services(app_name=APP_NAME)
+    try:
+        if entity_id is None:
+            entity_ids = [
+                x[c_Entity.id]
+                for x in await FETCH_API.fetch_all(c_Entity.id, m_Entity, flatten_return=False, use_cache=False)
+            ]
+        else:
+            entity_ids = [entity_id]
+
+        # one entity per transaction
+        for x in entity_ids:
+            await rebuild_account_closure(x)
+            await invalidate_entity(x)
+        logger.info(f"Rebuilt the account closure of {len(entity_ids)} entities")
+    finally:
+        await stop_services()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="fill account_closure from parent_account_id. run once after upgrading, or if the trees look wrong"
+    )
+    parser.add_argument("--entity-id", type=UUID, default=None, help="only this entity, default all")
+    args = parser.parse_args()
+    asyncio.run(main(args.entity_id))
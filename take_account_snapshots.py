@@ -0,0 +1,40 @@
+import argparse
+import asyncio
+import logging
+from datetime import date, timedelta
+from uuid import UUID
+
+from app.database.utils.service_mgr import start_services, stop_services
+from app.database.psql_mgr.api.fetch import FETCH_API
+from app.database.psql_mgr.models.v1 import m_Entity, c_Entity
+from app.database.psql_mgr.schema_specific_helpers.balances import take_daily_snapshot
+
+APP_NAME = "app"
+logger = logging.getLogger(APP_NAME)
+
+
+async def main(day: date, entity_id: UUID | None) -> None:
+    await start_services(app_name=APP_NAME)
+    try:
+        if entity_id is None:
+            entity_ids = [
+                x[c_Entity.id]
+                for x in await FETCH_API.fetch_all(c_Entity.id, m_Entity, flatten_return=False, use_cache=False)
+            ]
+        else:
+            entity_ids = [entity_id]
+
+        # one entity per transaction, so postings are held off one at a time
+        for x in entity_ids:
+            await take_daily_snapshot(x, day)
+        logger.info(f"Took account snapshots of {day} for {len(entity_ids)} entities")
+    finally:
+        await stop_services()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="store every account's balance as of a day, run daily")
+    parser.add_argument("--day", type=date.fromisoformat, default=date.today() - timedelta(days=1), help="default yesterday")
+    parser.add_argument("--entity-id", type=UUID, default=None, help="only this entity, default all")
+    args = parser.parse_args()
+    asyncio.run(main(args.day, args.entity_id))
@@ -0,0 +1,100 @@
+from contextlib import asynccontextmanager
+from typing import Callable
+
+import app.database.psql_mgr.unit_of_work as unit_of_work
+from app.utils.env_mgr import get_env
+
+# the settings the app needs to start, none of them reach a server
+TEST_ENV = {
+    "RUN_ENV": "test",
+    "SECRET_KEY": "x",
+    "ADMIN_EMAIL": "admin@test",
+    "S3_ENDPOINT": "x",
+    "S3_KEY_ID": "x",
+    "S3_APPLICATION_KEY": "x",
+    "PSQL_USER": "x",
+    "PSQL_PASSWORD": "x",
+    "PSQL_URL": "localhost",
+    "PSQL_PORT": "5432",
+    "PSQL_SCHEMA_VERSION": "v1",
+    "PASSWORD_SALT": "abcdefghijklmnopqrstuv",
+}
+
+
+class FakeCursor:
+    def __init__(self, pool: "FakePool", conn: "FakeConnection"):
+        self.pool = pool
+        self.conn = conn
+        self.rows = []
+        self.rowcount = -1
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def execute(self, query, vals=None, **kwargs):
+        sql = query if isinstance(query, str) else query.as_string(None)
+        self.pool.executed.append((sql, vals, self.conn.in_pipeline))
+        self.rows = list(self.pool.respond(sql, vals))
+        self.rowcount = len(self.rows)
+
+    async def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    async def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+
+class FakeConnection:
+    def __init__(self, pool: "FakePool"):
+        self.pool = pool
+        self.in_pipeline = False
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self.pool, self)
+
+    @asynccontextmanager
+    async def pipeline(self):
+        self.in_pipeline = True
+        try:
+            yield
+        finally:
+            self.in_pipeline = False
+            self.pool.round_trips += 1
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+
+class FakePool:
+    """
+    stands in for the pool, no server. every statement is kept in executed
+    as (sql, vals, in a pipeline), respond(sql, vals) gives its rows.
+    round_trips counts statements outside a pipeline, plus one per pipeline
+    """
+
+    def __init__(self, respond: Callable[[str, dict], list]):
+        self.respond = respond
+        self.executed = []
+        self.round_trips = 0
+
+    @asynccontextmanager
+    async def connection(self):
+        conn = FakeConnection(self)
+        n_before = len(self.executed)
+        yield conn
+        self.round_trips += sum(1 for x in self.executed[n_before:] if not x[2])
+
+
+def use_fake_pool(monkeypatch, respond: Callable[[str, dict], list]) -> FakePool:
+    """every API call in the test goes to a FakePool"""
+    for key, value in TEST_ENV.items():
+        monkeypatch.setenv(key, value)
+    get_env.cache_clear()
+    pool = FakePool(respond)
+    monkeypatch.setattr(unit_of_work, "get_async_pool", lambda: pool)
+    return pool
@@ -0,0 +1,91 @@
+import asyncio
+from time import monotonic
+from typing import Optional
+
+
+class RespStandIn:
+    """
+    in process server of the few RESP2 commands RespCache sends, GET, SET
+    (PX, NX), INCR, AUTH and SELECT. one keyspace for every db
+
+    - stall: keys whose commands are never answered, to time out on
+    """
+
+    def __init__(self, stall: frozenset[str] = frozenset()):
+        self.stall = stall
+        self.connections = 0
+        self.commands: list[list[str]] = []
+        # key -> (expires or None, value)
+        self._data: dict[str, tuple[Optional[float], str]] = {}
+        self._server: Optional[asyncio.Server] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"redis://{host}:{port}/0"
+
+    async def __aenter__(self) -> "RespStandIn":
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                args = await self._read_command(reader)
+                self.commands.append(args)
+                if len(args) > 1 and args[1] in self.stall:
+                    await asyncio.sleep(3600)
+                writer.write(self._run(args))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> list[str]:
+        n_args = int((await reader.readuntil(b"\r\n"))[1:-2])
+        args = []
+        for _ in range(n_args):
+            n_bytes = int((await reader.readuntil(b"\r\n"))[1:-2])
+            args.append((await reader.readexactly(n_bytes + 2))[:-2].decode())
+        return args
+
+    def _get(self, key: str) -> Optional[str]:
+        expires, value = self._data.get(key, (None, None))
+        if expires is not None and expires < monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def _run(self, args: list[str]) -> bytes:
+        command = args[0].upper()
+        if command in ("AUTH", "SELECT"):
+            return b"+OK\r\n"
+        if command == "GET":
+            value = self._get(args[1])
+            if value is None:
+                return b"$-1\r\n"
+            data = value.encode()
+            return f"${len(data)}\r\n".encode() + data + b"\r\n"
+        if command == "SET":
+            options = [x.upper() for x in args[3:]]
+            if "NX" in options and self._get(args[1]) is not None:
+                return b"$-1\r\n"
+            expires = None
+            if "PX" in options:
+                expires = monotonic() + int(args[3 + options.index("PX") + 1]) / 1000
+            self._data[args[1]] = (expires, args[2])
+            return b"+OK\r\n"
+        if command == "INCR":
+            value = self._get(args[1]) or "0"
+            if not value.lstrip("-").isdigit():
+                return b"-ERR value is not an integer or out of range\r\n"
+            self._data[args[1]] = (None, str(int(value) + 1))
+            return f":{int(value) + 1}\r\n".encode()
+        return f"-ERR unknown command '{args[0]}'\r\n".encode()
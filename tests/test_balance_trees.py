@@ -0,0 +1,61 @@
+from decimal import Decimal
+from uuid import uuid4
+
+from app.database.psql_mgr.models.v1 import c_Account, m_AccountType
+from app.logic.accounts import build_balance_trees
+from db_prefill import MASTER_ACCOUNTS
+
+
+def make_account(name, account_type, parent=None, debit="0", credit="0"):
+    return {
+        c_Account.id: uuid4(),
+        c_Account.name: name,
+        c_Account.parent_account_id: None if parent is None else parent[c_Account.id],
+        c_Account.type: account_type,
+        "debit": Decimal(debit),
+        "credit": Decimal(credit),
+    }
+
+
+def seeded_chart() -> list[dict]:
+    """the masters db_prefill makes, a child under some, parents before
+    children like fetch_subtree returns them
+    """
+    chart = []
+    masters = {}
+    for key, (name, account_type) in MASTER_ACCOUNTS.items():
+        masters[key] = make_account(name, account_type)
+        chart.append(masters[key])
+        if key == "assets_short":
+            chart.append(make_account("Checking", account_type, masters[key], debit="100.10", credit="20.05"))
+        elif key == "income":
+            chart.append(make_account("Sales", account_type, masters[key], credit="80.05"))
+        elif key == "income_summary":
+            chart.append(make_account("Closing", account_type, masters[key], credit="5"))
+    return chart
+
+
+def test_seeded_chart_builds():
+    trees = build_balance_trees(seeded_chart())
+
+    by_name = {x["name"]: x for x in trees}
+    assert len(trees) == len(MASTER_ACCOUNTS)
+    assert by_name["Short Term Assets (Master)"]["total"] == 80.05
+    assert by_name["Income (Master)"]["total"] == 80.05
+    # income summary is credit normal
+    assert by_name["Income Summary"]["total"] == 5.0
+    assert by_name["Income Summary"]["children"][0]["balance"] == 5.0
+
+
+def test_untyped_account_has_no_balance():
+    master = make_account("Master", m_AccountType.ASSET)
+    untyped = make_account("Untyped", None, master, debit="7")
+    leaf = make_account("Leaf", m_AccountType.ASSET, untyped, debit="3")
+
+    tree, = build_balance_trees([master, untyped, leaf])
+
+    node = tree["children"][0]
+    assert node["balance"] == 0.0
+    # its children still roll up through it
+    assert node["total"] == 3.0
+    assert tree["total"] == 3.0
@@ -0,0 +1,47 @@
+import asyncio
+from uuid import uuid4
+
+import app.database.psql_mgr.read_cache as read_cache
+from app.database.psql_mgr.api.delete import DELETE_API
+from app.database.psql_mgr.models.v1 import m_Account, m_Ledger
+from fake_pool import use_fake_pool
+
+
+def use_read_cache(monkeypatch, tables: str) -> read_cache.ReadCache:
+    monkeypatch.setenv("PSQL_READ_CACHE_TABLES", tables)
+    read_cache.get_read_cache_settings.cache_clear()
+    read_cache.get_read_cache.cache_clear()
+    return read_cache.get_read_cache()
+
+
+def cache_each(cache: read_cache.ReadCache, tables: list[str]) -> None:
+    for x in tables:
+        cache.put(x, (x,), cache.generation((x,)), [{"id": 1}])
+
+
+def test_delete_invalidates_referencing_tables(monkeypatch):
+    use_fake_pool(monkeypatch, lambda sql, vals: [])
+    cache = use_read_cache(monkeypatch, "entity,account,account_balance,daily_account_snapshot")
+    cache_each(cache, ["entity", "account", "account_balance", "daily_account_snapshot"])
+
+    asyncio.run(DELETE_API.delete_ids(m_Account, [uuid4()]))
+
+    # the cascade reaches the balances and snapshots, not the entity
+    assert cache.get("entity") is not None
+    for x in ["account", "account_balance", "daily_account_snapshot"]:
+        assert cache.get(x) is None
+    read_cache.get_read_cache_settings.cache_clear()
+    read_cache.get_read_cache.cache_clear()
+
+
+def test_delete_of_unreferenced_table_keeps_others(monkeypatch):
+    use_fake_pool(monkeypatch, lambda sql, vals: [])
+    cache = use_read_cache(monkeypatch, "account,ledger")
+    cache_each(cache, ["account", "ledger"])
+
+    asyncio.run(DELETE_API.delete_where(m_Ledger, {"ledger.journal_id": uuid4()}))
+
+    assert cache.get("ledger") is None
+    assert cache.get("account") is not None
+    read_cache.get_read_cache_settings.cache_clear()
+    read_cache.get_read_cache.cache_clear()
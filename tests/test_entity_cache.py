@@ -0,0 +1,60 @@
+import asyncio
+from uuid import uuid4
+
+import app.database.cache_mgr.cache_mgr as cache_mgr
+from app.utils.env_mgr import get_env
+from fake_pool import TEST_ENV
+
+
+def use_backend(monkeypatch, backend: str | None) -> None:
+    for key, value in TEST_ENV.items():
+        monkeypatch.setenv(key, value)
+    if backend is None:
+        monkeypatch.delenv("CACHE_BACKEND", raising=False)
+    else:
+        monkeypatch.setenv("CACHE_BACKEND", backend)
+    get_env.cache_clear()
+    cache_mgr.get_cache_settings.cache_clear()
+    cache_mgr.get_cache.cache_clear()
+
+
+def load_counter():
+    calls = []
+
+    async def load():
+        calls.append(1)
+        return {"n": len(calls)}
+
+    return load, calls
+
+
+def test_off_by_default_loads_every_time(monkeypatch):
+    use_backend(monkeypatch, None)
+    load, calls = load_counter()
+    entity_id = uuid4()
+
+    async def test():
+        assert await cache_mgr.cached_for_entity(entity_id, "x", load) == {"n": 1}
+        assert await cache_mgr.cached_for_entity(entity_id, "x", load) == {"n": 2}
+        await cache_mgr.invalidate_entity(entity_id)
+        await cache_mgr.stop_cache()
+
+    asyncio.run(test())
+    assert len(calls) == 2
+    # no backend was ever made
+    assert cache_mgr.get_cache.cache_info().currsize == 0
+
+
+def test_memory_hit_until_invalidated(monkeypatch):
+    use_backend(monkeypatch, "memory")
+    load, calls = load_counter()
+    entity_id = uuid4()
+
+    async def test():
+        assert await cache_mgr.cached_for_entity(entity_id, "x", load) == {"n": 1}
+        assert await cache_mgr.cached_for_entity(entity_id, "x", load) == {"n": 1}
+        await cache_mgr.invalidate_entity(entity_id)
+        assert await cache_mgr.cached_for_entity(entity_id, "x", load) == {"n": 2}
+
+    asyncio.run(test())
+    cache_mgr.get_cache.cache_clear()
@@ -0,0 +1,44 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+
+from app.database.psql_mgr.api.fetch import FETCH_API, NoRecordsFoundError
+from app.database.psql_mgr.models.v1 import m_Account, c_Account
+from fake_pool import use_fake_pool
+
+
+def use_accounts(monkeypatch, names: dict):
+    """the fake server has these accounts, id -> name, and answers in
+    reverse of the order asked for
+    """
+
+    def respond(sql, vals):
+        ids = vals["keys.account.id"]
+        return [{c_Account.id: x, c_Account.name: names[x]} for x in reversed(ids) if x in names]
+
+    return use_fake_pool(monkeypatch, respond)
+
+
+def test_input_order_one_query(monkeypatch):
+    a, b, c = uuid4(), uuid4(), uuid4()
+    pool = use_accounts(monkeypatch, {a: "a", b: "b", c: "c"})
+
+    rows = asyncio.run(
+        FETCH_API.tg_fetch_where_uuids([c_Account.id, c_Account.name], m_Account, [b, a, c, a])
+    )
+
+    assert [x[c_Account.name] for x in rows] == ["b", "a", "c", "a"]
+    assert len(pool.executed) == 1
+    # a repeated uuid is asked for once
+    assert sorted(pool.executed[0][1]["keys.account.id"]) == sorted([a, b, c])
+
+
+def test_missing_uuid_raises(monkeypatch):
+    a, missing = uuid4(), uuid4()
+    use_accounts(monkeypatch, {a: "a"})
+
+    with pytest.raises(NoRecordsFoundError, match=str(missing)):
+        asyncio.run(
+            FETCH_API.tg_fetch_where_uuids([c_Account.id, c_Account.name], m_Account, [a, missing])
+        )
@@ -0,0 +1,57 @@
+import asyncio
+from datetime import date
+from uuid import uuid4
+
+import pytest
+
+from db_prefill import add_journal
+from fake_pool import use_fake_pool
+
+
+def test_journal_and_lookups_share_a_round_trip(monkeypatch):
+    journal_id = uuid4()
+    account_ids = {"Checking": uuid4(), "Owners": uuid4()}
+
+    def respond(sql, vals):
+        if sql.startswith('INSERT INTO "journal"'):
+            return [{"id": journal_id}]
+        if sql.startswith("SELECT"):
+            return [{"account.id": account_ids[vals["account.name"]]}]
+        return []
+
+    pool = use_fake_pool(monkeypatch, respond)
+    transaction = {
+        "description": "Owners put money in",
+        "timestamp": date(2025, 1, 1),
+        "credits": [{"amount": 100.0, "account": "Owners"}],
+        "debits": [{"amount": 100.0, "account": "Checking"}],
+    }
+    asyncio.run(add_journal(uuid4(), uuid4(), [transaction]))
+
+    # the journal and both lookups pipelined, then the lines in one statement
+    assert [x[2] for x in pool.executed] == [True, True, True, False]
+    assert pool.round_trips == 2
+    sql, vals, _ = pool.executed[-1]
+    assert sql.startswith('INSERT INTO "ledger"')
+    assert vals["journal_id"] == [journal_id, journal_id]
+    # credits first, then debits, each with its own account
+    assert vals["account_id"] == [account_ids["Owners"], account_ids["Checking"]]
+    assert vals["direction"] == ["CREDIT", "DEBIT"]
+
+
+def test_unknown_account_inserts_no_lines(monkeypatch):
+    def respond(sql, vals):
+        if sql.startswith('INSERT INTO "journal"'):
+            return [{"id": uuid4()}]
+        return []
+
+    pool = use_fake_pool(monkeypatch, respond)
+    transaction = {
+        "description": "x",
+        "timestamp": date(2025, 1, 1),
+        "credits": [{"amount": 1.0, "account": "Nope"}],
+        "debits": [],
+    }
+    with pytest.raises(AssertionError, match="Nope"):
+        asyncio.run(add_journal(uuid4(), uuid4(), [transaction]))
+    assert not any(x[0].startswith('INSERT INTO "ledger"') for x in pool.executed)
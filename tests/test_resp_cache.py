@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from app.database.cache_mgr.cache_mgr import CacheError, RespCache
+from resp_stand_in import RespStandIn
+
+
+def run(test):
+    async def wrapped():
+        async with RespStandIn(stall=frozenset({"slow"})) as server:
+            cache = RespCache(server.url, timeout_s=0.2)
+            try:
+                await test(server, cache)
+            finally:
+                await cache.close()
+
+    asyncio.run(wrapped())
+
+
+def test_get_set_incr():
+    async def test(server, cache):
+        assert await cache.get("missing") is None
+        await cache.set("a", "1")
+        assert await cache.get("a") == "1"
+        assert await cache.incr("a") == 2
+        assert await cache.incr("counter") == 1
+        assert await cache.get("counter") == "1"
+        # every command on the one connection
+        assert server.connections == 1
+
+    run(test)
+
+
+def test_set_ttl():
+    async def test(server, cache):
+        await cache.set("a", "1", ttl_s=0.05)
+        assert server.commands[-1] == ["SET", "a", "1", "PX", "50"]
+        assert await cache.get("a") == "1"
+        await asyncio.sleep(0.1)
+        assert await cache.get("a") is None
+
+    run(test)
+
+
+def test_set_nx():
+    async def test(server, cache):
+        await cache.set_nx("a", "1")
+        await cache.set_nx("a", "2")
+        assert await cache.get("a") == "1"
+
+    run(test)
+
+
+def test_error_reply():
+    async def test(server, cache):
+        await cache.set("a", "x")
+        with pytest.raises(CacheError, match="not an integer"):
+            await cache.incr("a")
+        # an error reply leaves the connection usable
+        assert await cache.get("a") == "x"
+        assert server.connections == 1
+
+    run(test)
+
+
+def test_timeout_then_reconnect():
+    async def test(server, cache):
+        await cache.set("a", "1")
+        with pytest.raises(CacheError, match="GET"):
+            await cache.get("slow")
+        # the late reply could be read as the next one, so a new connection
+        assert await cache.get("a") == "1"
+        assert server.connections == 2
+
+    run(test)